@@ -0,0 +1,48 @@
+"""
+App launcher for bench/load.py: the real app plus two bench-only hooks.
+
+- a `bench-noop` command (runs the current Python, prints a line), so run
+  bursts exercise the command engine without touching the host
+- POST /_bench/events?count=N, which calls log_event() N times, so event
+  floods go through the same pipeline as the app's own events
+
+Started by load.py with BLACKFONG_DATA_DIR pointing at a temp directory.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import uvicorn  # noqa: E402
+from fastapi import Query  # noqa: E402
+
+from core.system.commands import ALLOWED_COMMANDS, CommandSpec  # noqa: E402
+
+ALLOWED_COMMANDS["bench-noop"] = CommandSpec(
+    (sys.executable, "-c", "print('bench')"), timeout_seconds=30, max_concurrency=64
+)
+
+from core.main import app  # noqa: E402
+from core.system.events import log_event  # noqa: E402
+
+
+@app.post("/_bench/events")
+def bench_events(count: int = Query(default=100, ge=1, le=10000)) -> dict:
+    for i in range(count):
+        log_event(None, f"bench event {i}", event_type="bench", source="system", severity="info")
+    return {"logged": count}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, required=True)
+    args = ap.parse_args()
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Simulated fleet for fleet command dispatch, against a throwaway data directory.
+
+    python3 bench/fleet_sim.py [--nodes 2000] [--gateways 8] [--pollers 50] [--out run.json]
+
+Starts the app (bench/_server.py) like bench/load.py, registers --nodes nodes
+with a mix of versions and capabilities, then runs them:
+
+- gateway threads forward their nodes' heartbeats in batches every --beat
+  seconds, take the jobs handed back in the response, "run" each for a
+  random few ms (failing with --fail-rate) and report results in batches
+- --pollers nodes instead sit in GET /api/nodes/{id}/jobs?wait=... long-polls
+
+While they run, `bench-noop` is dispatched by version, by capability and to
+every node; each dispatch is followed until no job is PENDING/SENT. The report
+has pickup latency (created -> sent) and completion time per dispatch, from
+the jobs' own timestamps.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from load import Client, _free_port, _percentile, start_server
+
+_VERSIONS = ("1.0.0", "1.0.1", "1.1.0")
+_CAPABILITIES = (["bench"], ["bench", "gpu"], ["bench", "camera"])
+
+
+class Gateway(threading.Thread):
+    """Heartbeats for a slice of nodes; runs and reports the jobs they get."""
+
+    def __init__(self, client: Client, node_ids: list[int], args, seed: int, stop: threading.Event) -> None:
+        super().__init__(daemon=True)
+        self.client = client
+        self.node_ids = node_ids
+        self.args = args
+        self.rng = random.Random(seed)
+        self.stop = stop
+        self.running: list[tuple[float, dict]] = []  # (done_at, result)
+        self.errors = 0
+
+    def run(self) -> None:
+        while not self.stop.is_set():
+            t0 = time.monotonic()
+            for i in range(0, len(self.node_ids), 500):
+                beats = [
+                    {"node_id": nid, "load": f"{self.rng.random() * 4:.2f}"} for nid in self.node_ids[i : i + 500]
+                ]
+                status, body = self.client.json("POST", "/api/nodes/heartbeats", {"heartbeats": beats})
+                if status != 200:
+                    self.errors += 1
+                    continue
+                for job in body["jobs"]:
+                    done_at = time.monotonic() + self.rng.uniform(0.001, 0.05)
+                    self.running.append((done_at, _outcome(job, self.rng, self.args)))
+            self._report()
+            self.stop.wait(max(0.0, self.args.beat - (time.monotonic() - t0)))
+        self._report(force=True)
+
+    def _report(self, force: bool = False) -> None:
+        now = time.monotonic()
+        due = [r for at, r in self.running if force or at <= now]
+        self.running = [(at, r) for at, r in self.running if not (force or at <= now)]
+        for i in range(0, len(due), 1000):
+            if self.client.json("POST", "/api/nodes/jobs/results", {"results": due[i : i + 1000]})[0] != 200:
+                self.errors += 1
+
+
+class Poller(threading.Thread):
+    """One node that long-polls for work instead of heartbeating."""
+
+    def __init__(self, client: Client, node_id: int, args, seed: int, stop: threading.Event) -> None:
+        super().__init__(daemon=True)
+        self.client = client
+        self.node_id = node_id
+        self.args = args
+        self.rng = random.Random(seed)
+        self.stop = stop
+        self.errors = 0
+
+    def run(self) -> None:
+        while not self.stop.is_set():
+            status, jobs = self.client.json("GET", f"/api/nodes/{self.node_id}/jobs?wait={self.args.wait}")
+            if status != 200:
+                self.errors += 1
+                self.stop.wait(1.0)
+                continue
+            if jobs:
+                results = [_outcome(j, self.rng, self.args) for j in jobs]
+                if self.client.json("POST", "/api/nodes/jobs/results", {"results": results})[0] != 200:
+                    self.errors += 1
+
+
+def _outcome(job: dict, rng: random.Random, args) -> dict:
+    ok = rng.random() >= args.fail_rate
+    return {
+        "job_id": job["id"],
+        "node_id": job["node_id"],
+        "status": "OK" if ok else "FAIL",
+        "return_code": 0 if ok else 1,
+        "output": "bench\n" if ok else "simulated failure\n",
+    }
+
+
+def _seconds(a: str, b: str) -> float:
+    return (datetime.fromisoformat(b) - datetime.fromisoformat(a)).total_seconds()
+
+
+def follow_dispatch(client: Client, target: dict, timeout: float) -> dict:
+    t0 = time.perf_counter()
+    status, d = client.json("POST", "/api/commands/bench-noop/dispatch", target)
+    if status != 200:
+        return {"target": target, "error": status}
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        _, st = client.json("GET", f"/api/commands/dispatches/{d['id']}")
+        if not (st["counts"].get("PENDING") or st["counts"].get("SENT")):
+            break
+        time.sleep(0.05)
+    seconds = time.perf_counter() - t0
+
+    jobs: list[dict] = []
+    after = 0
+    while True:
+        _, page = client.json("GET", f"/api/commands/dispatches/{d['id']}/jobs?after_id={after}&limit=1000")
+        jobs.extend(page)
+        if len(page) < 1000:
+            break
+        after = page[-1]["id"]
+    pickup = sorted(_seconds(j["created_at"], j["sent_at"]) * 1000 for j in jobs if j["sent_at"])
+    done = sorted(_seconds(j["created_at"], j["finished_at"]) * 1000 for j in jobs if j["finished_at"])
+    return {
+        "target": target,
+        "dispatch_id": d["id"],
+        "nodes": d["node_count"],
+        "counts": st["counts"],
+        "all_finished_seconds": round(seconds, 3),
+        "pickup_ms": {q: _percentile(pickup, v) for q, v in (("p50", 0.5), ("p95", 0.95), ("max", 1.0))},
+        "complete_ms": {q: _percentile(done, v) for q, v in (("p50", 0.5), ("p95", 0.95), ("max", 1.0))},
+    }
+
+
+def run(args) -> dict:
+    rng = random.Random(args.seed)
+    tmp = Path(tempfile.mkdtemp(prefix="blackfong-fleet-"))
+    data_dir = tmp / "data"
+    port = _free_port()
+    extra_env = dict(kv.split("=", 1) for kv in args.env)
+    proc = start_server(data_dir, port, extra_env)
+    client = Client(port)
+    stop = threading.Event()
+    threads: list[threading.Thread] = []
+    try:
+        node_ids = []
+        for i in range(args.nodes):
+            status, body = client.json(
+                "POST",
+                "/api/nodes/register",
+                {
+                    "name": f"sim-node-{i:05d}",
+                    "ip": f"10.1.{i // 250}.{i % 250 + 1}",
+                    "capabilities": rng.choice(_CAPABILITIES),
+                },
+            )
+            if status != 200:
+                raise RuntimeError(f"register failed: {status}")
+            node_ids.append(body["id"])
+        versions = [{"node_id": nid, "version": rng.choice(_VERSIONS)} for nid in node_ids]
+        for i in range(0, len(versions), 500):
+            client.json("POST", "/api/nodes/heartbeats", {"heartbeats": versions[i : i + 500]})
+
+        pollers, beating = node_ids[: args.pollers], node_ids[args.pollers :]
+        for i, nid in enumerate(pollers):
+            threads.append(Poller(Client(port), nid, args, args.seed * 1000 + i, stop))
+        for g in range(args.gateways):
+            threads.append(Gateway(Client(port), beating[g :: args.gateways], args, args.seed + g, stop))
+        for t in threads:
+            t.start()
+        time.sleep(args.beat)
+
+        dispatches = [
+            follow_dispatch(client, target, args.timeout)
+            for target in ({"version": "1.1.0"}, {"capability": "gpu"}, {"all": True})
+        ]
+    finally:
+        stop.set()
+        for t in threads:
+            t.join(timeout=args.wait + 5)
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    return {
+        "bench": "fleet_sim",
+        "params": {
+            "nodes": args.nodes,
+            "gateways": args.gateways,
+            "pollers": args.pollers,
+            "beat": args.beat,
+            "wait": args.wait,
+            "fail_rate": args.fail_rate,
+            "seed": args.seed,
+            "env": extra_env,
+        },
+        "dispatches": dispatches,
+        "client_errors": sum(t.errors for t in threads),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--nodes", type=int, default=2000)
+    ap.add_argument("--gateways", type=int, default=8)
+    ap.add_argument("--pollers", type=int, default=50, help="nodes that long-poll instead of heartbeating")
+    ap.add_argument("--beat", type=float, default=1.0, help="heartbeat interval (s)")
+    ap.add_argument("--wait", type=float, default=10.0, help="long-poll wait (s)")
+    ap.add_argument("--fail-rate", type=float, default=0.02)
+    ap.add_argument("--timeout", type=float, default=120.0, help="per dispatch")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra server env")
+    ap.add_argument("--out", type=Path, default=None)
+    args = ap.parse_args()
+
+    text = json.dumps(run(args), indent=2)
+    if args.out:
+        args.out.write_text(text + "\n", encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""
+Load test for the API hot paths against a throwaway data directory.
+
+    python3 bench/load.py [--nodes 200] [--concurrency 8] [--out run.json] [--baseline prev.json]
+
+Starts the app (bench/_server.py) under uvicorn with BLACKFONG_DATA_DIR in a
+temp directory and drives it with a simulated fleet, one phase at a time:
+
+- register      N nodes register
+- heartbeat     every node sends --heartbeats heartbeats
+- heartbeat_bulk  the same load forwarded by a gateway, 500 per request
+- events        event flood through log_event() (--events, 100 per request)
+- event_query   paging through /api/logs/events with filters
+- commands      a burst of `bench-noop` runs, until all have finished
+- dashboard     polling "/" (half with If-None-Match) and /api/nodes/summary
+
+Every phase reports throughput, client-side latency percentiles, errors and
+the growth of the data directory. Operation counts and payloads come from
+--seed, so two runs do the same work; --baseline adds the change vs a
+previous report.
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+_BENCH_DIR = Path(__file__).resolve().parent
+_ROOT = _BENCH_DIR.parent
+
+
+class Client:
+    """One keep-alive connection per thread."""
+
+    def __init__(self, port: int) -> None:
+        self.port = port
+        self._local = threading.local()
+
+    def _conn(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+        return conn
+
+    def request(self, method: str, path: str, body=None, headers=None) -> tuple[int, dict, bytes]:
+        hdrs = dict(headers or {})
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode("utf-8")
+            hdrs["Content-Type"] = "application/json"
+        for attempt in (0, 1):
+            conn = self._conn()
+            try:
+                conn.request(method, path, body=data, headers=hdrs)
+                resp = conn.getresponse()
+                return resp.status, dict(resp.getheaders()), resp.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+        raise AssertionError("unreachable")
+
+    def json(self, method: str, path: str, body=None) -> tuple[int, object]:
+        status, _, raw = self.request(method, path, body)
+        return status, json.loads(raw) if raw else None
+
+
+def _percentile(sorted_ms: list[float], q: float) -> float:
+    if not sorted_ms:
+        return 0.0
+    idx = min(len(sorted_ms) - 1, max(0, int(round(q * len(sorted_ms) + 0.5)) - 1))
+    return round(sorted_ms[idx], 3)
+
+
+def _dir_bytes(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def run_phase(name: str, ops: list, worker, *, concurrency: int, data_dir: Path, items: int | None = None) -> dict:
+    """
+    Run `worker(op) -> bool` over ops with N threads; time every call.
+    `items` counts the records behind batched ops (events, bulk heartbeats).
+    """
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+    it = iter(ops)
+
+    def _loop() -> None:
+        nonlocal errors
+        local_lat: list[float] = []
+        local_err = 0
+        while True:
+            with lock:
+                op = next(it, None)
+            if op is None:
+                break
+            t0 = time.perf_counter()
+            try:
+                ok = worker(op)
+            except Exception:
+                ok = False
+            local_lat.append((time.perf_counter() - t0) * 1000)
+            if not ok:
+                local_err += 1
+        with lock:
+            latencies.extend(local_lat)
+            errors += local_err
+
+    size_before = _dir_bytes(data_dir)
+    threads = [threading.Thread(target=_loop) for _ in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds = time.perf_counter() - t0
+    latencies.sort()
+    result = {
+        "phase": name,
+        "ops": len(ops),
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "ops_per_s": round(len(ops) / seconds, 1) if seconds > 0 else 0.0,
+        "latency_ms": {
+            "p50": _percentile(latencies, 0.50),
+            "p95": _percentile(latencies, 0.95),
+            "p99": _percentile(latencies, 0.99),
+            "max": round(latencies[-1], 3) if latencies else 0.0,
+        },
+        "data_dir_growth_bytes": _dir_bytes(data_dir) - size_before,
+    }
+    if items is not None:
+        result["items"] = items
+        result["items_per_s"] = round(items / seconds, 1) if seconds > 0 else 0.0
+    return result
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(data_dir: Path, port: int, extra_env: dict[str, str]) -> subprocess.Popen:
+    # Only what the run asks for: no BLACKFONG_* leaking in from the shell.
+    env = {k: v for k, v in os.environ.items() if not k.startswith("BLACKFONG_")}
+    env.update(
+        {
+            "BLACKFONG_BASE_DIR": str(data_dir.parent),
+            "BLACKFONG_DATA_DIR": str(data_dir),
+            "PYTHONPATH": str(_ROOT),
+        }
+    )
+    env.update(extra_env)
+    proc = subprocess.Popen(
+        [sys.executable, str(_BENCH_DIR / "_server.py"), "--port", str(port)],
+        cwd=str(_ROOT),
+        env=env,
+    )
+    client = Client(port)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            if client.request("GET", "/api/system/pulse")[0] == 200:
+                return proc
+        except OSError:
+            pass
+        time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("server did not start within 30s")
+
+
+def run(args) -> dict:
+    rng = random.Random(args.seed)
+    tmp = Path(tempfile.mkdtemp(prefix="blackfong-load-"))
+    data_dir = tmp / "data"
+    port = _free_port()
+    extra_env = dict(kv.split("=", 1) for kv in args.env)
+    proc = start_server(data_dir, port, extra_env)
+    client = Client(port)
+    phases: list[dict] = []
+
+    def phase(name, ops, worker, items=None):
+        result = run_phase(name, ops, worker, concurrency=args.concurrency, data_dir=data_dir, items=items)
+        phases.append(result)
+        print(f"  {name:15s} {result['ops_per_s']:>9} ops/s  p95 {result['latency_ms']['p95']} ms", file=sys.stderr)
+
+    try:
+        node_ids: list[int] = []
+        ids_lock = threading.Lock()
+
+        def _register(i: int) -> bool:
+            status, body = client.json(
+                "POST",
+                "/api/nodes/register",
+                {"name": f"bench-node-{i:05d}", "ip": f"10.0.{i // 250}.{i % 250 + 1}", "capabilities": ["bench"]},
+            )
+            if status == 200:
+                with ids_lock:
+                    node_ids.append(body["id"])
+            return status == 200
+
+        phase("register", list(range(args.nodes)), _register)
+        node_ids.sort()
+
+        def _payload() -> dict:
+            return {
+                "version": rng.choice(("1.0.0", "1.0.1", "1.1.0")),
+                "load": f"{rng.random() * 4:.2f}",
+                "status_flags": {"disk_ok": rng.random() > 0.05},
+            }
+
+        beats = [(nid, _payload()) for _ in range(args.heartbeats) for nid in node_ids]
+        phase(
+            "heartbeat",
+            beats,
+            lambda op: client.json("POST", f"/api/nodes/{op[0]}/heartbeat", op[1])[0] == 200,
+        )
+
+        items = [{"node_id": nid, **p} for nid, p in beats]
+        batches = [items[i : i + 500] for i in range(0, len(items), 500)]
+        phase(
+            "heartbeat_bulk",
+            batches,
+            lambda op: client.json("POST", "/api/nodes/heartbeats", {"heartbeats": op})[0] == 200,
+            items=len(items),
+        )
+
+        floods = [100] * max(1, args.events // 100)
+        phase(
+            "events",
+            floods,
+            lambda n: client.json("POST", f"/_bench/events?count={n}")[0] == 200,
+            items=sum(floods),
+        )
+
+        queries = [
+            rng.choice(
+                (
+                    "/api/logs/events?limit=100",
+                    "/api/logs/events?limit=100&event_type=bench",
+                    "/api/logs/events?limit=50&source=node",
+                    "/api/logs/events?limit=50&severity=warning",
+                )
+            )
+            for _ in range(args.queries)
+        ]
+        phase("event_query", queries, lambda q: client.request("GET", q)[0] == 200)
+
+        run_ids: list[int] = []
+
+        def _submit(_: int) -> bool:
+            status, body = client.json("POST", "/api/commands/bench-noop/run")
+            if status == 200 and body["status"] == "QUEUED":
+                with ids_lock:
+                    run_ids.append(body["id"])
+                return True
+            return False
+
+        t0 = time.perf_counter()
+        phase("commands", list(range(args.commands)), _submit)
+        pending = set(run_ids)
+        deadline = time.monotonic() + 120
+        while pending and time.monotonic() < deadline:
+            _, runs = client.json("GET", f"/api/commands/runs?limit={max(100, len(run_ids))}")
+            done = {r["id"] for r in runs if r["status"] not in ("QUEUED", "RUNNING")}
+            ok = {r["id"] for r in runs if r["status"] == "OK"}
+            pending -= done
+            phases[-1]["runs_ok"] = len(ok & set(run_ids))
+            time.sleep(0.05)
+        phases[-1]["runs_unfinished"] = len(pending)
+        phases[-1]["all_finished_seconds"] = round(time.perf_counter() - t0, 3)
+
+        etag = {"value": None}
+
+        def _poll(i: int) -> bool:
+            if i % 4 == 3:
+                return client.request("GET", "/api/nodes/summary")[0] == 200
+            headers = {"If-None-Match": etag["value"]} if i % 2 and etag["value"] else {}
+            status, hdrs, _ = client.request("GET", "/", headers=headers)
+            etag["value"] = hdrs.get("etag", etag["value"])
+            return status in (200, 304)
+
+        phase("dashboard", list(range(args.polls)), _poll)
+
+        _, server_perf = client.json("GET", "/api/system/perf")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        db_bytes = {p.name: p.stat().st_size for p in sorted(data_dir.glob("*.db*"))}
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    return {
+        "bench": "load",
+        "params": {
+            "nodes": args.nodes,
+            "heartbeats": args.heartbeats,
+            "events": args.events,
+            "queries": args.queries,
+            "commands": args.commands,
+            "polls": args.polls,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "env": extra_env,
+        },
+        "host": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "git_rev": _git_rev(),
+        },
+        "phases": phases,
+        "db_bytes": db_bytes,
+        "server_perf": server_perf,
+    }
+
+
+def _git_rev() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=_ROOT, capture_output=True, text=True, check=False
+        )
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def compare(report: dict, baseline: dict) -> list[dict]:
+    """Per-phase change vs a previous report (positive ops_per_s = faster)."""
+    before = {p["phase"]: p for p in baseline.get("phases", [])}
+    out = []
+    for p in report["phases"]:
+        b = before.get(p["phase"])
+        if b is None:
+            continue
+        out.append(
+            {
+                "phase": p["phase"],
+                "ops_per_s_pct": round((p["ops_per_s"] / b["ops_per_s"] - 1) * 100, 1) if b["ops_per_s"] else None,
+                "p95_ms_pct": round((p["latency_ms"]["p95"] / b["latency_ms"]["p95"] - 1) * 100, 1)
+                if b["latency_ms"]["p95"]
+                else None,
+                "growth_bytes_delta": p["data_dir_growth_bytes"] - b["data_dir_growth_bytes"],
+            }
+        )
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--nodes", type=int, default=200)
+    ap.add_argument("--heartbeats", type=int, default=10, help="per node")
+    ap.add_argument("--events", type=int, default=20000)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--commands", type=int, default=50)
+    ap.add_argument("--polls", type=int, default=1000)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra server env")
+    ap.add_argument("--out", type=Path, default=None)
+    ap.add_argument("--baseline", type=Path, default=None, help="previous report to compare with")
+    args = ap.parse_args()
+
+    report = run(args)
+    if args.baseline:
+        report["vs_baseline"] = compare(report, json.loads(args.baseline.read_text(encoding="utf-8")))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        args.out.write_text(text + "\n", encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
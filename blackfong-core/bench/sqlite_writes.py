@@ -0,0 +1,110 @@
+"""
+SQLite write throughput: default engine vs the configured tuning profile.
+
+    python3 bench/sqlite_writes.py [--rows 2000] [--threads 4] [--out result.json]
+
+Each insert is its own transaction, like log_event(). Runs against a temp
+directory; nothing under BLACKFONG_DATA_DIR is touched.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+_TMP = Path(tempfile.mkdtemp(prefix="blackfong-bench-"))
+os.environ.setdefault("BLACKFONG_BASE_DIR", str(_TMP))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from core.db.database import create_db_engine, engine_pragmas  # noqa: E402
+from core.db.models import Base, EventLog  # noqa: E402
+
+
+def _row(i: int) -> dict:
+    return {
+        "at": datetime.now(tz=timezone.utc),
+        "level": "INFO",
+        "event_type": "bench",
+        "source": "system",
+        "severity": "info",
+        "message": f"bench event {i}",
+    }
+
+
+def _writer(engine, start: int, count: int, errors: list[int]) -> None:
+    for i in range(start, start + count):
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(EventLog), [_row(i)])
+        except OperationalError:
+            errors.append(i)
+
+
+def run_profile(name: str, pragmas: dict, *, rows: int, threads: int) -> dict:
+    db_path = _TMP / f"{name}.db"
+    engine = create_db_engine(db_path, pragmas=pragmas)
+    Base.metadata.create_all(bind=engine)
+
+    errors: list[int] = []
+    t0 = time.perf_counter()
+    _writer(engine, 0, rows, errors)
+    serial_s = time.perf_counter() - t0
+
+    per_thread = max(1, rows // threads)
+    workers = [
+        threading.Thread(target=_writer, args=(engine, rows + k * per_thread, per_thread, errors))
+        for k in range(threads)
+    ]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    concurrent_s = time.perf_counter() - t0
+    engine.dispose()
+
+    return {
+        "profile": name,
+        "pragmas": pragmas,
+        "serial_writes_per_s": round(rows / serial_s, 1),
+        "concurrent_writes_per_s": round(per_thread * threads / concurrent_s, 1),
+        "locked_errors": len(errors),
+        "db_bytes": db_path.stat().st_size,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--rows", type=int, default=2000)
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--out", type=Path, default=None)
+    args = ap.parse_args()
+
+    try:
+        results = [
+            # Empty pragmas = SQLite defaults (rollback journal, synchronous=FULL).
+            run_profile("default", {}, rows=args.rows, threads=args.threads),
+            run_profile("tuned", engine_pragmas(), rows=args.rows, threads=args.threads),
+        ]
+    finally:
+        shutil.rmtree(_TMP, ignore_errors=True)
+    report = {"bench": "sqlite_writes", "rows": args.rows, "threads": args.threads, "results": results}
+    text = json.dumps(report, indent=2)
+    if args.out:
+        args.out.write_text(text + "\n", encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,18 @@
 from __future__ import annotations
 
+import json
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, Request
-from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.db.database import get_db
-from core.system.commands import list_allowed, list_runs, run_command
-from core.system.events import log_event
+from core.db.database import AsyncSessionLocal, get_async_db
+from core.system.command_output import follow
+from core.system.commands import get_run_async, list_allowed, list_runs_async, run_command_async
+from core.system.events import log_event_async
+from core.system.fleet import dispatch_async, dispatch_status_async, list_dispatches_async, list_jobs_async
 
 
 router = APIRouter(prefix="/api/commands", tags=["commands"])
@@ -27,36 +31,186 @@ class CommandRunOut(BaseModel):
     stderr: str | None
 
 
+class DispatchIn(BaseModel):
+    # Criteria combine with AND; `all` targets every registered node.
+    names: list[str] | None = Field(default=None, max_length=10000)
+    version: str | None = Field(default=None, max_length=64)
+    capability: str | None = Field(default=None, max_length=128)
+    all: bool = False
+
+
+class DispatchOut(BaseModel):
+    id: int
+    name: str
+    target: str
+    requested_by: str | None
+    requested_at: datetime
+    node_count: int
+
+
+class DispatchStatusOut(BaseModel):
+    id: int
+    name: str
+    target: dict
+    requested_by: str | None
+    requested_at: datetime
+    node_count: int
+    counts: dict[str, int]
+
+
+class NodeJobOut(BaseModel):
+    id: int
+    dispatch_id: int
+    node_id: int
+    name: str
+    status: str
+    created_at: datetime
+    sent_at: datetime | None
+    finished_at: datetime | None
+    return_code: int | None
+    output: str | None
+
+
 @router.get("/allowed")
-def get_allowed() -> dict:
+async def get_allowed() -> dict:
     return {"allowed": list_allowed()}
 
 
 @router.post("/{name}/run", response_model=CommandRunOut)
-def post_run(name: str, request: Request, db: Session = Depends(get_db)):
+async def post_run(name: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    # Returns immediately; poll GET /runs/{id} for the outcome.
     requester = getattr(request.state, "requester", "unknown")
-    run = run_command(db, name=name, requested_by=requester)
+    run = await run_command_async(db, name=name, requested_by=requester)
     if run.status == "DENIED":
-        log_event(
+        await log_event_async(
             db,
             f"command denied: {name} by {requester}",
             event_type="command",
             source="api",
             severity="warn",
         )
-    else:
-        severity = "info" if run.status == "OK" else "warn"
-        log_event(
+    elif run.status == "QUEUED":
+        await log_event_async(
             db,
-            f"command {run.status}: {name} (rc={run.return_code}) by {requester}",
+            f"command queued: {name} (run {run.id}) by {requester}",
             event_type="command",
             source="api",
-            severity=severity,
+            severity="info",
         )
     return run
 
 
+@router.post("/{name}/dispatch", response_model=DispatchOut)
+async def post_dispatch(
+    name: str,
+    payload: DispatchIn,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Queues one job per matching node; nodes pick them up on their next heartbeat/poll.
+    requester = getattr(request.state, "requester", "unknown")
+    try:
+        return await dispatch_async(
+            db,
+            name=name,
+            requested_by=requester,
+            names=payload.names,
+            version=payload.version,
+            capability=payload.capability,
+            all_nodes=payload.all,
+        )
+    except PermissionError as e:
+        await log_event_async(
+            db,
+            f"command denied: {name} (fleet dispatch) by {requester}",
+            event_type="command",
+            source="api",
+            severity="warn",
+        )
+        raise HTTPException(status_code=403, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/dispatches", response_model=list[DispatchOut])
+async def get_dispatches(limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    return await list_dispatches_async(db, limit=min(1000, max(1, limit)))
+
+
+@router.get("/dispatches/{dispatch_id}", response_model=DispatchStatusOut)
+async def get_dispatch(dispatch_id: int, db: AsyncSession = Depends(get_async_db)):
+    status = await dispatch_status_async(db, dispatch_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Dispatch not found")
+    return status
+
+
+@router.get("/dispatches/{dispatch_id}/jobs", response_model=list[NodeJobOut])
+async def get_dispatch_jobs(
+    dispatch_id: int,
+    status: str | None = None,
+    after_id: int | None = None,
+    limit: int = 200,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Per-node jobs in id order; page with after_id=<last id>."""
+    return await list_jobs_async(
+        db, dispatch_id, status=status, after_id=after_id, limit=min(1000, max(1, limit))
+    )
+
+
 @router.get("/runs", response_model=list[CommandRunOut])
-def get_runs(limit: int = 100, db: Session = Depends(get_db)):
-    return list_runs(db, limit=limit)
+async def get_runs(limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    return await list_runs_async(db, limit=limit)
+
+
+@router.get("/runs/{run_id}", response_model=CommandRunOut)
+async def get_run_status(run_id: int, db: AsyncSession = Depends(get_async_db)):
+    run = await get_run_async(db, run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return run
+
+
+def _sse(event: str, data: str, event_id: int | None = None) -> str:
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+async def _run_summary(run_id: int) -> dict | None:
+    async with AsyncSessionLocal() as db:
+        run = await get_run_async(db, run_id)
+        if run is None:
+            return None
+        return {"id": run.id, "status": run.status, "return_code": run.return_code}
+
+
+@router.get("/runs/{run_id}/stream")
+async def stream_run(run_id: int, last_event_id: str | None = Header(default=None)):
+    """
+    Server-Sent Events: `stdout`/`stderr`/`meta` chunks (id = chunk seq), then `end`.
+    Reconnects resume after Last-Event-ID.
+    """
+    if await _run_summary(run_id) is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    try:
+        after_seq = int(last_event_id) if last_event_id else -1
+    except ValueError:
+        after_seq = -1
+
+    async def events():
+        async for chunk in follow(run_id, after_seq):
+            if chunk["stream"] == "lagged":
+                yield _sse("lagged", "reconnect with Last-Event-ID to resume")
+                return
+            yield _sse(chunk["stream"], chunk["data"], chunk["seq"])
+        summary = await _run_summary(run_id)
+        yield _sse("end", json.dumps(summary))
 
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
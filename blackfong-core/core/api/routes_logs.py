@@ -2,13 +2,12 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from pydantic import BaseModel
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.db.database import get_db
-from core.db.models import EventLog
+from core.db.database import get_async_db
+from core.system.events import query_events_async
 
 
 router = APIRouter(prefix="/api/logs", tags=["logs"])
@@ -25,7 +24,39 @@ class EventOut(BaseModel):
 
 
 @router.get("/events", response_model=list[EventOut])
-def get_events(limit: int = 200, db: Session = Depends(get_db)):
-    q = select(EventLog).order_by(EventLog.at.desc()).limit(min(1000, max(1, limit)))
-    return list(db.execute(q).scalars().all())
-
+async def get_events(
+    response: Response,
+    limit: int = 200,
+    before_id: int | None = None,
+    after_id: int | None = None,
+    event_type: str | None = None,
+    source: str | None = None,
+    severity: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    q: str | None = Query(default=None, max_length=256),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Newest first; page back with before_id=<X-Next-Before-Id>. With after_id
+    the page is oldest first and continues via X-Next-After-Id.
+    """
+    if before_id is not None and after_id is not None:
+        raise HTTPException(status_code=400, detail="Use before_id or after_id, not both")
+    page_size = min(1000, max(1, limit))
+    rows = await query_events_async(
+        db,
+        limit=page_size,
+        before_id=before_id,
+        after_id=after_id,
+        event_type=event_type,
+        source=source,
+        severity=severity,
+        since=since,
+        until=until,
+        contains=q,
+    )
+    if len(rows) == page_size:
+        header = "X-Next-After-Id" if after_id is not None else "X-Next-Before-Id"
+        response.headers[header] = str(rows[-1].id)
+    return rows
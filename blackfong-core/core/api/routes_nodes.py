@@ -1,14 +1,28 @@
 from __future__ import annotations
 
-from datetime import datetime
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends, HTTPException, Request
-from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import AfterValidator, BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.db.database import get_db
-from core.system.events import log_event
-from core.system.nodes import heartbeat, list_nodes, upsert_node
+from core.config import SETTINGS
+from core.db.database import AsyncSessionLocal, get_async_db
+from core.db.models import Node
+from core.system.events import log_event_async
+from core.system.fleet import JOBS, claim_jobs_async, report_results_async
+from core.system.nodes import (
+    fleet_summary_async,
+    heartbeat_async,
+    heartbeat_many_async,
+    list_nodes_async,
+    node_cursor,
+    parse_node_cursor,
+    upsert_node_async,
+)
+from core.system.telemetry import hottest_nodes_async, node_history_async
 
 
 router = APIRouter(prefix="/api/nodes", tags=["nodes"])
@@ -21,11 +35,20 @@ class NodeRegisterIn(BaseModel):
     capabilities: dict | list | str | None = None
 
 
+def _as_utc(at: datetime) -> datetime:
+    # DB rows come back naive (stored in UTC), registry records aware: answer
+    # with one form whichever served the request.
+    return at.replace(tzinfo=timezone.utc) if at.tzinfo is None else at.astimezone(timezone.utc)
+
+
+UtcDatetime = Annotated[datetime, AfterValidator(_as_utc)]
+
+
 class NodeOut(BaseModel):
     id: int
     name: str
     ip: str
-    last_seen: datetime
+    last_seen: UtcDatetime
     public_key: str | None = None
     capabilities: str | None = None
     last_command: str | None = None
@@ -34,28 +57,72 @@ class NodeOut(BaseModel):
     status_flags: str | None = None
 
 
+class NodeJobOut(BaseModel):
+    id: int
+    dispatch_id: int
+    node_id: int
+    name: str
+    created_at: datetime
+    timeout_seconds: int
+
+
+class HeartbeatOut(NodeOut):
+    jobs: list[NodeJobOut] = []
+
+
 class HeartbeatIn(BaseModel):
     version: str | None = Field(default=None, max_length=64)
     load: str | None = Field(default=None, max_length=64)
     status_flags: dict | list | str | None = None
 
 
+class HeartbeatBatchItem(HeartbeatIn):
+    node_id: int
+
+
+class HeartbeatBatchIn(BaseModel):
+    heartbeats: list[HeartbeatBatchItem] = Field(max_length=5000)
+
+
+class HeartbeatBatchOut(BaseModel):
+    accepted: int
+    unknown: list[int]
+    jobs: list[NodeJobOut] = []
+
+
+class JobResultIn(BaseModel):
+    job_id: int
+    node_id: int
+    status: Literal["OK", "FAIL", "TIMEOUT"]
+    return_code: int | None = None
+    output: str | None = None
+
+
+class JobResultsIn(BaseModel):
+    results: list[JobResultIn] = Field(max_length=5000)
+
+
+class JobResultsOut(BaseModel):
+    accepted: int
+    unknown: list[int]
+
+
 @router.post("/register", response_model=NodeOut)
-def post_register(
+async def post_register(
     payload: NodeRegisterIn,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     requester = getattr(request.state, "requester", "unknown")
     ip = payload.ip or (request.client.host if request.client else "unknown")
-    node = upsert_node(
+    node = await upsert_node_async(
         db,
         name=payload.name,
         ip=ip,
         public_key=payload.public_key,
         capabilities=payload.capabilities,
     )
-    log_event(
+    await log_event_async(
         db,
         f"node register: {node.name} ({node.ip}) by {requester}",
         event_type="node.register",
@@ -65,34 +132,138 @@ def post_register(
     return node
 
 
-@router.post("/{node_id}/heartbeat", response_model=NodeOut)
-def post_heartbeat(
+@router.post("/{node_id}/heartbeat", response_model=HeartbeatOut)
+async def post_heartbeat(
     node_id: int,
     payload: HeartbeatIn,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     requester = getattr(request.state, "requester", "unknown")
-    node = heartbeat(
+    # Buffered: last_seen/payload reach the DB (with the heartbeat event) on the next flush.
+    node = await heartbeat_async(
         db,
         node_id=node_id,
         version=payload.version,
         load=payload.load,
         status_flags=payload.status_flags,
+        requester=requester,
     )
     if node is None:
         raise HTTPException(status_code=404, detail="Node not found")
-    log_event(
+    # Queued fleet jobs ride back on the response; the core never connects out.
+    jobs = await claim_jobs_async(db, [node_id]) if JOBS.has_pending(node_id) else []
+    return {**node, "jobs": jobs}
+
+
+@router.post("/heartbeats", response_model=HeartbeatBatchOut)
+async def post_heartbeats(
+    payload: HeartbeatBatchIn,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Gateways forward many node heartbeats in one request.
+    requester = getattr(request.state, "requester", "unknown")
+    accepted, unknown = await heartbeat_many_async(
         db,
-        f"node heartbeat: {node.name} ({node.ip}) by {requester}",
-        event_type="node.heartbeat",
-        source="node",
-        severity="info",
+        [hb.model_dump() for hb in payload.heartbeats],
+        requester=requester,
     )
-    return node
+    with_jobs = [n["id"] for n in accepted if JOBS.has_pending(n["id"])]
+    jobs = await claim_jobs_async(db, with_jobs) if with_jobs else []
+    return {"accepted": len(accepted), "unknown": unknown, "jobs": jobs}
 
 
-@router.get("", response_model=list[NodeOut])
-def get_nodes(limit: int = 200, db: Session = Depends(get_db)):
-    return list_nodes(db, limit=limit)
+@router.get("/{node_id}/jobs", response_model=list[NodeJobOut])
+async def get_jobs(node_id: int, wait: float = 0):
+    """
+    Long-poll for queued jobs: returns as soon as there are any, or [] after
+    `wait` seconds (capped by BLACKFONG_NODE_JOBS_MAX_WAIT_SECONDS).
+    """
+    # Short-lived sessions: a pooled connection must not be held across the wait.
+    async with AsyncSessionLocal() as db:
+        if await db.get(Node, node_id) is None:
+            raise HTTPException(status_code=404, detail="Node not found")
+    deadline = time.monotonic() + min(max(0.0, wait), SETTINGS.node_jobs_max_wait_seconds)
+    while True:
+        if JOBS.has_pending(node_id):
+            async with AsyncSessionLocal() as db:
+                jobs = await claim_jobs_async(db, [node_id])
+            if jobs:
+                return jobs
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return []
+        await JOBS.wait(node_id, remaining)
+
+
+@router.post("/jobs/results", response_model=JobResultsOut)
+async def post_job_results(payload: JobResultsIn, db: AsyncSession = Depends(get_async_db)):
+    # Nodes (or their gateway) report outcomes in batches.
+    accepted, unknown = await report_results_async(db, [r.model_dump() for r in payload.results])
+    return {"accepted": accepted, "unknown": unknown}
+
+
+@router.get("/summary")
+async def get_summary(db: AsyncSession = Depends(get_async_db)) -> dict:
+    # alive/stale from REGISTRY's running counts; version/flags histograms in SQL.
+    return await fleet_summary_async(db)
 
+
+@router.get("/hottest")
+async def get_hottest(
+    limit: int = Query(default=10, ge=1, le=1000),
+    window_seconds: int | None = Query(default=None, ge=1),
+    db: AsyncSession = Depends(get_async_db),
+) -> list[dict]:
+    # Latest load by default; peak over the last window_seconds if given.
+    return await hottest_nodes_async(db, limit=limit, window_seconds=window_seconds)
+
+
+@router.get("/{node_id}/history")
+async def get_history(
+    node_id: int,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    max_points: int = Query(default=500, ge=10, le=5000),
+    db: AsyncSession = Depends(get_async_db),
+) -> dict:
+    """
+    Load series and status_flags changes from heartbeats; defaults to the last 24 hours.
+    """
+    if await db.get(Node, node_id) is None:
+        raise HTTPException(status_code=404, detail="Node not found")
+    end_dt = end or datetime.now(tz=timezone.utc)
+    start_dt = start or (end_dt - timedelta(hours=24))
+    return await node_history_async(db, node_id, start_dt, end_dt, max_points=max_points)
+
+
+@router.get("", response_model=list[NodeOut])
+async def get_nodes(
+    response: Response,
+    limit: int = 200,
+    before: str | None = None,
+    stale: bool | None = None,
+    version: str | None = None,
+    name_prefix: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Most recently seen first; page with before=<X-Next-Before>.
+    """
+    try:
+        cursor = parse_node_cursor(before) if before is not None else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    page_size = min(1000, max(1, limit))
+    rows = await list_nodes_async(
+        db,
+        limit=page_size,
+        before=cursor,
+        stale=stale,
+        version=version,
+        name_prefix=name_prefix,
+    )
+    if len(rows) == page_size:
+        response.headers["X-Next-Before"] = node_cursor(rows[-1])
+    return rows
@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+from collections.abc import AsyncIterator, Callable
+
+from fastapi import APIRouter, Header, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from core.db.database import AsyncSessionLocal
+from core.system.events import query_events_async
+from core.system.realtime import HUB, TOPICS
+
+
+router = APIRouter(prefix="/api/realtime", tags=["realtime"])
+
+_KEEPALIVE_SECONDS = 15.0
+_BACKFILL_PAGE = 500
+
+
+class _Filters:
+    """Server-side filters from query params; empty means "everything"."""
+
+    def __init__(
+        self,
+        topics: str | None,
+        event_type: str | None,
+        source: str | None,
+        severity: str | None,
+        node_id: str | None,
+        name_prefix: str | None,
+        run_id: str | None,
+        command: str | None,
+    ) -> None:
+        self.topics = _csv(topics) or set(TOPICS)
+        unknown = self.topics - set(TOPICS)
+        if unknown:
+            raise ValueError(f"unknown topic(s): {', '.join(sorted(unknown))}; use {', '.join(TOPICS)}")
+        self.event_type = _csv(event_type)
+        self.source = {s.lower() for s in _csv(source)}
+        self.severity = {s.lower() for s in _csv(severity)}
+        try:
+            self.node_ids = {int(x) for x in _csv(node_id)}
+            self.run_ids = {int(x) for x in _csv(run_id)}
+        except ValueError:
+            raise ValueError("node_id/run_id must be integers") from None
+        self.name_prefix = name_prefix or None
+        self.commands = _csv(command)
+
+    def match(self) -> Callable[[dict], bool] | None:
+        checks: list[Callable[[dict], bool]] = []
+        if self.event_type:
+            checks.append(lambda m: m["topic"] != "events" or m["data"]["event_type"] in self.event_type)
+        if self.source:
+            checks.append(lambda m: m["topic"] != "events" or m["data"]["source"] in self.source)
+        if self.severity:
+            checks.append(lambda m: m["topic"] != "events" or m["data"]["severity"] in self.severity)
+        if self.node_ids:
+            checks.append(lambda m: m["topic"] != "nodes" or m["data"]["id"] in self.node_ids)
+        if self.name_prefix:
+            prefix = self.name_prefix
+            checks.append(lambda m: m["topic"] != "nodes" or m["data"]["name"].startswith(prefix))
+        if self.run_ids:
+            checks.append(lambda m: m["topic"] != "commands" or m["data"]["id"] in self.run_ids)
+        if self.commands:
+            checks.append(lambda m: m["topic"] != "commands" or m["data"]["name"] in self.commands)
+        if not checks:
+            return None
+        return lambda m: all(c(m) for c in checks)
+
+
+def _json(value) -> str:
+    # Payloads keep datetimes as-is (publishing stays cheap); format on send.
+    return json.dumps(value, default=lambda o: o.isoformat() if hasattr(o, "isoformat") else str(o))
+
+
+def _csv(value: str | None) -> set[str]:
+    return {v.strip() for v in (value or "").split(",") if v.strip()}
+
+
+def _one(values: set[str]) -> str | None:
+    # query_events takes one value per filter; several values are matched after.
+    return next(iter(values)) if len(values) == 1 else None
+
+
+async def _backfill(f: _Filters, since_event_id: int) -> AsyncIterator[dict]:
+    """Persisted events after since_event_id, oldest first, through the filter indexes."""
+    match = f.match()
+    last = since_event_id
+    async with AsyncSessionLocal() as db:
+        while True:
+            rows = await query_events_async(
+                db,
+                limit=_BACKFILL_PAGE,
+                after_id=last,
+                event_type=_one(f.event_type),
+                source=_one(f.source),
+                severity=_one(f.severity),
+            )
+            for r in rows:
+                msg = {
+                    "id": None,
+                    "topic": "events",
+                    "data": {
+                        "id": r.id,
+                        "at": r.at.isoformat(),
+                        "level": r.level,
+                        "event_type": r.event_type,
+                        "source": r.source,
+                        "severity": r.severity,
+                        "message": r.message,
+                    },
+                }
+                last = r.id
+                if match is None or match(msg):
+                    yield msg
+            if len(rows) < _BACKFILL_PAGE:
+                return
+
+
+async def _messages(f: _Filters, last_id: int | None, since_event_id: int | None) -> AsyncIterator[dict | None]:
+    """
+    Replay (ring after last_id, then DB events after since_event_id), then
+    live messages. Yields None when idle for the keepalive interval.
+    """
+    sub, replay = HUB.subscribe(f.topics, f.match(), after_id=last_id)
+    try:
+        sent = last_id or 0
+        max_event = since_event_id or 0
+        if last_id is not None and replay is None:
+            # Ring no longer covers it (or another process): client should resync.
+            yield {"id": HUB.last_id, "topic": "reset", "data": {"reason": "last_id not buffered"}}
+            replay = []
+
+        if since_event_id is not None and "events" in f.topics:
+            async for msg in _backfill(f, since_event_id):
+                max_event = msg["data"]["id"]
+                yield msg
+
+        for msg in replay or []:
+            if msg["id"] > sent and not _already_sent(msg, max_event):
+                sent = msg["id"]
+                yield msg
+
+        while True:
+            try:
+                msg = await asyncio.wait_for(sub.queue.get(), timeout=_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if msg is None:
+                break
+            if msg["id"] > sent and not _already_sent(msg, max_event):
+                sent = msg["id"]
+                yield msg
+        if sub.lagged:
+            yield {"id": sent, "topic": "lagged", "data": {"resume": f"last_id={sent}"}}
+    finally:
+        HUB.unsubscribe(sub)
+
+
+def _already_sent(msg: dict, max_event: int) -> bool:
+    # Live events that the DB backfill already delivered.
+    return msg["topic"] == "events" and msg["data"]["id"] is not None and msg["data"]["id"] <= max_event
+
+
+def _filters(**params) -> _Filters:
+    try:
+        return _Filters(**params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/stream")
+async def stream(
+    topics: str | None = Query(default=None, description=f"comma-separated: {', '.join(TOPICS)}"),
+    event_type: str | None = None,
+    source: str | None = None,
+    severity: str | None = None,
+    node_id: str | None = None,
+    name_prefix: str | None = None,
+    run_id: str | None = None,
+    command: str | None = None,
+    last_id: int | None = Query(default=None, description="resume after this message id"),
+    since_event_id: int | None = Query(default=None, description="replay stored events after this event id"),
+    last_event_id: str | None = Header(default=None),
+):
+    """
+    Server-Sent Events; `event:` is the topic, `id:` the message id.
+    Reconnects resume after Last-Event-ID while the server still buffers it.
+    """
+    f = _filters(
+        topics=topics,
+        event_type=event_type,
+        source=source,
+        severity=severity,
+        node_id=node_id,
+        name_prefix=name_prefix,
+        run_id=run_id,
+        command=command,
+    )
+    if last_id is None and last_event_id and last_event_id.isdigit():
+        last_id = int(last_event_id)
+
+    async def body():
+        async for msg in _messages(f, last_id, since_event_id):
+            if msg is None:
+                yield ": keepalive\n\n"
+                continue
+            head = f"id: {msg['id']}\n" if msg["id"] is not None else ""
+            yield f"{head}event: {msg['topic']}\ndata: {_json(msg['data'])}\n\n"
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ws")
+async def websocket(
+    ws: WebSocket,
+    topics: str | None = None,
+    event_type: str | None = None,
+    source: str | None = None,
+    severity: str | None = None,
+    node_id: str | None = None,
+    name_prefix: str | None = None,
+    run_id: str | None = None,
+    command: str | None = None,
+    last_id: int | None = None,
+    since_event_id: int | None = None,
+):
+    """Same messages as /stream, one JSON object per frame: {id, topic, data}."""
+    try:
+        f = _Filters(
+            topics=topics,
+            event_type=event_type,
+            source=source,
+            severity=severity,
+            node_id=node_id,
+            name_prefix=name_prefix,
+            run_id=run_id,
+            command=command,
+        )
+    except ValueError as e:
+        await ws.close(code=1008, reason=str(e))
+        return
+    await ws.accept()
+
+    async def _drain() -> None:
+        # Clients don't send anything; reading notices the disconnect.
+        with contextlib.suppress(WebSocketDisconnect):
+            while True:
+                await ws.receive_text()
+
+    reader = asyncio.create_task(_drain())
+    try:
+        async for msg in _messages(f, last_id, since_event_id):
+            if reader.done():
+                break
+            if msg is None:
+                continue
+            await ws.send_text(_json(msg))
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError: sending after the client went away.
+        pass
+    finally:
+        reader.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await reader
@@ -1,16 +1,42 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 
 from core.db.database import get_db
 from core.system.events import log_event
-from core.system.services import service_action
+from core.system.services import SERVICES, check_unit, service_action, service_status
 
 
 router = APIRouter(prefix="/api/services", tags=["services"])
 
 
+@router.get("")
+def get_services(units: str | None = Query(default=None, description="comma-separated; default: allowlist")) -> dict:
+    # Bulk view from one cached `systemctl show` call.
+    wanted = None
+    if units:
+        wanted = [u.strip() for u in units.split(",") if u.strip()]
+        try:
+            for u in wanted:
+                check_unit(u)
+        except PermissionError as e:
+            raise HTTPException(status_code=403, detail=f"{u}: {e}")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"{u}: {e}")
+    return SERVICES.snapshot(wanted)
+
+
+@router.get("/{unit}")
+def get_service(unit: str) -> dict:
+    try:
+        return service_status(unit)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.post("/{unit}/{action}")
 def post_service_action(
     unit: str,
@@ -1,9 +1,20 @@
 from __future__ import annotations
 
-from fastapi import APIRouter
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.config import SETTINGS
-from core.system.metrics import system_pulse
+from core.db.database import engine_pragmas, get_async_db
+from core.system.backups import BACKUPS, list_backups, verify_backup
+from core.system.health import HEALTH, health_history_async
+from core.system.leader import LEADER
+from core.system.metrics import SAMPLER, current_pulse
+from core.system.perf import PERF
+from core.system.timeseries import PULSE_STORE
 
 
 router = APIRouter(prefix="/api/system", tags=["system"])
@@ -11,7 +22,88 @@ router = APIRouter(prefix="/api/system", tags=["system"])
 
 @router.get("/pulse")
 def get_pulse() -> dict:
-    return system_pulse()
+    return current_pulse()
+
+
+@router.get("/pulse/history")
+def get_pulse_history(window: int = Query(default=300, ge=1)) -> dict:
+    # Columnar series from the in-memory ring (no psutil calls).
+    return {
+        "interval_seconds": SAMPLER.interval_seconds,
+        "window_seconds": window,
+        "series": SAMPLER.ring.window(window),
+    }
+
+
+@router.get("/pulse/series")
+def get_pulse_series(
+    start: datetime | None = None,
+    end: datetime | None = None,
+    max_points: int = Query(default=500, ge=10, le=5000),
+    resolution: Literal["raw", "1m", "1h"] | None = None,
+) -> dict:
+    # Persisted history; defaults to the last hour.
+    end_dt = end or datetime.now(tz=timezone.utc)
+    start_dt = start or (end_dt - timedelta(hours=1))
+    return PULSE_STORE.query(
+        int(start_dt.timestamp()),
+        int(end_dt.timestamp()),
+        max_points=max_points,
+        resolution=resolution,
+    )
+
+
+@router.get("/health")
+def get_health() -> dict:
+    # Kept current by the rule engine on every pulse sample; a dict copy here.
+    return {**HEALTH.current(), "rules_path": str(SETTINGS.health_rules_path)}
+
+
+@router.get("/health/history")
+async def get_health_history(
+    limit: int = Query(default=100, ge=1, le=1000),
+    before_id: int | None = None,
+    db: AsyncSession = Depends(get_async_db),
+) -> list[dict]:
+    """State transitions, newest first; page back with before_id."""
+    return await health_history_async(db, limit=limit, before_id=before_id)
+
+
+def _backup_entry(path) -> dict:
+    st = path.stat()
+    return {
+        "file": path.name,
+        "bytes": st.st_size,
+        "modified_at": datetime.fromtimestamp(st.st_mtime, tz=timezone.utc).isoformat(),
+        "manifest": path.with_name(path.name + ".json").exists(),
+    }
+
+
+@router.get("/backups")
+def get_backups() -> dict:
+    return {**BACKUPS.status(), "backups": [_backup_entry(p) for p in list_backups()]}
+
+
+@router.post("/backups", status_code=202)
+def post_backup() -> dict:
+    # Runs in a worker thread; poll GET /backups for progress.
+    if not BACKUPS.start(label="manual"):
+        raise HTTPException(status_code=409, detail="Backup already running")
+    return BACKUPS.status()
+
+
+@router.post("/backups/{name}/verify")
+def post_backup_verify(name: str) -> dict:
+    path = next((p for p in list_backups() if p.name == name), None)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Backup not found")
+    return verify_backup(path)
+
+
+@router.get("/perf")
+def get_perf(slowest: int = Query(default=10, ge=1, le=100)) -> dict:
+    # Same timers as /metrics, with percentiles in milliseconds.
+    return PERF.snapshot(slowest=slowest)
 
 
 @router.get("/config")
@@ -31,6 +123,32 @@ def get_config() -> dict:
             "allowed_systemd_units": sorted(SETTINGS.allowed_systemd_units),
         },
         "fleet": {"node_stale_seconds": SETTINGS.node_stale_seconds},
-        "backups": {"keep_days": SETTINGS.backup_keep_days},
+        "workers": {
+            "count": SETTINGS.workers,
+            "pid": os.getpid(),
+            "leader": LEADER.is_leader,
+            "leader_pid": LEADER.holder(),
+        },
+        "backups": {
+            "keep_days": SETTINGS.backup_keep_days,
+            "compression": SETTINGS.backup_compression,
+            "pages_per_step": SETTINGS.backup_pages_per_step,
+            "step_sleep_ms": SETTINGS.backup_step_sleep_ms,
+        },
+        "db": {
+            "pragmas": engine_pragmas(),
+            "pool_size": SETTINGS.db_pool_size,
+            "max_overflow": SETTINGS.db_max_overflow,
+        },
+        "metrics": {
+            "pulse_interval_seconds": SETTINGS.pulse_interval_seconds,
+            "pulse_history_size": SETTINGS.pulse_history_size,
+            "db_path": str(SETTINGS.metrics_db_path),
+            "retention": {
+                "raw_hours": SETTINGS.metrics_raw_retention_hours,
+                "1m_days": SETTINGS.metrics_1m_retention_days,
+                "1h_days": SETTINGS.metrics_1h_retention_days,
+            },
+        },
     }
 
@@ -10,6 +10,13 @@ def _env(name: str, default: str) -> str:
     return default if v is None or v.strip() == "" else v
 
 
+def _env_bool(name: str, default: bool) -> bool:
+    v = os.getenv(name)
+    if v is None or v.strip() == "":
+        return default
+    return v.strip().lower() in {"1", "true", "yes", "on"}
+
+
 def _env_int(name: str, default: int) -> int:
     v = os.getenv(name)
     if v is None or v.strip() == "":
@@ -26,6 +33,19 @@ class Settings:
     log_dir: Path
     backup_dir: Path
     backup_keep_days: int
+    backup_compression: str  # gzip/zstd/none
+    backup_pages_per_step: int
+    backup_step_sleep_ms: int
+
+    # SQLite engine profile
+    sqlite_journal_mode: str
+    sqlite_synchronous: str
+    sqlite_mmap_size: int
+    sqlite_cache_size: int
+    sqlite_busy_timeout_ms: int
+    sqlite_temp_store: str
+    db_pool_size: int
+    db_max_overflow: int
 
     # Network
     api_host: str
@@ -38,6 +58,71 @@ class Settings:
     allowed_systemd_units: set[str]
     node_stale_seconds: int
 
+    # Metrics
+    pulse_interval_seconds: int
+    pulse_history_size: int
+    metrics_db_path: Path
+    metrics_flush_seconds: int
+    metrics_raw_retention_hours: int
+    metrics_1m_retention_days: int
+    metrics_1h_retention_days: int
+
+    # Fleet ingestion
+    heartbeat_flush_ms: int
+
+    # Event log pipeline
+    events_sync: bool
+    events_queue_size: int
+    events_batch_size: int
+    events_flush_ms: int
+
+    # Command engine
+    command_workers: int
+    command_timeout_seconds: int
+    command_output_cap_bytes: int
+
+    # Retention
+    event_retention_days: int
+    event_max_rows: int
+    command_run_retention_days: int
+    command_run_max_rows: int
+    retention_batch_rows: int
+    archive_events: bool
+    archive_dir: Path
+    log_max_bytes: int
+    log_backups: int
+
+    # UI
+    dashboard_ttl_seconds: int
+
+    # Perf instrumentation
+    perf_enabled: bool
+    perf_recent_requests: int
+
+    # Services
+    systemctl_path: Path
+    service_status_ttl_seconds: int
+
+    # Realtime push
+    realtime_buffer_size: int
+    realtime_queue_size: int
+
+    # Workers
+    workers: int
+    leader_retry_seconds: int
+
+    # Fleet dispatch
+    node_job_ttl_seconds: int
+    node_jobs_max_wait_seconds: int
+    node_job_output_cap_bytes: int
+
+    # Node telemetry
+    node_telemetry_flush_seconds: int
+    node_telemetry_retention_days: int
+
+    # Health rules
+    health_rules_path: Path
+
 
 def load_settings() -> Settings:
     # Deployment target is /opt/blackfong, but default to the repo root when
@@ -60,6 +145,19 @@ def load_settings() -> Settings:
     log_dir = Path(_env("BLACKFONG_LOG_DIR", str(data_dir / "logs")))
     backup_dir = Path(_env("BLACKFONG_BACKUP_DIR", str(data_dir / "backups")))
     backup_keep_days = _env_int("BLACKFONG_BACKUP_KEEP_DAYS", 7)
+    backup_compression = _env("BLACKFONG_BACKUP_COMPRESSION", "gzip").lower()
+    backup_pages_per_step = max(1, _env_int("BLACKFONG_BACKUP_PAGES_PER_STEP", 1024))
+    backup_step_sleep_ms = max(0, _env_int("BLACKFONG_BACKUP_STEP_SLEEP_MS", 10))
+
+    sqlite_journal_mode = _env("BLACKFONG_SQLITE_JOURNAL_MODE", "WAL").upper()
+    sqlite_synchronous = _env("BLACKFONG_SQLITE_SYNCHRONOUS", "NORMAL").upper()
+    sqlite_mmap_size = _env_int("BLACKFONG_SQLITE_MMAP_SIZE", 64 * 1024 * 1024)
+    # Negative = KiB (SQLite convention); default ~16 MiB per connection.
+    sqlite_cache_size = _env_int("BLACKFONG_SQLITE_CACHE_SIZE", -16000)
+    sqlite_busy_timeout_ms = _env_int("BLACKFONG_SQLITE_BUSY_TIMEOUT_MS", 5000)
+    sqlite_temp_store = _env("BLACKFONG_SQLITE_TEMP_STORE", "MEMORY").upper()
+    db_pool_size = max(1, _env_int("BLACKFONG_DB_POOL_SIZE", 8))
+    db_max_overflow = max(0, _env_int("BLACKFONG_DB_MAX_OVERFLOW", 16))
 
     api_host = _env("BLACKFONG_API_HOST", "127.0.0.1")
     api_port = _env_int("BLACKFONG_API_PORT", 7331)
@@ -74,6 +172,61 @@ def load_settings() -> Settings:
 
     node_stale_seconds = _env_int("BLACKFONG_NODE_STALE_SECONDS", 60)
 
+    pulse_interval_seconds = max(1, _env_int("BLACKFONG_PULSE_INTERVAL_SECONDS", 2))
+    # Default: one hour of samples at 2s.
+    pulse_history_size = max(1, _env_int("BLACKFONG_PULSE_HISTORY_SIZE", 1800))
+    metrics_db_path = Path(_env("BLACKFONG_METRICS_DB_PATH", str(db_path.parent / "metrics.db")))
+    metrics_flush_seconds = max(1, _env_int("BLACKFONG_METRICS_FLUSH_SECONDS", 60))
+    metrics_raw_retention_hours = max(1, _env_int("BLACKFONG_METRICS_RAW_RETENTION_HOURS", 48))
+    metrics_1m_retention_days = max(1, _env_int("BLACKFONG_METRICS_1M_RETENTION_DAYS", 14))
+    metrics_1h_retention_days = max(1, _env_int("BLACKFONG_METRICS_1H_RETENTION_DAYS", 365))
+
+    # 0 = write each heartbeat through immediately (no coalescing).
+    heartbeat_flush_ms = max(0, _env_int("BLACKFONG_HEARTBEAT_FLUSH_MS", 500))
+
+    # Sync mode writes each event in the caller (tests, debugging).
+    events_sync = _env_bool("BLACKFONG_EVENTS_SYNC", False)
+    events_queue_size = max(1, _env_int("BLACKFONG_EVENTS_QUEUE_SIZE", 10000))
+    events_batch_size = max(1, _env_int("BLACKFONG_EVENTS_BATCH_SIZE", 500))
+    events_flush_ms = max(1, _env_int("BLACKFONG_EVENTS_FLUSH_MS", 200))
+
+    command_workers = max(1, _env_int("BLACKFONG_COMMAND_WORKERS", 2))
+    command_timeout_seconds = max(1, _env_int("BLACKFONG_COMMAND_TIMEOUT_SECONDS", 600))
+    command_output_cap_bytes = max(0, _env_int("BLACKFONG_COMMAND_OUTPUT_CAP_BYTES", 1024 * 1024))
+
+    event_retention_days = max(1, _env_int("BLACKFONG_EVENT_RETENTION_DAYS", 30))
+    event_max_rows = max(1000, _env_int("BLACKFONG_EVENT_MAX_ROWS", 1_000_000))
+    command_run_retention_days = max(1, _env_int("BLACKFONG_COMMAND_RUN_RETENTION_DAYS", 90))
+    command_run_max_rows = max(100, _env_int("BLACKFONG_COMMAND_RUN_MAX_ROWS", 10_000))
+    retention_batch_rows = max(100, _env_int("BLACKFONG_RETENTION_BATCH_ROWS", 2000))
+    archive_events = _env_bool("BLACKFONG_ARCHIVE_EVENTS", True)
+    archive_dir = Path(_env("BLACKFONG_ARCHIVE_DIR", str(data_dir / "archive")))
+    log_max_bytes = max(0, _env_int("BLACKFONG_LOG_MAX_BYTES", 10 * 1024 * 1024))
+    log_backups = max(1, _env_int("BLACKFONG_LOG_BACKUPS", 5))
+
+    dashboard_ttl_seconds = max(1, _env_int("BLACKFONG_DASHBOARD_TTL_SECONDS", 2))
+
+    perf_enabled = _env_bool("BLACKFONG_PERF_ENABLED", True)
+    perf_recent_requests = max(1, _env_int("BLACKFONG_PERF_RECENT_REQUESTS", 512))
+
+    systemctl_path = Path(_env("BLACKFONG_SYSTEMCTL", "/bin/systemctl"))
+    service_status_ttl_seconds = max(0, _env_int("BLACKFONG_SERVICE_STATUS_TTL_SECONDS", 5))
+
+    realtime_buffer_size = max(1, _env_int("BLACKFONG_REALTIME_BUFFER_SIZE", 4096))
+    realtime_queue_size = max(1, _env_int("BLACKFONG_REALTIME_QUEUE_SIZE", 1024))
+
+    workers = max(1, _env_int("BLACKFONG_WORKERS", 1))
+    leader_retry_seconds = max(1, _env_int("BLACKFONG_LEADER_RETRY_SECONDS", 5))
+
+    node_job_ttl_seconds = max(1, _env_int("BLACKFONG_NODE_JOB_TTL_SECONDS", 3600))
+    node_jobs_max_wait_seconds = max(0, _env_int("BLACKFONG_NODE_JOBS_MAX_WAIT_SECONDS", 30))
+    node_job_output_cap_bytes = max(0, _env_int("BLACKFONG_NODE_JOB_OUTPUT_CAP_BYTES", 64 * 1024))
+
+    node_telemetry_flush_seconds = max(1, _env_int("BLACKFONG_NODE_TELEMETRY_FLUSH_SECONDS", 60))
+    node_telemetry_retention_days = max(1, _env_int("BLACKFONG_NODE_TELEMETRY_RETENTION_DAYS", 14))
+
+    health_rules_path = Path(_env("BLACKFONG_HEALTH_RULES_PATH", str(data_dir / "health_rules.json")))
+
     return Settings(
         base_dir=base_dir,
         data_dir=data_dir,
@@ -81,11 +234,61 @@ def load_settings() -> Settings:
         log_dir=log_dir,
         backup_dir=backup_dir,
         backup_keep_days=backup_keep_days,
+        backup_compression=backup_compression,
+        backup_pages_per_step=backup_pages_per_step,
+        backup_step_sleep_ms=backup_step_sleep_ms,
+        sqlite_journal_mode=sqlite_journal_mode,
+        sqlite_synchronous=sqlite_synchronous,
+        sqlite_mmap_size=sqlite_mmap_size,
+        sqlite_cache_size=sqlite_cache_size,
+        sqlite_busy_timeout_ms=sqlite_busy_timeout_ms,
+        sqlite_temp_store=sqlite_temp_store,
+        db_pool_size=db_pool_size,
+        db_max_overflow=db_max_overflow,
         api_host=api_host,
         api_port=api_port,
         token=token,
         allowed_systemd_units=allowed_systemd_units,
         node_stale_seconds=node_stale_seconds,
+        pulse_interval_seconds=pulse_interval_seconds,
+        pulse_history_size=pulse_history_size,
+        metrics_db_path=metrics_db_path,
+        metrics_flush_seconds=metrics_flush_seconds,
+        metrics_raw_retention_hours=metrics_raw_retention_hours,
+        metrics_1m_retention_days=metrics_1m_retention_days,
+        metrics_1h_retention_days=metrics_1h_retention_days,
+        heartbeat_flush_ms=heartbeat_flush_ms,
+        events_sync=events_sync,
+        events_queue_size=events_queue_size,
+        events_batch_size=events_batch_size,
+        events_flush_ms=events_flush_ms,
+        command_workers=command_workers,
+        command_timeout_seconds=command_timeout_seconds,
+        command_output_cap_bytes=command_output_cap_bytes,
+        event_retention_days=event_retention_days,
+        event_max_rows=event_max_rows,
+        command_run_retention_days=command_run_retention_days,
+        command_run_max_rows=command_run_max_rows,
+        retention_batch_rows=retention_batch_rows,
+        archive_events=archive_events,
+        archive_dir=archive_dir,
+        log_max_bytes=log_max_bytes,
+        log_backups=log_backups,
+        dashboard_ttl_seconds=dashboard_ttl_seconds,
+        perf_enabled=perf_enabled,
+        perf_recent_requests=perf_recent_requests,
+        systemctl_path=systemctl_path,
+        service_status_ttl_seconds=service_status_ttl_seconds,
+        realtime_buffer_size=realtime_buffer_size,
+        realtime_queue_size=realtime_queue_size,
+        workers=workers,
+        leader_retry_seconds=leader_retry_seconds,
+        node_job_ttl_seconds=node_job_ttl_seconds,
+        node_jobs_max_wait_seconds=node_jobs_max_wait_seconds,
+        node_job_output_cap_bytes=node_job_output_cap_bytes,
+        node_telemetry_flush_seconds=node_telemetry_flush_seconds,
+        node_telemetry_retention_days=node_telemetry_retention_days,
+        health_rules_path=health_rules_path,
     )
 
 
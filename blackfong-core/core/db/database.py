@@ -1,37 +1,129 @@
 from __future__ import annotations
 
-from collections.abc import Generator
+import os
+from collections.abc import AsyncGenerator, Generator
 from pathlib import Path
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from core.config import SETTINGS
+from core.system.perf import PERF
+
+
+_JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+_SYNCHRONOUS = {"OFF", "NORMAL", "FULL", "EXTRA"}
+_TEMP_STORE = {"DEFAULT", "FILE", "MEMORY"}
 
 
 def _ensure_parent_dir(path: Path) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
 
 
-def create_db_engine() -> Engine:
-    _ensure_parent_dir(SETTINGS.db_path)
-    url = f"sqlite:///{SETTINGS.db_path}"
-    return create_engine(
+def _choice(value: str, allowed: set[str], name: str) -> str:
+    if value not in allowed:
+        raise ValueError(f"{name} must be one of {sorted(allowed)}, got {value!r}")
+    return value
+
+
+def engine_pragmas() -> dict[str, str | int]:
+    """
+    Per-connection PRAGMAs from Settings (order matters: busy_timeout first).
+    """
+    return {
+        "busy_timeout": SETTINGS.sqlite_busy_timeout_ms,
+        # Only takes effect on a new DB; retention converts older ones once.
+        "auto_vacuum": "INCREMENTAL",
+        "journal_mode": _choice(SETTINGS.sqlite_journal_mode, _JOURNAL_MODES, "BLACKFONG_SQLITE_JOURNAL_MODE"),
+        "synchronous": _choice(SETTINGS.sqlite_synchronous, _SYNCHRONOUS, "BLACKFONG_SQLITE_SYNCHRONOUS"),
+        "mmap_size": SETTINGS.sqlite_mmap_size,
+        "cache_size": SETTINGS.sqlite_cache_size,
+        "temp_store": _choice(SETTINGS.sqlite_temp_store, _TEMP_STORE, "BLACKFONG_SQLITE_TEMP_STORE"),
+    }
+
+
+def _listen_pragmas(engine: Engine, applied: dict[str, str | int]) -> None:
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_conn, _record) -> None:
+        cur = dbapi_conn.cursor()
+        try:
+            for name, value in applied.items():
+                cur.execute(f"PRAGMA {name}={value}")
+        finally:
+            cur.close()
+
+
+def create_db_engine(
+    db_path: Path | None = None,
+    *,
+    pragmas: dict[str, str | int] | None = None,
+) -> Engine:
+    path = db_path or SETTINGS.db_path
+    _ensure_parent_dir(path)
+    url = f"sqlite:///{path}"
+    engine = create_engine(
         url,
         future=True,
+        pool_size=SETTINGS.db_pool_size,
+        max_overflow=SETTINGS.db_max_overflow,
         connect_args={"check_same_thread": False},
     )
+    _listen_pragmas(engine, engine_pragmas() if pragmas is None else pragmas)
+    return engine
+
+
+def create_async_db_engine(
+    db_path: Path | None = None,
+    *,
+    pragmas: dict[str, str | int] | None = None,
+) -> AsyncEngine:
+    """
+    Same file and PRAGMAs through aiosqlite: each pooled connection has its
+    own thread, so async handlers wait on the pool, not the threadpool.
+    """
+    path = db_path or SETTINGS.db_path
+    _ensure_parent_dir(path)
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{path}",
+        # The dialect defaults to NullPool (a new connection + thread per checkout).
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=SETTINGS.db_pool_size,
+        max_overflow=SETTINGS.db_max_overflow,
+    )
+    _listen_pragmas(engine.sync_engine, engine_pragmas() if pragmas is None else pragmas)
+    return engine
 
 
 ENGINE = create_db_engine()
 SessionLocal = sessionmaker(bind=ENGINE, autoflush=False, autocommit=False, future=True)
 
+ASYNC_ENGINE = create_async_db_engine()
+AsyncSessionLocal = async_sessionmaker(bind=ASYNC_ENGINE, autoflush=False, expire_on_commit=False)
+
+
+def _reset_pools_after_fork() -> None:
+    # A forked worker (e.g. a pre-loading process manager) must not reuse the
+    # parent's SQLite connections; drop them without closing the parent's.
+    ENGINE.dispose(close=False)
+    ASYNC_ENGINE.sync_engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
 
 def get_db() -> Generator[Session, None, None]:
     db: Session = SessionLocal()
     try:
-        yield db
+        with PERF.timed("db_session", (("kind", "sync"),)):
+            yield db
     finally:
         db.close()
 
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        with PERF.timed("db_session", (("kind", "async"),)):
+            yield db
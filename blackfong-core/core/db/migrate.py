@@ -1,38 +1,52 @@
 from __future__ import annotations
 
-from sqlalchemy import inspect, text
+from collections.abc import Callable
+from datetime import datetime, timezone
 
+from sqlalchemy import insert, inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
+
+from core.config import SETTINGS
 from core.db.database import ENGINE
-from core.db.models import Base
+from core.db.models import Base, EventLog
+from core.system.events import build_event
+from core.system.leader import file_lock
+
+
+# SQLite runs DDL outside the driver's implicit transaction, so every
+# migration must be safe to re-run if a previous attempt died halfway.
 
 
-def _has_column(table: str, column: str) -> bool:
-    insp = inspect(ENGINE)
+def _has_column(conn: Connection, table: str, column: str) -> bool:
     try:
-        cols = insp.get_columns(table)
+        cols = inspect(conn).get_columns(table)
     except Exception:
         return False
     return any(c.get("name") == column for c in cols)
 
 
-def _add_column(table: str, ddl: str) -> None:
+def _add_column(conn: Connection, table: str, ddl: str) -> None:
     # SQLite supports: ALTER TABLE <t> ADD COLUMN <coldef>
-    with ENGINE.begin() as conn:
-        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {ddl}"))
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {ddl}"))
+
 
+def _create_indexes(conn: Connection, table: str, names: set[str]) -> None:
+    # Index definitions live on the models; migrations pick them by name.
+    for idx in Base.metadata.tables[table].indexes:
+        if idx.name in names:
+            idx.create(conn, checkfirst=True)
 
-def migrate() -> None:
-    # SQLite: simple "create if missing" is good enough for phase 1.
-    Base.metadata.create_all(bind=ENGINE)
 
+def _m001_additive_columns(conn: Connection) -> None:
     # Phase 2: lightweight additive migrations (ALTER TABLE ADD COLUMN).
     # event_log: event_type/source/severity
-    if not _has_column("event_log", "event_type"):
-        _add_column("event_log", "event_type VARCHAR(64) NOT NULL DEFAULT 'event'")
-    if not _has_column("event_log", "source"):
-        _add_column("event_log", "source VARCHAR(16) NOT NULL DEFAULT 'system'")
-    if not _has_column("event_log", "severity"):
-        _add_column("event_log", "severity VARCHAR(16) NOT NULL DEFAULT 'info'")
+    if not _has_column(conn, "event_log", "event_type"):
+        _add_column(conn, "event_log", "event_type VARCHAR(64) NOT NULL DEFAULT 'event'")
+    if not _has_column(conn, "event_log", "source"):
+        _add_column(conn, "event_log", "source VARCHAR(16) NOT NULL DEFAULT 'system'")
+    if not _has_column(conn, "event_log", "severity"):
+        _add_column(conn, "event_log", "severity VARCHAR(16) NOT NULL DEFAULT 'info'")
 
     # nodes: trust + heartbeat payload
     for col, ddl in [
@@ -43,10 +57,156 @@ def migrate() -> None:
         ("load", "load VARCHAR(64)"),
         ("status_flags", "status_flags TEXT"),
     ]:
-        if not _has_column("nodes", col):
-            _add_column("nodes", ddl)
+        if not _has_column(conn, "nodes", col):
+            _add_column(conn, "nodes", ddl)
 
     # command_runs: ledger identity
-    if not _has_column("command_runs", "requested_by"):
-        _add_column("command_runs", "requested_by VARCHAR(64)")
+    if not _has_column(conn, "command_runs", "requested_by"):
+        _add_column(conn, "command_runs", "requested_by VARCHAR(64)")
+
+
+# Listed by name#id in the migration's event; the archive table has them all.
+_DUPLICATES_LISTED = 100
+
+
+def _m002_hot_indexes(conn: Connection) -> None:
+    # Node names become unique: keep the newest row per name. The others are
+    # copied to nodes_duplicates first and reported in an event.
+    losers = "SELECT id FROM nodes WHERE id NOT IN (SELECT MAX(id) FROM nodes GROUP BY name)"
+    dupes = conn.execute(text(f"SELECT id, name FROM nodes WHERE id IN ({losers}) ORDER BY name, id")).all()
+    if dupes:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS nodes_duplicates AS SELECT * FROM nodes WHERE 0"))
+        conn.execute(
+            text(
+                f"INSERT INTO nodes_duplicates SELECT * FROM nodes WHERE id IN ({losers}) "
+                "AND id NOT IN (SELECT id FROM nodes_duplicates)"
+            )
+        )
+        conn.execute(text(f"DELETE FROM nodes WHERE id IN ({losers})"))
+        listed = ", ".join(f"{name}#{node_id}" for node_id, name in dupes[:_DUPLICATES_LISTED])
+        more = f" (+{len(dupes) - _DUPLICATES_LISTED} more)" if len(dupes) > _DUPLICATES_LISTED else ""
+        # Same connection: the migration holds the write lock.
+        conn.execute(
+            insert(EventLog).values(
+                build_event(
+                    f"migration 2: {len(dupes)} duplicate node row(s) moved to nodes_duplicates "
+                    f"(newest per name kept): {listed}{more}",
+                    event_type="migration",
+                    source="system",
+                    severity="warn",
+                )
+            )
+        )
+    _create_indexes(conn, "nodes", {"ux_nodes_name", "ix_nodes_last_seen"})
+    _create_indexes(conn, "event_log", {"ix_event_log_at"})
+    _create_indexes(conn, "command_runs", {"ix_command_runs_requested_at", "ix_command_runs_status"})
+
+
+def _m003_event_filter_indexes(conn: Connection) -> None:
+    _create_indexes(
+        conn,
+        "event_log",
+        {"ix_event_log_type_at", "ix_event_log_source_at", "ix_event_log_severity_at"},
+    )
+
+
+def _m004_node_version_index(conn: Connection) -> None:
+    _create_indexes(conn, "nodes", {"ix_nodes_version"})
+
+
+def _m005_command_run_worker(conn: Connection) -> None:
+    if not _has_column(conn, "command_runs", "worker_pid"):
+        _add_column(conn, "command_runs", "worker_pid INTEGER")
+
+
+def _m006_fleet_jobs(conn: Connection) -> None:
+    for table in ("fleet_dispatches", "node_jobs"):
+        Base.metadata.tables[table].create(conn, checkfirst=True)
+
+
+def _m007_node_telemetry(conn: Connection) -> None:
+    if not _has_column(conn, "nodes", "load_value"):
+        _add_column(conn, "nodes", "load_value FLOAT")
+    _create_indexes(conn, "nodes", {"ix_nodes_load_value"})
+    for table in ("node_load_blocks", "node_flag_changes"):
+        Base.metadata.tables[table].create(conn, checkfirst=True)
+
+
+def _m008_health_changes(conn: Connection) -> None:
+    Base.metadata.tables["health_changes"].create(conn, checkfirst=True)
+
+
+def _m009_command_run_worker_token(conn: Connection) -> None:
+    if not _has_column(conn, "command_runs", "worker_token"):
+        _add_column(conn, "command_runs", "worker_token VARCHAR(64)")
+
+
+# (version, name, fn). Append only; never renumber.
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "additive columns (event_log, nodes, command_runs)", _m001_additive_columns),
+    (2, "hot-path indexes + unique node name", _m002_hot_indexes),
+    (3, "event_log filter indexes", _m003_event_filter_indexes),
+    (4, "nodes.version index", _m004_node_version_index),
+    (5, "command_runs.worker_pid", _m005_command_run_worker),
+    (6, "fleet_dispatches + node_jobs", _m006_fleet_jobs),
+    (7, "nodes.load_value + node telemetry tables", _m007_node_telemetry),
+    (8, "health_changes", _m008_health_changes),
+    (9, "command_runs.worker_token", _m009_command_run_worker_token),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn: Connection) -> int | None:
+    """Stored schema version, or None if the DB predates versioning."""
+    try:
+        return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    except OperationalError:
+        return None
+
+
+def _stamp(conn: Connection, version: int, name: str) -> None:
+    conn.execute(
+        text("INSERT OR REPLACE INTO schema_version (version, name, applied_at) VALUES (:v, :n, :at)"),
+        {"v": version, "n": name, "at": datetime.now(tz=timezone.utc).isoformat()},
+    )
+
+
+def migrate() -> int:
+    """
+    Bring the DB to LATEST_VERSION. When already there this is one query:
+    no table inspection, no create_all.
+    """
+    with ENGINE.connect() as conn:
+        current = schema_version(conn)
+    if current is not None and current >= LATEST_VERSION:
+        return current
+
+    # Workers start together: one migrates, the rest wait and find it done.
+    with file_lock(SETTINGS.data_dir / "migrate.lock"):
+        return _migrate()
+
+
+def _migrate() -> int:
+    with ENGINE.connect() as conn:
+        current = schema_version(conn)
+    if current is not None and current >= LATEST_VERSION:
+        return current
+
+    with ENGINE.begin() as conn:
+        fresh = not inspect(conn).has_table("nodes")
+        conn.execute(
+            text(
+                "CREATE TABLE IF NOT EXISTS schema_version ("
+                "version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at TEXT NOT NULL)"
+            )
+        )
+        # New tables come out of the models with their current indexes.
+        Base.metadata.create_all(bind=conn)
 
+        for version, name, fn in MIGRATIONS:
+            if current is not None and version <= current:
+                continue
+            if not fresh:
+                fn(conn)
+            _stamp(conn, version, name)
+    return LATEST_VERSION
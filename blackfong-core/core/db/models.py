@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from sqlalchemy import DateTime, Integer, String, Text
+from sqlalchemy import DateTime, Float, Index, Integer, LargeBinary, String, Text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
@@ -12,6 +12,12 @@ class Base(DeclarativeBase):
 
 class Node(Base):
     __tablename__ = "nodes"
+    __table_args__ = (
+        Index("ux_nodes_name", "name", unique=True),
+        Index("ix_nodes_last_seen", "last_seen"),
+        Index("ix_nodes_version", "version"),
+        Index("ix_nodes_load_value", "load_value"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(128), nullable=False)
@@ -23,10 +29,18 @@ class Node(Base):
     version: Mapped[str | None] = mapped_column(String(64))
     load: Mapped[str | None] = mapped_column(String(64))
     status_flags: Mapped[str | None] = mapped_column(Text)  # JSON/text
+    load_value: Mapped[float | None] = mapped_column(Float)  # `load` parsed; "hottest nodes"
 
 
 class EventLog(Base):
     __tablename__ = "event_log"
+    # (x, at) indexes also carry the rowid, so they serve (at, id) keyset pages.
+    __table_args__ = (
+        Index("ix_event_log_at", "at"),
+        Index("ix_event_log_type_at", "event_type", "at"),
+        Index("ix_event_log_source_at", "source", "at"),
+        Index("ix_event_log_severity_at", "severity", "at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
@@ -42,6 +56,10 @@ class EventLog(Base):
 
 class CommandRun(Base):
     __tablename__ = "command_runs"
+    __table_args__ = (
+        Index("ix_command_runs_requested_at", "requested_at"),
+        Index("ix_command_runs_status", "status"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(64), nullable=False)
@@ -49,8 +67,103 @@ class CommandRun(Base):
     requested_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
     started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
     finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
-    status: Mapped[str] = mapped_column(String(16), nullable=False)  # QUEUED/RUNNING/OK/FAIL/DENIED
+    status: Mapped[str] = mapped_column(String(16), nullable=False)  # QUEUED/RUNNING/OK/FAIL/TIMEOUT/DENIED/ORPHANED
     return_code: Mapped[int | None] = mapped_column(Integer)
     stdout: Mapped[str | None] = mapped_column(Text)
     stderr: Mapped[str | None] = mapped_column(Text)
+    worker_pid: Mapped[int | None] = mapped_column(Integer)  # process that executes it
+    worker_token: Mapped[str | None] = mapped_column(String(64))  # pid@start time, see process_token
 
+
+class CommandOutput(Base):
+    __tablename__ = "command_output"
+    __table_args__ = (Index("ix_command_output_run_seq", "run_id", "seq"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    run_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    seq: Mapped[int] = mapped_column(Integer, nullable=False)
+    stream: Mapped[str] = mapped_column(String(8), nullable=False)  # stdout/stderr/meta
+    data: Mapped[str] = mapped_column(Text, nullable=False)
+
+
+class FleetDispatch(Base):
+    __tablename__ = "fleet_dispatches"
+    __table_args__ = (Index("ix_fleet_dispatches_requested_at", "requested_at"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String(64), nullable=False)
+    target: Mapped[str] = mapped_column(Text, nullable=False)  # JSON: names/version/capability/all
+    requested_by: Mapped[str | None] = mapped_column(String(64))
+    requested_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    node_count: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class NodeJob(Base):
+    __tablename__ = "node_jobs"
+    # (status, node_id): pickup for one node and the fleet-wide "who has work" scan.
+    # (dispatch_id, status): progress counts for one dispatch.
+    __table_args__ = (
+        Index("ix_node_jobs_status_node", "status", "node_id"),
+        Index("ix_node_jobs_dispatch_status", "dispatch_id", "status"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    dispatch_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    node_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    name: Mapped[str] = mapped_column(String(64), nullable=False)
+    status: Mapped[str] = mapped_column(String(16), nullable=False)  # PENDING/SENT/OK/FAIL/TIMEOUT/EXPIRED
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    sent_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    return_code: Mapped[int | None] = mapped_column(Integer)
+    output: Mapped[str | None] = mapped_column(Text)
+
+
+class NodeLoadBlock(Base):
+    """
+    A node's load samples from one telemetry flush, column-packed: varint
+    deltas of epoch-ms timestamps from start_ms, and float32 loads.
+    """
+
+    __tablename__ = "node_load_blocks"
+    # (node_id, end_ms): one node's blocks overlapping a time range.
+    # (end_ms, max_load): fleet-wide peaks over a recent window.
+    __table_args__ = (
+        Index("ix_node_load_blocks_node_end", "node_id", "end_ms"),
+        Index("ix_node_load_blocks_end_max", "end_ms", "max_load"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    node_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    start_ms: Mapped[int] = mapped_column(Integer, nullable=False)
+    end_ms: Mapped[int] = mapped_column(Integer, nullable=False)
+    count: Mapped[int] = mapped_column(Integer, nullable=False)
+    ts_deltas: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    loads: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    max_load: Mapped[float] = mapped_column(Float, nullable=False)
+    avg_load: Mapped[float] = mapped_column(Float, nullable=False)
+
+
+class NodeFlagChange(Base):
+    """status_flags as a change log: a row only when a node's flags differ from before."""
+
+    __tablename__ = "node_flag_changes"
+    __table_args__ = (Index("ix_node_flag_changes_node_at", "node_id", "at"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    node_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    status_flags: Mapped[str | None] = mapped_column(Text)
+
+
+class HealthChange(Base):
+    """System health state transitions, as decided by the rule engine."""
+
+    __tablename__ = "health_changes"
+    __table_args__ = (Index("ix_health_changes_at", "at"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    state: Mapped[str] = mapped_column(String(16), nullable=False)
+    previous: Mapped[str | None] = mapped_column(String(16))
+    reasons: Mapped[str | None] = mapped_column(Text)  # JSON list
@@ -2,118 +2,228 @@ from __future__ import annotations
 
 import sys
 import asyncio
-from datetime import timedelta
+import functools
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import uvicorn
 from fastapi import Depends, FastAPI, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+
+if TYPE_CHECKING:
+    from fastapi.templating import Jinja2Templates
 
 # Allow running as a script via /opt/blackfong/core/main.py (systemd ExecStart)
 # by ensuring the package root (/opt/blackfong) is on sys.path.
 if __name__ == "__main__" and __package__ is None:
     sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
+if __name__ == "__main__" and "--profile-startup" in sys.argv[1:]:
+    # Before the imports below: the profile measures a fresh interpreter.
+    from core.system.startup import profile_startup
+
+    sys.exit(profile_startup())
+
 from core.api import (
     routes_commands,
     routes_logs,
     routes_nodes,
+    routes_realtime,
     routes_services,
     routes_system,
 )
 from core.config import SETTINGS
+from core.db.database import ASYNC_ENGINE, SessionLocal
 from core.db.migrate import migrate
 from core.security import require_token
 from core.system.backups import ensure_daily_sqlite_backup
-from core.system.health import classify_system_state, node_is_stale
-from core.system.metrics import system_pulse
-from core.db.database import SessionLocal
-from core.db.models import EventLog, Node
-from sqlalchemy import select
+from core.system.commands import COMMANDS, recover_orphaned_runs
+from core.system.dashboard import DASHBOARD
+from core.system.events import EVENTS, tail_events
+from core.system.fleet import JOBS, expire_jobs
+from core.system.health import HEALTH
+from core.system.leader import LEADER
+from core.system.metrics import SAMPLER
+from core.system.nodes import HEARTBEATS
+from core.system.perf import PERF, TimingMiddleware
+from core.system.registry import REGISTRY
+from core.system.realtime import HUB
+from core.system.retention import run_retention
+from core.system.staleness import STALENESS
+from core.system.telemetry import TELEMETRY
+from core.system.timeseries import PULSE_STORE
 
 
-def _format_uptime(seconds: int) -> str:
-    td = timedelta(seconds=max(0, int(seconds)))
-    days = td.days
-    hours, rem = divmod(td.seconds, 3600)
-    minutes, sec = divmod(rem, 60)
-    if days > 0:
-        return f"{days}d {hours:02d}:{minutes:02d}:{sec:02d}"
-    return f"{hours:02d}:{minutes:02d}:{sec:02d}"
+@functools.cache
+def _templates() -> Jinja2Templates:
+    # Jinja loads on the first UI request; API-only use never pays for it.
+    from fastapi.templating import Jinja2Templates
 
+    return Jinja2Templates(directory=str(Path(__file__).parent / "ui" / "templates"))
 
-def create_app() -> FastAPI:
-    migrate()
 
-    # Token check once per request (if configured).
-    app = FastAPI(title="Blackfong Control Core", dependencies=[Depends(require_token)])
-    app.include_router(routes_system.router)
-    app.include_router(routes_services.router)
-    app.include_router(routes_nodes.router)
-    app.include_router(routes_commands.router)
-    app.include_router(routes_logs.router)
+def _refresh_jobs() -> None:
+    with SessionLocal() as db:
+        JOBS.refresh(db)
+
+
+def _load_health() -> None:
+    with SessionLocal() as db:
+        HEALTH.load(db)
+
+
+def _sync_registry() -> None:
+    with SessionLocal() as db:
+        REGISTRY.sync(db) if REGISTRY.loaded else REGISTRY.load(db)
+
 
-    static_dir = Path(__file__).parent / "ui" / "static"
-    templates_dir = Path(__file__).parent / "ui" / "templates"
-    templates = Jinja2Templates(directory=str(templates_dir))
-    app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
+def create_app() -> FastAPI:
+    with PERF.timed("startup", (("step", "migrate"),)):
+        # One query when the stored schema version is current.
+        migrate()
+
+    with PERF.timed("startup", (("step", "routes"),)):
+        # Token check once per request (if configured).
+        app = FastAPI(title="Blackfong Control Core", dependencies=[Depends(require_token)])
+        app.include_router(routes_system.router)
+        app.include_router(routes_services.router)
+        app.include_router(routes_nodes.router)
+        app.include_router(routes_commands.router)
+        app.include_router(routes_logs.router)
+        app.include_router(routes_realtime.router)
+        if SETTINGS.perf_enabled:
+            app.add_middleware(TimingMiddleware)
+
+        static_dir = Path(__file__).parent / "ui" / "static"
+        app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
 
     @app.on_event("startup")
     async def _startup_tasks() -> None:
-        # Quiet insurance: make one backup per day, rotate last N.
-        ensure_daily_sqlite_backup()
-
-        async def _backup_loop() -> None:
+        # Push clients: publishers in any thread fan out on this loop.
+        HUB.bind(asyncio.get_running_loop())
+        EVENTS.start()
+        await COMMANDS.start(SETTINGS.command_workers)
+        JOBS.bind(asyncio.get_running_loop())
+        await asyncio.to_thread(_refresh_jobs)
+        # The one full read of `nodes`; lookups and staleness are in memory after this.
+        await asyncio.to_thread(_sync_registry)
+        asyncio.create_task(STALENESS.run())
+        await asyncio.to_thread(_load_health)
+
+        async def _maintenance_loop() -> None:
             while True:
                 try:
-                    ensure_daily_sqlite_backup()
+                    # Fleet jobs never picked up, or picked up and never reported.
+                    await asyncio.to_thread(expire_jobs)
+                except Exception:
+                    pass
+                try:
+                    # Quiet insurance: one backup per day, rotate last N.
+                    # Stepped copy in a thread, so startup doesn't wait on it.
+                    await asyncio.to_thread(ensure_daily_sqlite_backup)
+                except Exception:
+                    pass
+                try:
+                    # Batched deletes + archive + rotation; keep it off the event loop.
+                    await asyncio.to_thread(run_retention)
                 except Exception:
                     pass
                 await asyncio.sleep(3600)
+                try:
+                    await asyncio.to_thread(recover_orphaned_runs)
+                except Exception:
+                    pass
 
-        asyncio.create_task(_backup_loop())
+        SAMPLER.add_listener(lambda sample: HUB.publish("pulse", [SAMPLER.pulse_from(sample)]))
+        # Every worker evaluates health from the samples it sees (sampled or followed).
+        SAMPLER.add_listener(HEALTH.observe)
+        follower: asyncio.Task | None = None
+
+        async def _lead() -> None:
+            # Background jobs run in one process per data_dir (see LEADER).
+            if follower is not None:
+                follower.cancel()
+            try:
+                # Runs left QUEUED/RUNNING by a previous process or a dead worker:
+                # once on election, then hourly from the maintenance loop.
+                await asyncio.to_thread(recover_orphaned_runs)
+            except Exception:
+                pass
+            asyncio.create_task(_maintenance_loop())
+            SAMPLER.add_listener(PULSE_STORE.add)
+            asyncio.create_task(SAMPLER.run())
+
+        if LEADER.try_acquire():
+            await _lead()
+        else:
+            follower = asyncio.create_task(SAMPLER.follow())
+            asyncio.create_task(LEADER.campaign(_lead))
+        if SETTINGS.workers > 1:
+            asyncio.create_task(tail_events())
+
+            async def _shared_state_loop() -> None:
+                # Other workers' dispatches (wakes our long-polls) and node writes.
+                while True:
+                    await asyncio.sleep(1.0)
+                    for fn in (_refresh_jobs, _sync_registry):
+                        try:
+                            await asyncio.to_thread(fn)
+                        except Exception:
+                            pass
+
+            asyncio.create_task(_shared_state_loop())
+
+        async def _heartbeat_flush_loop() -> None:
+            interval = SETTINGS.heartbeat_flush_ms / 1000.0
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await asyncio.to_thread(HEARTBEATS.flush)
+                except Exception:
+                    pass
+
+        if SETTINGS.heartbeat_flush_ms > 0:
+            asyncio.create_task(_heartbeat_flush_loop())
+
+        async def _telemetry_flush_loop() -> None:
+            # Per-node load/flags history: one packed block per node per interval.
+            while True:
+                await asyncio.sleep(SETTINGS.node_telemetry_flush_seconds)
+                try:
+                    await asyncio.to_thread(TELEMETRY.flush)
+                except Exception:
+                    pass
+
+        asyncio.create_task(_telemetry_flush_loop())
+
+    @app.on_event("shutdown")
+    async def _shutdown_tasks() -> None:
+        # In-flight runs are left to recover_orphaned_runs() on next start.
+        await COMMANDS.stop()
+        # Don't drop buffered heartbeats/samples on restart.
+        HEARTBEATS.flush()
+        TELEMETRY.flush()
+        PULSE_STORE.flush()
+        # Drain queued events last: the steps above may have added some.
+        EVENTS.stop()
+        LEADER.release()
+        JOBS.bind(None)
+        HUB.bind(None)
+        await ASYNC_ENGINE.dispose()
 
     @app.get("/", response_class=HTMLResponse)
     def ui_index(request: Request):
-        pulse = system_pulse()
-        now = None
-        alive = 0
-        stale = 0
-        last_events: list[EventLog] = []
-        recent_critical = 0
-        with SessionLocal() as db:
-            nodes = list(db.execute(select(Node)).scalars().all())
-            for n in nodes:
-                if node_is_stale(n.last_seen, now=now):
-                    stale += 1
-                else:
-                    alive += 1
-
-            last_events = list(
-                db.execute(select(EventLog).order_by(EventLog.at.desc()).limit(5))
-                .scalars()
-                .all()
-            )
-            recent_critical = sum(1 for e in last_events if (e.severity or "").lower() == "critical")
-
-        state, reasons = classify_system_state(
-            pulse, stale_nodes=stale, recent_critical_events=recent_critical
-        )
-        return templates.TemplateResponse(
-            "index.html",
-            {
-                "request": request,
-                "pulse": pulse,
-                "uptime_human": _format_uptime(pulse["uptime_seconds"]),
-                "state": state,
-                "state_reasons": reasons,
-                "nodes_alive": alive,
-                "nodes_stale": stale,
-                "last_events": last_events,
-            },
-        )
+        snap = DASHBOARD.get()
+        headers = {"ETag": snap.etag, "Cache-Control": "no-cache"}
+        if request.headers.get("if-none-match") == snap.etag:
+            return Response(status_code=304, headers=headers)
+        if snap.html is None:
+            snap.html = _templates().get_template("index.html").render(snap.context)
+        return HTMLResponse(snap.html, headers=headers)
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def prometheus_metrics() -> PlainTextResponse:
+        return PlainTextResponse(PERF.prometheus(), media_type="text/plain; version=0.0.4")
 
     return app
 
@@ -122,10 +232,23 @@ app = create_app()
 
 
 if __name__ == "__main__":
+    import argparse
+
+    import uvicorn
+
+    ap = argparse.ArgumentParser(prog="core/main.py")
+    ap.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="start once in a fresh interpreter, print import/init timings, exit",
+    )
+    ap.parse_args()  # --profile-startup is handled above, before the imports
+
     uvicorn.run(
         "core.main:app",
         host=SETTINGS.api_host,
         port=SETTINGS.api_port,
+        workers=SETTINGS.workers,
         log_level="info",
     )
 
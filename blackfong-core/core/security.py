@@ -2,14 +2,17 @@ from __future__ import annotations
 
 import hashlib
 
-from fastapi import Header, HTTPException, Request, status
+from fastapi import Header, HTTPException, status
+from starlette.requests import HTTPConnection
 
 from core.config import SETTINGS
 
 
-def require_token(request: Request, x_blackfong_token: str | None = Header(default=None)) -> str:
+async def require_token(request: HTTPConnection, x_blackfong_token: str | None = Header(default=None)) -> str:
     """
     Optional auth: if BLACKFONG_TOKEN is set, require it in X-Blackfong-Token.
+    Async so the app-wide check doesn't take a threadpool slot per request;
+    HTTPConnection so it also guards WebSocket routes.
     """
     if SETTINGS.token is None:
         ident = "local"
@@ -1,53 +1,339 @@
 from __future__ import annotations
 
+import argparse
+import gzip
+import hashlib
+import json
+import shutil
 import sqlite3
+import tempfile
+import threading
+import time
 from datetime import datetime, timezone
 from pathlib import Path
 
 from core.config import SETTINGS
+from core.system.events import log_event
+
+try:  # Optional: only needed for BLACKFONG_BACKUP_COMPRESSION=zstd.
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the host
+    zstandard = None
+
+
+_SUFFIXES = {"gzip": ".db.gz", "zstd": ".db.zst", "none": ".db"}
+_COPY_CHUNK = 1024 * 1024
 
 
 def _today_stamp() -> str:
     return datetime.now(tz=timezone.utc).strftime("%Y%m%d")
 
 
+def _compression() -> str:
+    mode = SETTINGS.backup_compression
+    if mode not in _SUFFIXES:
+        mode = "gzip"
+    if mode == "zstd" and zstandard is None:
+        mode = "gzip"
+    return mode
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(_COPY_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _open_compressed(path: Path, mode: str, compression: str):
+    if compression == "gzip":
+        return gzip.open(path, mode)
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed")
+        f = path.open(mode)
+        ctx = zstandard.ZstdCompressor() if "w" in mode else zstandard.ZstdDecompressor()
+        return ctx.stream_writer(f) if "w" in mode else ctx.stream_reader(f)
+    return path.open(mode)
+
+
+def _compression_of(path: Path) -> str:
+    for mode, suffix in _SUFFIXES.items():
+        if mode != "none" and path.name.endswith(suffix):
+            return mode
+    return "none"
+
+
+def _manifest_path(path: Path) -> Path:
+    return path.with_name(path.name + ".json")
+
+
+def list_backups() -> list[Path]:
+    if not SETTINGS.backup_dir.exists():
+        return []
+    return sorted(
+        (
+            p
+            for p in SETTINGS.backup_dir.glob("blackfong-*.db*")
+            if any(p.name.endswith(s) for s in _SUFFIXES.values())
+        ),
+        key=lambda p: p.name,
+        reverse=True,
+    )
+
+
+class BackupEngine:
+    """
+    Online backups off the event loop: stepped sqlite3 backup (N pages, then
+    a short sleep so writers get the lock) of one read snapshot, streaming
+    compression and a JSON manifest with checksums next to each file.
+
+    One backup at a time; progress is readable while it runs.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._progress: dict = {"running": False}
+        self.last: dict | None = None
+
+    def status(self) -> dict:
+        with self._lock:
+            return {"progress": dict(self._progress), "last": self.last}
+
+    def start(self, *, label: str = "manual") -> bool:
+        """Start a background backup. False if one is already running."""
+        with self._lock:
+            if self._progress.get("running"):
+                return False
+            self._progress = {"running": True, "label": label}
+            self._thread = threading.Thread(
+                target=self._run_safe, args=(label,), name="blackfong-backup", daemon=True
+            )
+            self._thread.start()
+            return True
+
+    def _run_safe(self, label: str) -> None:
+        try:
+            self.run(label=label, _claimed=True)
+        except Exception:
+            pass
+
+    def run(self, *, label: str, _claimed: bool = False) -> dict:
+        """Run one backup in the calling thread (callers keep it off the event loop)."""
+        with self._lock:
+            if not _claimed:
+                if self._progress.get("running"):
+                    raise RuntimeError("backup already running")
+                self._progress = {"running": True, "label": label}
+
+        try:
+            manifest = self._backup(label)
+        except Exception as e:
+            with self._lock:
+                self.last = {"ok": False, "label": label, "error": str(e)}
+                self._progress = {"running": False}
+            log_event(
+                None,
+                f"backup failed ({label}): {e}",
+                event_type="backup",
+                source="system",
+                severity="warn",
+            )
+            raise
+        with self._lock:
+            self.last = {"ok": True, **manifest}
+            self._progress = {"running": False}
+        log_event(
+            None,
+            f"backup {manifest['file']}: {manifest['bytes']} bytes in {manifest['duration_seconds']}s",
+            event_type="backup",
+            source="system",
+            severity="info",
+        )
+        return manifest
+
+    def _set_progress(self, **kw) -> None:
+        with self._lock:
+            self._progress.update(kw)
+
+    def _backup(self, label: str) -> dict:
+        src = SETTINGS.db_path
+        compression = _compression()
+        SETTINGS.backup_dir.mkdir(parents=True, exist_ok=True)
+        now = datetime.now(tz=timezone.utc)
+        stamp = now.strftime("%Y%m%d") if label == "daily" else now.strftime("%Y%m%d-%H%M%S")
+        dst = SETTINGS.backup_dir / f"blackfong-{stamp}{_SUFFIXES[compression]}"
+
+        t0 = time.monotonic()
+        self._set_progress(phase="copy", started_at=now.isoformat(), file=dst.name)
+
+        restarts = 0
+        last_done = 0
+
+        def _on_step(_status, remaining: int, total: int) -> None:
+            nonlocal restarts, last_done
+            done = total - remaining
+            if done < last_done:
+                # SQLite started over (the source changed under the copy).
+                restarts += 1
+            last_done = done
+            self._set_progress(pages_total=total, pages_done=done, restarts=restarts)
+
+        with tempfile.TemporaryDirectory(dir=SETTINGS.backup_dir) as tmp:
+            raw = Path(tmp) / "snapshot.db"
+            # Use SQLite online backup for consistency. SQLite restarts a
+            # stepped backup whenever another connection writes the source;
+            # copying inside one read transaction pins a snapshot instead (WAL
+            # writers carry on), so it finishes however busy the fleet is.
+            src_conn = sqlite3.connect(
+                str(src), timeout=SETTINGS.sqlite_busy_timeout_ms / 1000.0, isolation_level=None
+            )
+            try:
+                src_conn.execute("BEGIN")
+                src_conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+                dst_conn = sqlite3.connect(str(raw))
+                try:
+                    src_conn.backup(
+                        dst_conn,
+                        pages=SETTINGS.backup_pages_per_step,
+                        progress=_on_step,
+                        sleep=SETTINGS.backup_step_sleep_ms / 1000.0,
+                    )
+                finally:
+                    dst_conn.close()
+            finally:
+                src_conn.close()
+            copy_seconds = time.monotonic() - t0
+
+            self._set_progress(phase="compress")
+            db_sha256 = _sha256(raw)
+            partial = dst.with_name(dst.name + ".partial")
+            with raw.open("rb") as fin, _open_compressed(partial, "wb", compression) as fout:
+                shutil.copyfileobj(fin, fout, _COPY_CHUNK)
+            partial.replace(dst)
+            db_bytes = raw.stat().st_size
+
+        manifest = {
+            "file": dst.name,
+            "label": label,
+            "created_at": now.isoformat(),
+            "compression": compression,
+            "bytes": dst.stat().st_size,
+            "db_bytes": db_bytes,
+            "sha256": _sha256(dst),
+            "db_sha256": db_sha256,
+            "copy_seconds": round(copy_seconds, 3),
+            "copy_restarts": restarts,
+            "duration_seconds": round(time.monotonic() - t0, 3),
+        }
+        _manifest_path(dst).write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+        return manifest
+
+
+BACKUPS = BackupEngine()
+
+
+def _has_backup_for(stamp: str) -> bool:
+    return any((SETTINGS.backup_dir / f"blackfong-{stamp}{s}").exists() for s in _SUFFIXES.values())
+
+
 def ensure_daily_sqlite_backup() -> Path | None:
     """
-    Create one backup per UTC day, keep last N (rotating).
+    Create one backup per UTC day, keep last N (rotating). Blocking: run it
+    in a worker thread.
     """
     src = SETTINGS.db_path
     if not src.exists():
         return None
 
     SETTINGS.backup_dir.mkdir(parents=True, exist_ok=True)
-    dst = SETTINGS.backup_dir / f"blackfong-{_today_stamp()}.db"
-    if not dst.exists():
-        # Use SQLite online backup for consistency.
-        src_conn = sqlite3.connect(str(src))
+    if not _has_backup_for(_today_stamp()):
         try:
-            dst_conn = sqlite3.connect(str(dst))
-            try:
-                src_conn.backup(dst_conn)
-            finally:
-                dst_conn.close()
-        finally:
-            src_conn.close()
+            BACKUPS.run(label="daily")
+        except RuntimeError:
+            # A manual backup is in flight; the next loop pass retries.
+            return None
     rotate_backups()
-    return dst
+    found = [p for p in list_backups() if p.name.startswith(f"blackfong-{_today_stamp()}.")]
+    return found[0] if found else None
 
 
 def rotate_backups() -> None:
     keep = max(1, int(SETTINGS.backup_keep_days))
     if not SETTINGS.backup_dir.exists():
         return
-    backups = sorted(
-        SETTINGS.backup_dir.glob("blackfong-*.db"),
-        key=lambda p: p.name,
-        reverse=True,
-    )
-    for p in backups[keep:]:
+    # Daily (blackfong-YYYYMMDD.*) and manual (blackfong-YYYYMMDD-HHMMSS.*)
+    # backups rotate separately; each keeps the newest N.
+    daily = [p for p in list_backups() if "-" not in p.name[len("blackfong-"):].split(".")[0]]
+    manual = [p for p in list_backups() if p not in daily]
+    for p in daily[keep:] + manual[keep:]:
         try:
             p.unlink(missing_ok=True)
+            _manifest_path(p).unlink(missing_ok=True)
         except Exception:
             pass
 
+
+def verify_backup(path: Path) -> dict:
+    """
+    Check a backup against its manifest checksums and run PRAGMA
+    integrity_check on a decompressed copy.
+    """
+    result: dict = {"file": path.name, "ok": False}
+    if not path.exists():
+        result["error"] = "not found"
+        return result
+
+    manifest_file = _manifest_path(path)
+    manifest = json.loads(manifest_file.read_text(encoding="utf-8")) if manifest_file.exists() else None
+    result["manifest"] = manifest is not None
+    if manifest is not None:
+        result["sha256_ok"] = _sha256(path) == manifest.get("sha256")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        raw = Path(tmp) / "verify.db"
+        try:
+            with _open_compressed(path, "rb", _compression_of(path)) as fin, raw.open("wb") as fout:
+                shutil.copyfileobj(fin, fout, _COPY_CHUNK)
+            if manifest is not None:
+                result["db_sha256_ok"] = _sha256(raw) == manifest.get("db_sha256")
+            conn = sqlite3.connect(str(raw))
+            try:
+                result["integrity"] = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            finally:
+                conn.close()
+        except Exception as e:
+            result["error"] = str(e)
+            return result
+
+    result["ok"] = result["integrity"] == "ok" and all(
+        result.get(k, True) for k in ("sha256_ok", "db_sha256_ok")
+    )
+    return result
+
+
+def main() -> None:
+    # python3 -m core.system.backups {run,verify [FILE...],list}
+    ap = argparse.ArgumentParser(prog="core.system.backups")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("run", help="make a backup now")
+    sub.add_parser("list", help="list backups")
+    v = sub.add_parser("verify", help="verify backups (default: all)")
+    v.add_argument("files", nargs="*", type=Path)
+    args = ap.parse_args()
+
+    if args.cmd == "run":
+        print(json.dumps(BACKUPS.run(label="manual"), indent=2))
+    elif args.cmd == "list":
+        for p in list_backups():
+            print(p)
+    else:
+        results = [verify_backup(p) for p in (args.files or list_backups())]
+        print(json.dumps(results, indent=2))
+        raise SystemExit(0 if all(r["ok"] for r in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import asyncio
+import codecs
+from collections import deque
+from collections.abc import AsyncIterator
+
+from sqlalchemy import insert, select
+
+from core.config import SETTINGS
+from core.db.database import ENGINE, SessionLocal
+from core.db.models import CommandOutput
+
+
+_READ_SIZE = 4096
+_TAIL_CHARS = 64 * 1024  # kept per stream for CommandRun.stdout/stderr
+_FLUSH_BYTES = 64 * 1024
+_FLUSH_SECONDS = 0.5
+_SUBSCRIBER_QUEUE = 1024
+_REPLAY_PAGE = 256
+
+
+def _insert_chunks(rows: list[dict]) -> None:
+    with ENGINE.begin() as conn:
+        conn.execute(insert(CommandOutput), rows)
+
+
+def load_chunks(run_id: int, after_seq: int = -1, limit: int = _REPLAY_PAGE) -> list[dict]:
+    q = (
+        select(CommandOutput.seq, CommandOutput.stream, CommandOutput.data)
+        .where(CommandOutput.run_id == run_id, CommandOutput.seq > after_seq)
+        .order_by(CommandOutput.seq)
+        .limit(limit)
+    )
+    with SessionLocal() as db:
+        return [
+            {"run_id": run_id, "seq": seq, "stream": stream, "data": data}
+            for seq, stream, data in db.execute(q).all()
+        ]
+
+
+class Subscription:
+    __slots__ = ("queue", "lagged")
+
+    def __init__(self) -> None:
+        self.queue: asyncio.Queue[dict | None] = asyncio.Queue(maxsize=_SUBSCRIBER_QUEUE)
+        self.lagged = False
+
+    def _end(self) -> None:
+        # Make room for the end marker even if the reader fell behind.
+        while self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class RunOutput:
+    """
+    Output of one live run: fan-out to subscribers, capped chunk persistence,
+    and a bounded tail per stream. Never holds the full output in memory.
+
+    Lives on the event loop; not thread-safe.
+    """
+
+    def __init__(self, run_id: int, cap_bytes: int) -> None:
+        self.run_id = run_id
+        self.cap_bytes = cap_bytes
+        self.seq = 0
+        self.stored_bytes = 0
+        self.truncated = False
+        self._pending: list[dict] = []
+        self._pending_bytes = 0
+        # Taken off _pending but not yet committed; replayed until it is.
+        self._inflight: list[dict] = []
+        self._flush_lock = asyncio.Lock()
+        self._tails: dict[str, deque[str]] = {"stdout": deque(), "stderr": deque()}
+        self._tail_len = {"stdout": 0, "stderr": 0}
+        self._subs: set[Subscription] = set()
+
+    def subscribe(self) -> tuple[Subscription, list[dict]]:
+        """Returns the subscription plus chunks not yet persisted."""
+        sub = Subscription()
+        self._subs.add(sub)
+        return sub, self._inflight + self._pending
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        self._subs.discard(sub)
+
+    def tail(self, stream: str) -> str:
+        return "".join(self._tails[stream])[-_TAIL_CHARS:]
+
+    def feed(self, stream: str, text: str) -> None:
+        if not text:
+            return
+        chunk = {"run_id": self.run_id, "seq": self.seq, "stream": stream, "data": text}
+        self.seq += 1
+
+        if stream in self._tails:
+            tail = self._tails[stream]
+            tail.append(text)
+            self._tail_len[stream] += len(text)
+            while len(tail) > 1 and self._tail_len[stream] - len(tail[0]) >= _TAIL_CHARS:
+                self._tail_len[stream] -= len(tail.popleft())
+
+        published = [chunk]
+        size = len(text.encode("utf-8"))
+        if self.stored_bytes + size <= self.cap_bytes:
+            self.stored_bytes += size
+            self._pending.append(chunk)
+            self._pending_bytes += size
+        elif not self.truncated:
+            self.truncated = True
+            marker = {
+                "run_id": self.run_id,
+                "seq": self.seq,
+                "stream": "meta",
+                "data": f"[output truncated at {self.cap_bytes} bytes]\n",
+            }
+            self.seq += 1
+            self._pending.append(marker)
+            published.append(marker)
+
+        for sub in list(self._subs):
+            try:
+                for c in published:
+                    sub.queue.put_nowait(c)
+            except asyncio.QueueFull:
+                # Slow reader: drop it; it can resume from persisted chunks.
+                sub.lagged = True
+                self._subs.discard(sub)
+                sub._end()
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            self._inflight = self._pending
+            self._pending = []
+            self._pending_bytes = 0
+            try:
+                await asyncio.to_thread(_insert_chunks, self._inflight)
+            finally:
+                self._inflight = []
+
+    async def flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(_FLUSH_SECONDS)
+            await self.flush()
+
+    async def pump(self, stream: str, reader: asyncio.StreamReader) -> None:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        while True:
+            data = await reader.read(_READ_SIZE)
+            if not data:
+                self.feed(stream, decoder.decode(b"", final=True))
+                return
+            self.feed(stream, decoder.decode(data))
+            if self._pending_bytes >= _FLUSH_BYTES:
+                await self.flush()
+
+    def close(self) -> None:
+        for sub in list(self._subs):
+            sub._end()
+        self._subs.clear()
+
+
+class OutputHub:
+    """Registry of live runs (event loop only)."""
+
+    def __init__(self) -> None:
+        self._live: dict[int, RunOutput] = {}
+
+    def open(self, run_id: int) -> RunOutput:
+        out = self._live.get(run_id)
+        if out is None:
+            out = self._live[run_id] = RunOutput(run_id, SETTINGS.command_output_cap_bytes)
+        return out
+
+    def get(self, run_id: int) -> RunOutput | None:
+        return self._live.get(run_id)
+
+    def close(self, run_id: int) -> None:
+        out = self._live.pop(run_id, None)
+        if out is not None:
+            out.close()
+
+    def close_all(self) -> None:
+        for run_id in list(self._live):
+            self.close(run_id)
+
+
+OUTPUTS = OutputHub()
+
+
+async def follow(run_id: int, after_seq: int = -1) -> AsyncIterator[dict]:
+    """
+    Yield output chunks of a run after `after_seq`: persisted ones first, then
+    live ones until the run ends. Runs are live from submission, so a QUEUED
+    run is followed until it starts and finishes. Yields {"stream": "lagged"}
+    if dropped.
+    """
+    live = OUTPUTS.get(run_id)
+    sub: Subscription | None = None
+    pending: list[dict] = []
+    if live is not None:
+        sub, pending = live.subscribe()
+
+    last = after_seq
+    try:
+        while True:
+            rows = await asyncio.to_thread(load_chunks, run_id, last)
+            for r in rows:
+                yield r
+                last = r["seq"]
+            if len(rows) < _REPLAY_PAGE:
+                break
+
+        for r in pending:
+            if r["seq"] > last:
+                yield r
+                last = r["seq"]
+
+        if sub is None:
+            return
+        while True:
+            r = await sub.queue.get()
+            if r is None:
+                break
+            if r["seq"] > last:
+                yield r
+                last = r["seq"]
+        if sub.lagged:
+            yield {"run_id": run_id, "seq": last, "stream": "lagged", "data": ""}
+    finally:
+        if live is not None and sub is not None:
+            live.unsubscribe(sub)
@@ -1,19 +1,37 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import os
-import subprocess
+from collections import defaultdict, deque
+from dataclasses import dataclass
 from datetime import datetime, timezone
 
-from sqlalchemy import select
+import psutil
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from core.config import SETTINGS
+from core.db.database import SessionLocal
 from core.db.models import CommandRun
+from core.system.command_output import OUTPUTS
+from core.system.events import log_event
+from core.system.perf import PERF
+from core.system.realtime import HUB
 
 
-ALLOWED_COMMANDS: dict[str, list[str]] = {
-    "reboot": ["/sbin/reboot"],
-    "shutdown": ["/sbin/shutdown", "-h", "now"],
-    "update": ["apt", "update"],
+@dataclass(frozen=True)
+class CommandSpec:
+    argv: tuple[str, ...]
+    timeout_seconds: int | None = None  # None -> SETTINGS.command_timeout_seconds
+    max_concurrency: int = 1
+
+
+ALLOWED_COMMANDS: dict[str, CommandSpec] = {
+    "reboot": CommandSpec(("/sbin/reboot",)),
+    "shutdown": CommandSpec(("/sbin/shutdown", "-h", "now")),
+    "update": CommandSpec(("apt", "update"), timeout_seconds=1800),
 }
 
 
@@ -21,7 +39,225 @@ def list_allowed() -> list[str]:
     return sorted(ALLOWED_COMMANDS.keys())
 
 
+def _resolve_argv(spec: CommandSpec) -> list[str]:
+    cmd = list(spec.argv)
+    if os.geteuid() != 0 and cmd and cmd[0].startswith("/"):
+        # Root-only commands (reboot/shutdown) must pass through sudo allowlist.
+        if cmd[0] in {"/sbin/reboot", "/sbin/shutdown"}:
+            cmd = ["sudo", "-n", *cmd]
+    return cmd
+
+
+def _publish(run: CommandRun) -> None:
+    HUB.publish(
+        "commands",
+        [
+            {
+                "id": run.id,
+                "name": run.name,
+                "status": run.status,
+                "return_code": run.return_code,
+                "requested_by": run.requested_by,
+                "finished_at": run.finished_at,
+            }
+        ],
+    )
+
+
+def _update_run(run_id: int, **values) -> CommandRun | None:
+    with SessionLocal() as db:
+        run = db.get(CommandRun, run_id)
+        if run is None:
+            return None
+        for k, v in values.items():
+            setattr(run, k, v)
+        db.commit()
+        db.refresh(run)
+        _publish(run)
+        if run.finished_at is not None:
+            severity = "info" if run.status == "OK" else "warn"
+            log_event(
+                db,
+                f"command {run.status}: {run.name} (rc={run.return_code}) by {run.requested_by}",
+                event_type="command",
+                source="api",
+                severity=severity,
+            )
+        return run
+
+
+def _fail_run(run_id: int, name: str, exc: BaseException) -> None:
+    """_execute() raised: close the run out as FAIL (if still open) and say why."""
+    with SessionLocal() as db:
+        db.execute(
+            update(CommandRun)
+            .where(CommandRun.id == run_id, CommandRun.status.in_(("QUEUED", "RUNNING")))
+            .values(status="FAIL", stderr=f"{exc!r}", finished_at=datetime.now(tz=timezone.utc))
+        )
+        db.commit()
+        run = db.get(CommandRun, run_id)
+        if run is not None:
+            _publish(run)
+        log_event(
+            db,
+            f"command engine error: {name} (run {run_id}): {exc!r}",
+            event_type="command",
+            source="system",
+            severity="critical",
+        )
+
+
+class CommandEngine:
+    """
+    Run queued CommandRun rows on a fixed pool of asyncio workers.
+
+    Jobs are submitted from request threads; each command name has its own
+    concurrency limit, and jobs over the limit wait in a per-name deque
+    without holding a worker.
+    """
+
+    def __init__(self) -> None:
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queue: asyncio.Queue[tuple[int, str]] | None = None
+        self._workers: list[asyncio.Task] = []
+        self._active: dict[str, int] = defaultdict(int)
+        self._deferred: dict[str, deque[int]] = defaultdict(deque)
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None
+
+    async def start(self, workers: int) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(max(1, workers))]
+
+    async def stop(self) -> None:
+        for t in self._workers:
+            t.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        OUTPUTS.close_all()
+        self._workers = []
+        self._loop = None
+        self._queue = None
+
+    def submit(self, run_id: int, name: str) -> None:
+        """Thread-safe: enqueue a QUEUED run for execution."""
+        if self._loop is None or self._queue is None:
+            raise RuntimeError("command engine not running")
+        self._loop.call_soon_threadsafe(self._enqueue, run_id, name)
+
+    def _enqueue(self, run_id: int, name: str) -> None:
+        if self._queue is None:
+            return
+        # Live from now on, so /stream can follow a run while it is still queued.
+        OUTPUTS.open(run_id)
+        self._queue.put_nowait((run_id, name))
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        while True:
+            run_id, name = await self._queue.get()
+            spec = ALLOWED_COMMANDS[name]
+            if self._active[name] >= spec.max_concurrency:
+                self._deferred[name].append(run_id)
+                continue
+            self._active[name] += 1
+            try:
+                await self._execute(run_id, name, spec)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # e.g. the DB refused _update_run: don't leave the run QUEUED/RUNNING.
+                with contextlib.suppress(Exception):
+                    await asyncio.to_thread(_fail_run, run_id, name, e)
+            finally:
+                self._active[name] -= 1
+                if self._deferred[name]:
+                    self._queue.put_nowait((self._deferred[name].popleft(), name))
+
+    async def _execute(self, run_id: int, name: str, spec: CommandSpec) -> None:
+        timeout = spec.timeout_seconds or SETTINGS.command_timeout_seconds
+        out = OUTPUTS.open(run_id)
+        try:
+            await asyncio.to_thread(
+                _update_run, run_id, status="RUNNING", started_at=datetime.now(tz=timezone.utc)
+            )
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    *_resolve_argv(spec),
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+            except OSError as e:
+                out.feed("stderr", f"{e}\n")
+                await out.flush()
+                await asyncio.to_thread(
+                    _update_run,
+                    run_id,
+                    status="FAIL",
+                    stderr=out.tail("stderr"),
+                    finished_at=datetime.now(tz=timezone.utc),
+                )
+                return
+
+            # Pipes are read incrementally: chunks go to stream subscribers
+            # and to command_output in batches while the process runs.
+            status = None
+            cancelled = False
+            flusher = asyncio.create_task(out.flush_periodically())
+            io = asyncio.gather(
+                out.pump("stdout", proc.stdout),
+                out.pump("stderr", proc.stderr),
+                proc.wait(),
+            )
+            with PERF.timed("subprocess", (("name", name),)):
+                try:
+                    await asyncio.wait_for(io, timeout=timeout)
+                except asyncio.TimeoutError:
+                    proc.kill()
+                    await proc.wait()
+                    status = "TIMEOUT"
+                    out.feed("stderr", f"\n[killed after {timeout}s]\n")
+                except asyncio.CancelledError:
+                    # Engine stopping: kill and reap the child rather than leave it behind.
+                    with contextlib.suppress(ProcessLookupError):
+                        proc.kill()
+                    await proc.wait()
+                    status = "FAIL"
+                    cancelled = True
+                    out.feed("stderr", "\n[killed: core shutting down]\n")
+                finally:
+                    flusher.cancel()
+                    # wait_for cancelled the gather; retrieve its outcome so it isn't logged.
+                    if io.done() and not io.cancelled():
+                        io.exception()
+            await out.flush()
+
+            rc = proc.returncode
+            await asyncio.to_thread(
+                _update_run,
+                run_id,
+                return_code=rc,
+                stdout=out.tail("stdout"),
+                stderr=out.tail("stderr"),
+                finished_at=datetime.now(tz=timezone.utc),
+                status=status or ("OK" if rc == 0 else "FAIL"),
+            )
+            if cancelled:
+                raise asyncio.CancelledError
+        finally:
+            OUTPUTS.close(run_id)
+
+
+COMMANDS = CommandEngine()
+
+
 def run_command(db: Session, *, name: str, requested_by: str | None) -> CommandRun:
+    """
+    Record a run and hand it to the engine. Returns the QUEUED (or DENIED) row.
+    """
     now = datetime.now(tz=timezone.utc)
     run = CommandRun(
         name=name,
@@ -33,41 +269,106 @@ def run_command(db: Session, *, name: str, requested_by: str | None) -> CommandR
         return_code=None,
         stdout=None,
         stderr=None,
+        worker_pid=os.getpid(),
+        worker_token=WORKER_TOKEN,
     )
+    if name not in ALLOWED_COMMANDS:
+        run.status = "DENIED"
+        run.finished_at = now
     db.add(run)
     db.commit()
     db.refresh(run)
 
-    cmd = ALLOWED_COMMANDS.get(name)
-    if not cmd:
-        run.status = "DENIED"
-        run.finished_at = datetime.now(tz=timezone.utc)
-        db.commit()
-        db.refresh(run)
-        return run
+    if run.status == "QUEUED":
+        try:
+            COMMANDS.submit(run.id, name)
+        except RuntimeError as e:
+            run.status = "FAIL"
+            run.stderr = str(e)
+            run.finished_at = datetime.now(tz=timezone.utc)
+            db.commit()
+            db.refresh(run)
+    _publish(run)
+    return run
 
-    if os.geteuid() != 0 and cmd and cmd[0].startswith("/"):
-        # Root-only commands (reboot/shutdown) must pass through sudo allowlist.
-        if cmd[0] in {"/sbin/reboot", "/sbin/shutdown"}:
-            cmd = ["sudo", "-n", *cmd]
 
-    run.status = "RUNNING"
-    run.started_at = datetime.now(tz=timezone.utc)
-    db.commit()
-    db.refresh(run)
+def process_token(pid: int) -> str | None:
+    """
+    pid plus the process's start time: unlike the pid alone, it can't be
+    matched by a later process that reuses the pid (after a restart, or
+    as PID 1 in a container). None if no such process.
+    """
+    try:
+        return f"{pid}@{psutil.Process(pid).create_time():.2f}"
+    except (psutil.NoSuchProcess, psutil.AccessDenied, ProcessLookupError):
+        return None
 
-    p = subprocess.run(cmd, capture_output=True, text=True, check=False)
-    run.return_code = p.returncode
-    run.stdout = p.stdout
-    run.stderr = p.stderr
-    run.finished_at = datetime.now(tz=timezone.utc)
-    run.status = "OK" if p.returncode == 0 else "FAIL"
-    db.commit()
-    db.refresh(run)
-    return run
+
+# This process, computed once; stored on each run it executes.
+WORKER_TOKEN = process_token(os.getpid())
+
+
+def _alive(pid: int | None, token: str | None) -> bool:
+    if pid is None or token is None:
+        # Rows from before worker_token: nothing to tell a reused pid apart.
+        return False
+    return process_token(pid) == token
+
+
+def recover_orphaned_runs() -> int:
+    """
+    Mark runs left QUEUED/RUNNING by a process that is gone as ORPHANED.
+    Runs owned by live workers (including this one) are left alone.
+
+    Queued runs are not replayed: re-running e.g. reboot after a restart is
+    never what the requester meant.
+    """
+    now = datetime.now(tz=timezone.utc)
+    with SessionLocal() as db:
+        pending = db.execute(
+            select(CommandRun.id, CommandRun.worker_pid, CommandRun.worker_token).where(
+                CommandRun.status.in_(("QUEUED", "RUNNING"))
+            )
+        ).all()
+        dead = [run_id for run_id, pid, token in pending if not _alive(pid, token)]
+        if not dead:
+            return 0
+        res = db.execute(
+            update(CommandRun)
+            .where(CommandRun.id.in_(dead), CommandRun.status.in_(("QUEUED", "RUNNING")))
+            .values(status="ORPHANED", finished_at=now)
+        )
+        db.commit()
+        count = res.rowcount or 0
+        if count:
+            log_event(
+                db,
+                f"command recovery: {count} orphaned run(s) marked ORPHANED",
+                event_type="command",
+                source="system",
+                severity="warn",
+            )
+    return count
+
+
+def get_run(db: Session, run_id: int) -> CommandRun | None:
+    return db.get(CommandRun, run_id)
 
 
 def list_runs(db: Session, limit: int = 100) -> list[CommandRun]:
     q = select(CommandRun).order_by(CommandRun.requested_at.desc()).limit(limit)
     return list(db.execute(q).scalars().all())
 
+
+async def run_command_async(db: AsyncSession, *, name: str, requested_by: str | None) -> CommandRun:
+    # COMMANDS.submit() only schedules onto the loop, so this never blocks it.
+    return await db.run_sync(lambda s: run_command(s, name=name, requested_by=requested_by))
+
+
+async def get_run_async(db: AsyncSession, run_id: int) -> CommandRun | None:
+    return await db.get(CommandRun, run_id)
+
+
+async def list_runs_async(db: AsyncSession, limit: int = 100) -> list[CommandRun]:
+    q = select(CommandRun).order_by(CommandRun.requested_at.desc()).limit(limit)
+    return list((await db.execute(q)).scalars().all())
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+from sqlalchemy import select
+
+from core.config import SETTINGS
+from core.db.database import SessionLocal
+from core.db.models import EventLog
+from core.system.health import HEALTH, classify_system_state
+from core.system.metrics import current_pulse
+from core.system.nodes import fleet_counts
+
+
+def _format_uptime(seconds: int) -> str:
+    td = timedelta(seconds=max(0, int(seconds)))
+    days = td.days
+    hours, rem = divmod(td.seconds, 3600)
+    minutes, sec = divmod(rem, 60)
+    if days > 0:
+        return f"{days}d {hours:02d}:{minutes:02d}:{sec:02d}"
+    return f"{hours:02d}:{minutes:02d}:{sec:02d}"
+
+
+@dataclass
+class Snapshot:
+    context: dict
+    etag: str
+    built_at: float
+    html: str | None = None  # rendered once per snapshot by the UI route
+
+
+class DashboardSnapshots:
+    """
+    Inputs for the "/" page, rebuilt at most once per TTL no matter how many
+    browsers poll. The ETag is a hash of the context, so unchanged data
+    answers 304.
+    """
+
+    def __init__(self, ttl_seconds: float) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._snap: Snapshot | None = None
+
+    def get(self) -> Snapshot:
+        snap = self._snap
+        if snap is not None and time.monotonic() - snap.built_at < self.ttl_seconds:
+            return snap
+        with self._lock:
+            snap = self._snap
+            if snap is None or time.monotonic() - snap.built_at >= self.ttl_seconds:
+                snap = self._build()
+                self._snap = snap
+            return snap
+
+    def _build(self) -> Snapshot:
+        pulse = current_pulse()
+        with SessionLocal() as db:
+            alive, stale = fleet_counts(db)
+            last_events = [
+                {
+                    "id": e.id,
+                    "at": e.at,
+                    "severity": e.severity,
+                    "source": e.source,
+                    "event_type": e.event_type,
+                    "message": e.message,
+                }
+                for e in db.execute(select(EventLog).order_by(EventLog.at.desc()).limit(5)).scalars()
+            ]
+        recent_critical = sum(1 for e in last_events if (e["severity"] or "").lower() == "critical")
+
+        # Evaluated per sample by HEALTH; nothing to recompute here.
+        state, reasons = classify_system_state(HEALTH.current(), recent_critical_events=recent_critical)
+        context = {
+            "pulse": pulse,
+            "uptime_human": _format_uptime(pulse["uptime_seconds"]),
+            "state": state,
+            "state_reasons": reasons,
+            "nodes_alive": alive,
+            "nodes_stale": stale,
+            "last_events": last_events,
+        }
+        digest = hashlib.sha1(json.dumps(context, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return Snapshot(context=context, etag=f'"{digest[:20]}"', built_at=time.monotonic())
+
+
+DASHBOARD = DashboardSnapshots(SETTINGS.dashboard_ttl_seconds)
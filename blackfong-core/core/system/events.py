@@ -1,21 +1,44 @@
 from __future__ import annotations
 
+import asyncio
+import os
+import queue
+import threading
+import time
 from datetime import datetime, timezone
+from pathlib import Path
+from typing import TextIO
 
+from sqlalchemy import func, insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from core.config import SETTINGS
+from core.db.database import ENGINE
 from core.db.models import EventLog
+from core.system.leader import LEADER
+from core.system.perf import PERF
+from core.system.realtime import HUB
 
 
-def log_event(
-    db: Session,
+_PUT_TIMEOUT_SECONDS = 1.0
+# A failed batch write is retried with doubling waits, then kept in events.log only.
+_WRITE_ATTEMPTS = 6
+_RETRY_FIRST_SECONDS = 0.1
+_SINK_BUFFER_BYTES = 64 * 1024
+
+
+def build_event(
     message: str,
     *,
     event_type: str = "event",
     source: str = "system",
     severity: str = "info",
-) -> EventLog:
+    at: datetime | None = None,
+) -> dict:
+    """
+    Normalize an event into EventLog column values (no DB access).
+    """
     source_norm = source.strip().lower()
     if source_norm not in {"api", "system", "node"}:
         source_norm = "system"
@@ -27,30 +50,342 @@ def log_event(
     level_map = {"info": "INFO", "warn": "WARN", "critical": "ERROR"}
     level_norm = level_map.get(severity_norm, "INFO")
 
-    at = datetime.now(tz=timezone.utc)
-    row = EventLog(
-        at=at,
-        level=level_norm,
-        event_type=event_type.strip()[:64] if event_type else "event",
-        source=source_norm,
-        severity=severity_norm,
-        message=message,
+    return {
+        "at": at or datetime.now(tz=timezone.utc),
+        "level": level_norm,
+        "event_type": event_type.strip()[:64] if event_type else "event",
+        "source": source_norm,
+        "severity": severity_norm,
+        "message": message,
+    }
+
+
+def format_event_line(ev: dict) -> str:
+    return (
+        f"{ev['at'].isoformat()} [{ev['severity'].upper()}] "
+        f"({ev['source']}/{ev['event_type']}) {ev['message']}\n"
     )
-    db.add(row)
-    db.commit()
-    db.refresh(row)
 
-    # Also append to plain text file for tailing.
+
+class EventPipeline:
+    """
+    log_event() enqueues; one writer thread drains the queue in batches:
+    a single INSERT transaction per batch plus one buffered write to the
+    kept-open events.log.
+
+    A full queue blocks producers briefly (backpressure) and then falls back
+    to writing inline, so events are never dropped; a batch the DB keeps
+    refusing is retried with backoff and then kept in events.log only.
+    Not started = sync mode.
+    """
+
+    def __init__(self, *, maxsize: int, batch_size: int, flush_ms: int) -> None:
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = max(1, flush_ms) / 1000.0
+        self._queue: queue.Queue[dict] = queue.Queue(maxsize=max(1, maxsize))
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._sink_lock = threading.Lock()
+        self._sink: TextIO | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="blackfong-events", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Drain the queue, then close the text sink (shutdown hook)."""
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join(timeout=timeout)
+        self._thread = None
+        with self._sink_lock:
+            if self._sink is not None:
+                self._sink.close()
+                self._sink = None
+
+    def flush(self) -> None:
+        """Block until everything queued so far is written."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def submit(self, events: list[dict]) -> None:
+        if self._thread is None:
+            self.write(events)
+            return
+        for i, ev in enumerate(events):
+            try:
+                self._queue.put(ev, timeout=_PUT_TIMEOUT_SECONDS)
+            except queue.Full:
+                # Writer is far behind (or wedged): don't lose events.
+                self.write(events[i:])
+                return
+
+    def submit_nowait(self, events: list[dict]) -> list[dict]:
+        """Enqueue without blocking (event loop callers); returns what didn't fit."""
+        for i, ev in enumerate(events):
+            try:
+                self._queue.put_nowait(ev)
+            except queue.Full:
+                return events[i:]
+        return []
+
+    def _run(self) -> None:
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                first = self._queue.get(timeout=self.flush_seconds)
+            except queue.Empty:
+                continue
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write_retrying(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_retrying(self, batch: list[dict]) -> None:
+        # Typically a busy/locked DB: wait it out rather than drop the batch.
+        wait = _RETRY_FIRST_SECONDS
+        for attempt in range(_WRITE_ATTEMPTS):
+            try:
+                self.write(batch)
+                return
+            except Exception:
+                if attempt + 1 < _WRITE_ATTEMPTS:
+                    time.sleep(wait)
+                    wait *= 2
+        # Still failing: the text sink keeps the batch.
+        self.write_text(batch)
+
+    def write(self, events: list[dict]) -> None:
+        if not events:
+            return
+        with PERF.timed("events", (("op", "batch_write"),)):
+            with ENGINE.begin() as conn:
+                conn.execute(insert(EventLog), events)
+                # The write lock is held for the whole batch, so its rowids are
+                # the consecutive run ending at last_insert_rowid().
+                last = conn.exec_driver_sql("SELECT last_insert_rowid()").scalar()
+            self.write_text(events)
+        for i, ev in enumerate(events, start=last - len(events) + 1):
+            ev["id"] = i
+        _publish(events)
+
+    def _rotate(self) -> None:
+        # Size-based: events.log -> events.log.1 -> ... -> events.log.<log_backups>.
+        # Caller holds _sink_lock.
+        assert self._sink is not None
+        self._sink.close()
+        self._sink = None
+        base = SETTINGS.log_dir / "events.log"
+        for i in range(SETTINGS.log_backups - 1, 0, -1):
+            src = base.with_name(f"events.log.{i}")
+            if src.exists():
+                src.replace(base.with_name(f"events.log.{i + 1}"))
+        base.replace(base.with_name("events.log.1"))
+
+    def write_text(self, events: list[dict]) -> None:
+        """Append to the plain-text events.log only (rows committed elsewhere)."""
+        try:
+            with self._sink_lock:
+                log_path = SETTINGS.log_dir / "events.log"
+                if self._sink is not None and SETTINGS.workers > 1 and _rotated(log_path, self._sink):
+                    # Another worker rotated it; follow the new file.
+                    self._sink.close()
+                    self._sink = None
+                if self._sink is None:
+                    SETTINGS.log_dir.mkdir(parents=True, exist_ok=True)
+                    self._sink = log_path.open("a", encoding="utf-8", buffering=_SINK_BUFFER_BYTES)
+                self._sink.write("".join(format_event_line(ev) for ev in events))
+                self._sink.flush()
+                # One rotator per data_dir, or workers would shift each other's files.
+                if SETTINGS.log_max_bytes and LEADER.is_leader and self._sink.tell() >= SETTINGS.log_max_bytes:
+                    self._rotate()
+        except Exception:
+            # If the filesystem is unhappy, DB still has it.
+            pass
+
+
+def _rotated(path: Path, sink: TextIO) -> bool:
     try:
-        SETTINGS.log_dir.mkdir(parents=True, exist_ok=True)
-        log_path = SETTINGS.log_dir / "events.log"
-        with log_path.open("a", encoding="utf-8") as f:
-            f.write(
-                f"{at.isoformat()} [{severity_norm.upper()}] ({source_norm}/{row.event_type}) {message}\n"
-            )
-    except Exception:
-        # If the filesystem is unhappy, DB still has it.
-        pass
-
-    return row
+        return os.stat(path).st_ino != os.fstat(sink.fileno()).st_ino
+    except OSError:
+        return True
+
+
+def _publish(events: list[dict]) -> None:
+    # Several workers: tail_events() publishes instead, from event_log.
+    if SETTINGS.workers == 1:
+        HUB.publish("events", events)
+
+
+EVENTS = EventPipeline(
+    maxsize=SETTINGS.events_queue_size,
+    batch_size=SETTINGS.events_batch_size,
+    flush_ms=SETTINGS.events_flush_ms,
+)
+
+
+def log_event(
+    db: Session | None,
+    message: str,
+    *,
+    event_type: str = "event",
+    source: str = "system",
+    severity: str = "info",
+) -> EventLog:
+    """
+    Record an event. With the pipeline running the row is written by the
+    background writer (the returned EventLog has no id yet); otherwise, or
+    with BLACKFONG_EVENTS_SYNC=1, it is committed on `db` before returning.
+    """
+    with PERF.timed("events", (("op", "log_event"),)):
+        ev = build_event(message, event_type=event_type, source=source, severity=severity)
+        if EVENTS.running and not SETTINGS.events_sync:
+            EVENTS.submit([ev])
+            return EventLog(**ev)
+
+        row = EventLog(**ev)
+        if db is None:
+            EVENTS.write([ev])
+            return row
+        db.add(row)
+        db.commit()
+        db.refresh(row)
+        EVENTS.write_text([ev])
+        _publish([{**ev, "id": row.id}])
+        return row
+
+
+async def log_event_async(
+    db: AsyncSession | None,
+    message: str,
+    *,
+    event_type: str = "event",
+    source: str = "system",
+    severity: str = "info",
+) -> EventLog:
+    """log_event() for async handlers: never blocks the event loop."""
+    with PERF.timed("events", (("op", "log_event"),)):
+        ev = build_event(message, event_type=event_type, source=source, severity=severity)
+        if EVENTS.running and not SETTINGS.events_sync:
+            overflow = EVENTS.submit_nowait([ev])
+            if overflow:
+                await asyncio.to_thread(EVENTS.write, overflow)
+            return EventLog(**ev)
+
+        row = EventLog(**ev)
+        if db is None:
+            await asyncio.to_thread(EVENTS.write, [ev])
+            return row
+        db.add(row)
+        await db.commit()
+        await db.refresh(row)
+        EVENTS.write_text([ev])
+        _publish([{**ev, "id": row.id}])
+        return row
+
+
+def query_events(
+    db: Session,
+    *,
+    limit: int = 200,
+    before_id: int | None = None,
+    after_id: int | None = None,
+    event_type: str | None = None,
+    source: str | None = None,
+    severity: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    contains: str | None = None,
+) -> list[EventLog]:
+    """
+    Keyset page over (at, id). Newest first, or oldest first when paging
+    forward with after_id. Cost is O(page) through the (filter, at) indexes;
+    `contains` is applied on top of them.
+    """
+    q = select(EventLog)
+    if event_type:
+        q = q.where(EventLog.event_type == event_type)
+    if source:
+        q = q.where(EventLog.source == source.strip().lower())
+    if severity:
+        q = q.where(EventLog.severity == severity.strip().lower())
+    if since is not None:
+        q = q.where(EventLog.at >= since)
+    if until is not None:
+        q = q.where(EventLog.at < until)
+    if contains:
+        q = q.where(EventLog.message.contains(contains, autoescape=True))
+
+    key = tuple_(EventLog.at, EventLog.id)
+    cursor_id = before_id if before_id is not None else after_id
+    if cursor_id is not None:
+        cursor_at = db.execute(select(EventLog.at).where(EventLog.id == cursor_id)).scalar()
+        if cursor_at is None:
+            # Cursor row was pruned: nothing older survives; everything newer does.
+            if before_id is not None:
+                return []
+        elif before_id is not None:
+            q = q.where(key < tuple_(cursor_at, cursor_id))
+        else:
+            q = q.where(key > tuple_(cursor_at, cursor_id))
+
+    if after_id is not None:
+        q = q.order_by(EventLog.at.asc(), EventLog.id.asc())
+    else:
+        q = q.order_by(EventLog.at.desc(), EventLog.id.desc())
+    return list(db.execute(q.limit(limit)).scalars().all())
+
+
+async def query_events_async(db: AsyncSession, **filters) -> list[EventLog]:
+    # Same query code, run on the async session's connection.
+    return await db.run_sync(lambda s: query_events(s, **filters))
+
+
+_TAIL_PAGE = 1000
+
+
+def _last_event_id() -> int:
+    with ENGINE.connect() as conn:
+        return conn.execute(select(func.max(EventLog.id))).scalar() or 0
+
+
+def _events_after(last_id: int) -> list[dict]:
+    cols = EventLog.__table__.c
+    with ENGINE.connect() as conn:
+        rows = conn.execute(select(cols).where(cols.id > last_id).order_by(cols.id).limit(_TAIL_PAGE))
+        return [dict(r._mapping) for r in rows]
+
 
+async def tail_events() -> None:
+    """
+    Several workers: each feeds its push clients from event_log (rowids past
+    the last one seen) rather than from its own writes, so every client sees
+    every worker's events once, in id order.
+    """
+    interval = SETTINGS.events_flush_ms / 1000.0
+    # Start at the end: older events are what ?since_event_id backfills.
+    last = await asyncio.to_thread(_last_event_id)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            rows = await asyncio.to_thread(_events_after, last)
+        except Exception:
+            continue
+        if rows:
+            last = rows[-1]["id"]
+            HUB.publish("events", rows)
@@ -0,0 +1,425 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from core.config import SETTINGS
+from core.db.database import ENGINE
+from core.db.models import FleetDispatch, Node, NodeJob
+from core.system.commands import ALLOWED_COMMANDS
+from core.system.events import log_event
+from core.system.registry import REGISTRY
+
+
+# Most jobs handed to one node per pickup; the rest wait for the next one.
+JOBS_PER_PICKUP = 20
+
+# Outcomes a node may report.
+RESULT_STATUSES = ("OK", "FAIL", "TIMEOUT")
+
+_jobs_t = NodeJob.__table__
+_nodes_t = Node.__table__
+
+_RESULT_STMT = (
+    update(_jobs_t)
+    .where(_jobs_t.c.id == bindparam("b_id"), _jobs_t.c.status == "SENT")
+    .values(
+        status=bindparam("b_status"),
+        return_code=bindparam("b_return_code"),
+        output=bindparam("b_output"),
+        finished_at=bindparam("b_finished_at", type_=_jobs_t.c.finished_at.type),
+    )
+)
+
+_LAST_COMMAND_STMT = (
+    update(_nodes_t).where(_nodes_t.c.id == bindparam("b_id")).values(last_command=bindparam("b_last_command"))
+)
+
+
+def parse_capabilities(text: str | None) -> set[str]:
+    """Capabilities as stored by register: a JSON list/dict, or comma-separated text."""
+    if not text:
+        return set()
+    try:
+        value = json.loads(text)
+    except ValueError:
+        value = text
+    if isinstance(value, dict):
+        return {str(k) for k, v in value.items() if v}
+    if isinstance(value, list):
+        return {str(v) for v in value}
+    return {c.strip() for c in str(value).split(",") if c.strip()}
+
+
+def job_timeout(name: str) -> int:
+    spec = ALLOWED_COMMANDS.get(name)
+    return (spec.timeout_seconds if spec else None) or SETTINGS.command_timeout_seconds
+
+
+def _pending_cutoff(now: datetime) -> datetime:
+    return now - timedelta(seconds=SETTINGS.node_job_ttl_seconds)
+
+
+class JobBoard:
+    """
+    Which nodes have PENDING jobs, kept in memory so a heartbeat only touches
+    node_jobs when there is something to hand out, and long-polls can sleep
+    until there is.
+
+    Dispatches in this process mark nodes directly; with several workers a
+    periodic refresh over ix_node_jobs_status_node picks up the others'.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pending: set[int] = set()
+        self._waiters: dict[int, set[asyncio.Event]] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop | None) -> None:
+        self._loop = loop
+
+    def has_pending(self, node_id: int) -> bool:
+        return node_id in self._pending
+
+    def mark(self, node_ids: list[int]) -> None:
+        with self._lock:
+            self._pending.update(node_ids)
+        self._wake(node_ids)
+
+    def discard(self, node_ids: list[int]) -> None:
+        with self._lock:
+            self._pending.difference_update(node_ids)
+
+    def refresh(self, db: Session) -> None:
+        cutoff = _pending_cutoff(datetime.now(tz=timezone.utc))
+        ids = set(
+            db.execute(
+                select(_jobs_t.c.node_id)
+                .where(_jobs_t.c.status == "PENDING", _jobs_t.c.created_at >= cutoff)
+                .distinct()
+            ).scalars()
+        )
+        with self._lock:
+            new = ids - self._pending
+            self._pending = ids
+        self._wake(list(new))
+
+    def _wake(self, node_ids: list[int]) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed() or not self._waiters:
+            return
+        ids = [i for i in node_ids if i in self._waiters]
+        if ids:
+            loop.call_soon_threadsafe(self._set, ids)
+
+    def _set(self, node_ids: list[int]) -> None:
+        for i in node_ids:
+            for ev in self._waiters.get(i, ()):
+                ev.set()
+
+    async def wait(self, node_id: int, timeout: float) -> None:
+        """Return once node_id may have work, or after timeout (loop thread only)."""
+        ev = asyncio.Event()
+        self._waiters.setdefault(node_id, set()).add(ev)
+        try:
+            if node_id not in self._pending:
+                await asyncio.wait_for(ev.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            waiters = self._waiters.get(node_id)
+            if waiters is not None:
+                waiters.discard(ev)
+                if not waiters:
+                    del self._waiters[node_id]
+
+
+JOBS = JobBoard()
+
+
+def target_nodes(
+    db: Session,
+    *,
+    names: list[str] | None = None,
+    version: str | None = None,
+    capability: str | None = None,
+    all_nodes: bool = False,
+) -> list[int]:
+    """Node ids matching every given criterion (names, version, capability)."""
+    if not (names or version or capability or all_nodes):
+        raise ValueError("target needs names, version, capability or all")
+    REGISTRY.ensure_loaded(db)
+    if names:
+        records = [r for r in map(REGISTRY.by_name, names) if r is not None]
+    else:
+        records = REGISTRY.records()
+    if version is not None:
+        records = [r for r in records if r.version == version]
+    if capability:
+        records = [r for r in records if capability in parse_capabilities(r.capabilities)]
+    return sorted({r.id for r in records})
+
+
+def dispatch(
+    db: Session,
+    *,
+    name: str,
+    requested_by: str | None,
+    names: list[str] | None = None,
+    version: str | None = None,
+    capability: str | None = None,
+    all_nodes: bool = False,
+) -> FleetDispatch:
+    """
+    Queue one PENDING job per targeted node. Nodes collect them from their
+    heartbeat response or a long-poll; the core never connects out.
+    """
+    if name not in ALLOWED_COMMANDS:
+        raise PermissionError("Command not allowed")
+    node_ids = target_nodes(db, names=names, version=version, capability=capability, all_nodes=all_nodes)
+    now = datetime.now(tz=timezone.utc)
+    target = {"names": names, "version": version, "capability": capability, "all": all_nodes or None}
+    row = FleetDispatch(
+        name=name,
+        target=json.dumps({k: v for k, v in target.items() if v}, sort_keys=True),
+        requested_by=requested_by,
+        requested_at=now,
+        node_count=len(node_ids),
+    )
+    db.add(row)
+    db.flush()
+    if node_ids:
+        db.execute(
+            insert(NodeJob),
+            [
+                {"dispatch_id": row.id, "node_id": nid, "name": name, "status": "PENDING", "created_at": now}
+                for nid in node_ids
+            ],
+        )
+    db.commit()
+    db.refresh(row)
+    JOBS.mark(node_ids)
+    log_event(
+        db,
+        f"fleet dispatch {row.id}: {name} to {len(node_ids)} node(s) by {requested_by}",
+        event_type="command.dispatch",
+        source="api",
+        severity="info",
+    )
+    return row
+
+
+def claim_jobs(db: Session, node_ids: list[int], *, per_node: int = JOBS_PER_PICKUP) -> list[dict]:
+    """
+    Hand out PENDING jobs for these nodes (marked SENT in one statement, so
+    two pickups never get the same job). Oldest first.
+    """
+    if not node_ids:
+        return []
+    now = datetime.now(tz=timezone.utc)
+    claimable = (
+        _jobs_t.c.status == "PENDING",
+        _jobs_t.c.node_id.in_(node_ids),
+        _jobs_t.c.created_at >= _pending_cutoff(now),
+    )
+    # At most per_node per node, so one backlogged node can't take every slot.
+    rank = func.row_number().over(partition_by=_jobs_t.c.node_id, order_by=_jobs_t.c.id).label("rank")
+    ranked = select(_jobs_t.c.id, rank).where(*claimable).subquery()
+    pick = select(ranked.c.id).where(ranked.c.rank <= per_node)
+    rows = db.execute(
+        update(_jobs_t)
+        .where(_jobs_t.c.id.in_(pick))
+        .values(status="SENT", sent_at=now)
+        .returning(_jobs_t.c.id, _jobs_t.c.dispatch_id, _jobs_t.c.node_id, _jobs_t.c.name, _jobs_t.c.created_at)
+    ).all()
+    left = set(db.execute(select(_jobs_t.c.node_id).where(*claimable).distinct()).scalars())
+    db.commit()
+
+    JOBS.discard([nid for nid in node_ids if nid not in left])
+    return [
+        {
+            "id": r.id,
+            "dispatch_id": r.dispatch_id,
+            "node_id": r.node_id,
+            "name": r.name,
+            "created_at": r.created_at,
+            "timeout_seconds": job_timeout(r.name),
+        }
+        for r in sorted(rows, key=lambda r: r.id)
+    ]
+
+
+def _cap(output: str | None) -> str | None:
+    if output is None:
+        return None
+    raw = output.encode("utf-8")
+    cap = SETTINGS.node_job_output_cap_bytes
+    return output if len(raw) <= cap else raw[:cap].decode("utf-8", errors="ignore")
+
+
+def report_results(db: Session, results: list[dict]) -> tuple[int, list[int]]:
+    """
+    Apply a batch of outcomes ({job_id, node_id, status, return_code, output})
+    in one transaction. Only a SENT job of the reporting node takes a result;
+    anything else (wrong node, duplicate, already timed out) is returned as
+    unknown. Returns (accepted, unknown job ids).
+    """
+    by_id = {r["job_id"]: r for r in results}
+    if not by_id:
+        return 0, []
+    rows = db.execute(
+        select(_jobs_t.c.id, _jobs_t.c.node_id, _jobs_t.c.dispatch_id, _jobs_t.c.name).where(
+            _jobs_t.c.id.in_(list(by_id)), _jobs_t.c.status == "SENT"
+        )
+    ).all()
+    known = [r for r in rows if r.node_id == by_id[r.id]["node_id"]]
+    unknown = sorted(set(by_id) - {r.id for r in known})
+    if not known:
+        return 0, unknown
+
+    now = datetime.now(tz=timezone.utc)
+    last_command: dict[int, str] = {}
+    outcomes: dict[tuple[int, str], Counter] = defaultdict(Counter)
+    params = []
+    for r in sorted(known, key=lambda r: r.id):
+        res = by_id[r.id]
+        params.append(
+            {
+                "b_id": r.id,
+                "b_status": res["status"],
+                "b_return_code": res.get("return_code"),
+                "b_output": _cap(res.get("output")),
+                "b_finished_at": now,
+            }
+        )
+        last_command[r.node_id] = f"{r.name} {res['status']} (rc={res.get('return_code')}, job {r.id})"
+        outcomes[(r.dispatch_id, r.name)][res["status"]] += 1
+    db.execute(_RESULT_STMT, params)
+    db.execute(_LAST_COMMAND_STMT, [{"b_id": nid, "b_last_command": text} for nid, text in last_command.items()])
+    db.commit()
+    for nid, text in last_command.items():
+        REGISTRY.note(nid, last_command=text)
+
+    # One event per dispatch per batch, not one per node.
+    for (dispatch_id, name), counts in sorted(outcomes.items()):
+        log_event(
+            db,
+            f"fleet dispatch {dispatch_id}: {name} results "
+            + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())),
+            event_type="command.result",
+            source="node",
+            severity="info" if set(counts) == {"OK"} else "warn",
+        )
+    return len(known), unknown
+
+
+def expire_jobs(now: datetime | None = None) -> dict:
+    """
+    Bookkeeping for jobs nobody will finish: PENDING past the TTL become
+    EXPIRED (pickup already ignores them), SENT past the command's timeout
+    become TIMEOUT.
+    """
+    now = now or datetime.now(tz=timezone.utc)
+    with ENGINE.begin() as conn:
+        expired = conn.execute(
+            update(_jobs_t)
+            .where(_jobs_t.c.status == "PENDING", _jobs_t.c.created_at < _pending_cutoff(now))
+            .values(status="EXPIRED", finished_at=now)
+        ).rowcount
+        timed_out = 0
+        names = conn.execute(select(_jobs_t.c.name).where(_jobs_t.c.status == "SENT").distinct()).scalars().all()
+        for name in names:
+            timed_out += conn.execute(
+                update(_jobs_t)
+                .where(
+                    _jobs_t.c.status == "SENT",
+                    _jobs_t.c.name == name,
+                    _jobs_t.c.sent_at < now - timedelta(seconds=job_timeout(name)),
+                )
+                .values(status="TIMEOUT", finished_at=now)
+            ).rowcount
+    if expired or timed_out:
+        log_event(
+            None,
+            f"fleet jobs: {expired} expired before pickup, {timed_out} timed out without a result",
+            event_type="command.result",
+            source="system",
+            severity="warn",
+        )
+    return {"expired": expired, "timed_out": timed_out}
+
+
+def dispatch_status(db: Session, dispatch_id: int) -> dict | None:
+    row = db.get(FleetDispatch, dispatch_id)
+    if row is None:
+        return None
+    counts = db.execute(
+        select(_jobs_t.c.status, func.count())
+        .where(_jobs_t.c.dispatch_id == dispatch_id)
+        .group_by(_jobs_t.c.status)
+    ).all()
+    return {
+        "id": row.id,
+        "name": row.name,
+        "target": json.loads(row.target),
+        "requested_by": row.requested_by,
+        "requested_at": row.requested_at,
+        "node_count": row.node_count,
+        "counts": {status: n for status, n in counts},
+    }
+
+
+def list_dispatches(db: Session, limit: int = 100) -> list[FleetDispatch]:
+    q = select(FleetDispatch).order_by(FleetDispatch.requested_at.desc()).limit(limit)
+    return list(db.execute(q).scalars().all())
+
+
+def list_jobs(
+    db: Session,
+    dispatch_id: int,
+    *,
+    status: str | None = None,
+    after_id: int | None = None,
+    limit: int = 200,
+) -> list[NodeJob]:
+    q = select(NodeJob).where(NodeJob.dispatch_id == dispatch_id)
+    if status is not None:
+        q = q.where(NodeJob.status == status)
+    if after_id is not None:
+        q = q.where(NodeJob.id > after_id)
+    return list(db.execute(q.order_by(NodeJob.id).limit(limit)).scalars().all())
+
+
+# Async variants for async route handlers (same queries via run_sync).
+
+
+async def dispatch_async(db: AsyncSession, **fields) -> FleetDispatch:
+    return await db.run_sync(lambda s: dispatch(s, **fields))
+
+
+async def claim_jobs_async(db: AsyncSession, node_ids: list[int]) -> list[dict]:
+    return await db.run_sync(lambda s: claim_jobs(s, node_ids))
+
+
+async def report_results_async(db: AsyncSession, results: list[dict]) -> tuple[int, list[int]]:
+    return await db.run_sync(lambda s: report_results(s, results))
+
+
+async def dispatch_status_async(db: AsyncSession, dispatch_id: int) -> dict | None:
+    return await db.run_sync(lambda s: dispatch_status(s, dispatch_id))
+
+
+async def list_dispatches_async(db: AsyncSession, limit: int = 100) -> list[FleetDispatch]:
+    return await db.run_sync(lambda s: list_dispatches(s, limit))
+
+
+async def list_jobs_async(db: AsyncSession, dispatch_id: int, **filters) -> list[NodeJob]:
+    return await db.run_sync(lambda s: list_jobs(s, dispatch_id, **filters))
@@ -1,73 +1,347 @@
 from __future__ import annotations
 
+import json
+import threading
+from collections import deque
+from dataclasses import dataclass
 from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
 from core.config import SETTINGS
+from core.db.database import ENGINE
+from core.db.models import HealthChange
+from core.system.events import EVENTS, build_event
+from core.system.leader import LEADER
+from core.system.metrics import RING_FIELDS
+from core.system.registry import REGISTRY
+
+
+_changes_t = HealthChange.__table__
+
+STATES = ("STABLE", "DEGRADED", "CRITICAL")  # index = level
+METRICS = (*RING_FIELDS[1:], "stale_nodes")
+_AGGREGATES = ("last", "min", "avg", "max")
+# A level raised on one aggregate clears on its opposite: "min >= 85 for 30s"
+# holds until "max < 85 - clear_margin for 30s".
+_CLEAR_AGGREGATE = {"last": "last", "min": "max", "max": "min", "avg": "avg"}
+
+# Used when health_rules_path does not exist; the same format as the file.
+DEFAULT_RULES: list[dict] = [
+    {
+        "name": "cpu",
+        "metric": "cpu_percent",
+        "aggregate": "min",
+        "window_seconds": 30,
+        "degraded": 85,
+        "critical": 95,
+        "clear_margin": 5,
+        "reason": "CPU {value:.0f}%",
+    },
+    {
+        "name": "memory",
+        "metric": "memory_percent",
+        "aggregate": "min",
+        "window_seconds": 30,
+        "degraded": 85,
+        "critical": 95,
+        "clear_margin": 5,
+        "reason": "RAM {value:.0f}%",
+    },
+    {
+        "name": "disk",
+        "metric": "disk_percent",
+        "aggregate": "last",
+        "window_seconds": 0,
+        "degraded": 85,
+        "critical": 95,
+        "clear_margin": 2,
+        "reason": "Disk {value:.0f}%",
+    },
+    {
+        "name": "temp",
+        "metric": "temp_c",
+        "aggregate": "avg",
+        "window_seconds": 30,
+        "degraded": 75,
+        "critical": 85,
+        "clear_margin": 3,
+        "reason": "Temp {value:.0f}C",
+    },
+    {
+        "name": "stale_nodes",
+        "metric": "stale_nodes",
+        "aggregate": "last",
+        "window_seconds": 0,
+        "degraded": 1,
+        "clear_margin": 0,
+        "reason": f"{{value:.0f}} stale node(s) (> {SETTINGS.node_stale_seconds}s)",
+    },
+]
+
+
+@dataclass(frozen=True)
+class HealthRule:
+    name: str
+    metric: str
+    aggregate: str
+    window_seconds: float
+    degraded: float | None
+    critical: float | None
+    clear_margin: float
+    reason: str
+
+    def level(self, value: float, margin: float = 0.0) -> int:
+        if self.critical is not None and value >= self.critical - margin:
+            return 2
+        if self.degraded is not None and value >= self.degraded - margin:
+            return 1
+        return 0
+
+    def step(self, level: int, window: SlidingWindow) -> tuple[int, float | None]:
+        """
+        Next (level, the value that decides it), with hysteresis; the level
+        is held while the window is still filling.
+        """
+        if not window:
+            return 0, None
+        value = window.value(self.aggregate)
+        if not window.full:
+            return level, value
+        raised = self.level(value)
+        if raised >= level:
+            return raised, value
+        clear_value = window.value(_CLEAR_AGGREGATE[self.aggregate])
+        held = min(level, self.level(clear_value, self.clear_margin))
+        return (held, clear_value) if held > raised else (raised, value)
+
+
+def _rule(spec: dict) -> HealthRule:
+    unknown = set(spec) - {f for f in HealthRule.__dataclass_fields__}
+    if unknown:
+        raise ValueError(f"unknown key(s) {sorted(unknown)}")
+    if spec.get("metric") not in METRICS:
+        raise ValueError(f"metric must be one of {list(METRICS)}")
+    aggregate = spec.get("aggregate", "last")
+    if aggregate not in _AGGREGATES:
+        raise ValueError(f"aggregate must be one of {list(_AGGREGATES)}")
+    if spec.get("degraded") is None and spec.get("critical") is None:
+        raise ValueError("needs a degraded and/or critical threshold")
+    return HealthRule(
+        name=str(spec.get("name") or spec["metric"]),
+        metric=spec["metric"],
+        aggregate=aggregate,
+        window_seconds=max(0.0, float(spec.get("window_seconds", 0))),
+        degraded=None if spec.get("degraded") is None else float(spec["degraded"]),
+        critical=None if spec.get("critical") is None else float(spec["critical"]),
+        clear_margin=max(0.0, float(spec.get("clear_margin", 0))),
+        reason=str(spec.get("reason") or spec["metric"] + " {value:.1f}"),
+    )
 
 
-def classify_system_state(pulse: dict, *, stale_nodes: int, recent_critical_events: int) -> tuple[str, list[str]]:
+def load_rules(path: Path) -> list[HealthRule]:
     """
-    Return (STABLE|DEGRADED|CRITICAL, reasons[]).
+    Rules from a JSON file ({"rules": [...]} or a bare list), or
+    DEFAULT_RULES when it does not exist.
     """
-    reasons: list[str] = []
-
-    cpu = float(pulse.get("cpu_percent") or 0.0)
-    mem = float(pulse.get("memory_percent") or 0.0)
-    disk = float(pulse.get("disk_percent") or 0.0)
-    temp = pulse.get("temp_c")
-    temp_f = float(temp) if temp is not None else None
-
-    degraded = False
-    critical = False
-
-    def bump(kind: str, msg: str) -> None:
-        nonlocal degraded, critical
-        if kind == "critical":
-            critical = True
-        elif kind == "degraded":
-            degraded = True
-        reasons.append(msg)
-
-    if cpu >= 95:
-        bump("critical", f"CPU {cpu:.0f}%")
-    elif cpu >= 85:
-        bump("degraded", f"CPU {cpu:.0f}%")
-
-    if mem >= 95:
-        bump("critical", f"RAM {mem:.0f}%")
-    elif mem >= 85:
-        bump("degraded", f"RAM {mem:.0f}%")
-
-    if disk >= 95:
-        bump("critical", f"Disk {disk:.0f}%")
-    elif disk >= 85:
-        bump("degraded", f"Disk {disk:.0f}%")
-
-    if temp_f is not None:
-        if temp_f >= 85:
-            bump("critical", f"Temp {temp_f:.0f}C")
-        elif temp_f >= 75:
-            bump("degraded", f"Temp {temp_f:.0f}C")
-
-    if stale_nodes > 0:
-        bump("degraded", f"{stale_nodes} stale node(s) (> {SETTINGS.node_stale_seconds}s)")
+    if not path.exists():
+        return [_rule(spec) for spec in DEFAULT_RULES]
+    data = json.loads(path.read_text(encoding="utf-8"))
+    specs = data.get("rules", []) if isinstance(data, dict) else data
+    rules = []
+    for i, spec in enumerate(specs):
+        try:
+            rules.append(_rule(spec))
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"{path}: rule {i}: {e}") from None
+    if len({r.name for r in rules}) != len(rules):
+        raise ValueError(f"{path}: rule names must be unique")
+    return rules
+
+
+class SlidingWindow:
+    """
+    One metric's samples over the last `seconds`. min/max come from
+    monotonic deques and avg from a running sum, so adding a sample and
+    reading any aggregate are O(1) amortized (each sample is pushed and
+    popped once). window_seconds=0 keeps only the latest sample.
+    """
+
+    def __init__(self, seconds: float) -> None:
+        self.seconds = seconds
+        self._samples: deque[tuple[float, float]] = deque()
+        self._mins: deque[tuple[float, float]] = deque()
+        self._maxs: deque[tuple[float, float]] = deque()
+        self._sum = 0.0
+        self._since: float | None = None  # first sample of the current run of data
+
+    def __bool__(self) -> bool:
+        return bool(self._samples)
+
+    @property
+    def full(self) -> bool:
+        """Data for the whole window, so "sustained" means what it says."""
+        return bool(self._samples) and self._samples[-1][0] - self._since >= self.seconds
+
+    def add(self, ts: float, value: float | None) -> None:
+        if value is not None:
+            value = float(value)
+            if self._since is None:
+                self._since = ts
+            self._samples.append((ts, value))
+            self._sum += value
+            while self._mins and self._mins[-1][1] >= value:
+                self._mins.pop()
+            self._mins.append((ts, value))
+            while self._maxs and self._maxs[-1][1] <= value:
+                self._maxs.pop()
+            self._maxs.append((ts, value))
+        cutoff = ts - self.seconds
+        while self._samples and self._samples[0][0] < cutoff:
+            self._sum -= self._samples.popleft()[1]
+        while self._mins and self._mins[0][0] < cutoff:
+            self._mins.popleft()
+        while self._maxs and self._maxs[0][0] < cutoff:
+            self._maxs.popleft()
+        if not self._samples:
+            # A metric that went missing (no sensor) starts over when it returns.
+            self._since = None
+            self._sum = 0.0
+
+    def value(self, aggregate: str) -> float:
+        if aggregate == "min":
+            return self._mins[0][1]
+        if aggregate == "max":
+            return self._maxs[0][1]
+        if aggregate == "avg":
+            return self._sum / len(self._samples)
+        return self._samples[-1][1]
 
-    if recent_critical_events > 0:
-        bump("critical", f"{recent_critical_events} critical event(s) (recent)")
 
-    if critical:
+class HealthEngine:
+    """
+    System health from rules over the pulse samples, evaluated as each
+    sample arrives (a SAMPLER listener) instead of from one snapshot per
+    request. Every rule has a sliding window per (metric, window_seconds),
+    a level with hysteresis, and the overall state is the highest level.
+
+    Every worker evaluates the same samples, so each can answer
+    current() from memory; only the leader records transitions in
+    health_changes (and as a system.health event).
+    """
+
+    def __init__(self, rules: list[HealthRule]) -> None:
+        self.rules = rules
+        self._lock = threading.Lock()
+        self._windows: dict[tuple[str, float], SlidingWindow] = {}
+        for r in rules:
+            self._windows.setdefault((r.metric, r.window_seconds), SlidingWindow(r.window_seconds))
+        self._levels = {r.name: 0 for r in rules}
+        self._warmup = max((r.window_seconds for r in rules), default=0.0)
+        self._started: float | None = None
+        self._last_ts = 0.0
+        self._current: dict = {"state": STATES[0], "reasons": [], "since": None, "evaluated_at": None}
+
+    def load(self, db: Session) -> None:
+        """Start from the last recorded state (startup)."""
+        row = db.execute(select(HealthChange).order_by(HealthChange.id.desc()).limit(1)).scalar()
+        if row is None:
+            return
+        with self._lock:
+            self._current = {
+                **self._current,
+                "state": row.state,
+                "reasons": json.loads(row.reasons or "[]"),
+                "since": row.at,
+            }
+
+    def current(self) -> dict:
+        with self._lock:
+            return {**self._current, "reasons": list(self._current["reasons"])}
+
+    def observe(self, sample: dict) -> None:
+        ts = sample["ts"]
+        values = {**sample, "stale_nodes": REGISTRY.stale_count}
+        with self._lock:
+            # Windows assume time order (a clock step back would corrupt them).
+            if ts <= self._last_ts:
+                return
+            self._last_ts = ts
+            if self._started is None:
+                self._started = ts
+            for (metric, _), window in self._windows.items():
+                window.add(ts, values.get(metric))
+            level = 0
+            reasons: list[str] = []
+            rules: list[dict] = []
+            for r in self.rules:
+                window = self._windows[(r.metric, r.window_seconds)]
+                lvl, value = r.step(self._levels[r.name], window)
+                self._levels[r.name] = lvl
+                if lvl:
+                    level = max(level, lvl)
+                    reasons.append(r.reason.format(value=value))
+                rules.append({"name": r.name, "level": STATES[lvl], "value": value})
+            at = datetime.fromtimestamp(ts, tz=timezone.utc)
+            change = None
+            current = {**self._current, "evaluated_at": at, "rules": rules}
+            # While windows fill, the state may rise but not fall (no false all-clear).
+            if ts - self._started >= self._warmup or level >= STATES.index(current["state"]):
+                if STATES[level] != current["state"]:
+                    change = {"at": at, "state": STATES[level], "previous": current["state"], "reasons": reasons}
+                    current["since"] = at
+                current["state"] = STATES[level]
+                current["reasons"] = reasons
+            self._current = current
+        if change is not None and LEADER.is_leader:
+            _record(change)
+
+
+def _record(change: dict) -> None:
+    with ENGINE.begin() as conn:
+        conn.execute(insert(_changes_t), [{**change, "reasons": json.dumps(change["reasons"])}])
+    detail = f": {'; '.join(change['reasons'])}" if change["reasons"] else ""
+    EVENTS.submit(
+        [
+            build_event(
+                f"system health {change['previous']} -> {change['state']}{detail}",
+                event_type="system.health",
+                source="system",
+                # Not "critical": the dashboard escalates on recent critical events.
+                severity="info" if change["state"] == "STABLE" else "warn",
+                at=change["at"],
+            )
+        ]
+    )
+
+
+HEALTH = HealthEngine(load_rules(SETTINGS.health_rules_path))
+
+
+def health_history(db: Session, *, limit: int = 100, before_id: int | None = None) -> list[dict]:
+    """Recorded transitions, newest first; page back with before_id."""
+    q = select(_changes_t)
+    if before_id is not None:
+        q = q.where(_changes_t.c.id < before_id)
+    rows = db.execute(q.order_by(_changes_t.c.id.desc()).limit(limit)).all()
+    return [{**r._mapping, "reasons": json.loads(r.reasons or "[]")} for r in rows]
+
+
+async def health_history_async(db: AsyncSession, **kw) -> list[dict]:
+    return await db.run_sync(lambda s: health_history(s, **kw))
+
+
+def classify_system_state(health: dict, *, recent_critical_events: int) -> tuple[str, list[str]]:
+    """
+    Return (STABLE|DEGRADED|CRITICAL, reasons[]): HEALTH's current state,
+    escalated to CRITICAL by recent critical events.
+    """
+    reasons = list(health["reasons"])
+    if recent_critical_events > 0:
+        reasons.append(f"{recent_critical_events} critical event(s) (recent)")
         return "CRITICAL", reasons
-    if degraded:
-        return "DEGRADED", reasons
-    return "STABLE", reasons
-
-
-def node_is_stale(last_seen, *, now=None) -> bool:
-    if now is None:
-        now = datetime.now(tz=timezone.utc)
-    try:
-        age = (now - last_seen).total_seconds()
-    except Exception:
-        return True
-    return age > SETTINGS.node_stale_seconds
+    return health["state"], reasons
 
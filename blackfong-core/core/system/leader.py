@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import os
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from core.config import SETTINGS
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Blocking exclusive flock for short critical sections across workers."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+class LeaderLock:
+    """
+    One process per data_dir runs the background jobs (backups, retention,
+    pulse sampling, orphan recovery): whoever holds an exclusive flock on
+    leader.lock. The kernel drops the lock when that process dies, so a
+    follower's next attempt takes over.
+    """
+
+    def __init__(self, path: Path, retry_seconds: float) -> None:
+        self.path = path
+        self.retry_seconds = retry_seconds
+        self._fd: int | None = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def holder(self) -> int | None:
+        """Pid of the current leader, as it wrote it (may be stale)."""
+        try:
+            return int(self.path.read_text().strip())
+        except (OSError, ValueError):
+            return None
+
+    async def campaign(self, on_elected: Callable[[], Awaitable[None]]) -> None:
+        """Retry until elected, then run on_elected() once."""
+        while not self.try_acquire():
+            await asyncio.sleep(self.retry_seconds)
+        await on_elected()
+
+
+LEADER = LeaderLock(SETTINGS.data_dir / "leader.lock", retry_seconds=SETTINGS.leader_retry_seconds)
@@ -1,11 +1,24 @@
 from __future__ import annotations
 
+import asyncio
+import fcntl
+import math
+import mmap
 import os
+import threading
 import time
+from collections.abc import Callable
 from datetime import datetime, timezone
+from pathlib import Path
+from typing import TypeVar
 
 import psutil
 
+from core.config import SETTINGS
+
+
+_T = TypeVar("_T")
+
 
 def _read_cpu_temp_c() -> float | None:
     try:
@@ -52,3 +65,221 @@ def system_pulse() -> dict:
         "load_avg": {"1m": load_1, "5m": load_5, "15m": load_15},
     }
 
+
+# Columns stored per sample in the ring (temp/load are NaN when unavailable).
+RING_FIELDS = (
+    "ts",
+    "cpu_percent",
+    "memory_percent",
+    "disk_percent",
+    "temp_c",
+    "load_1m",
+    "load_5m",
+    "load_15m",
+)
+
+
+def _nan_to_none(v: float) -> float | None:
+    return None if math.isnan(v) else v
+
+
+_HEADER_WORDS = 3  # int64: seq (odd while a write is in progress), head, count
+_READ_RETRIES = 100
+
+
+def _map_shared(path: Path, size: int) -> mmap.mmap:
+    # Whoever sees a missing/mis-sized file (first start, new history size)
+    # resets it; the flock keeps workers from doing that at the same time.
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        if os.fstat(fd).st_size != size:
+            os.ftruncate(fd, 0)
+            os.ftruncate(fd, size)
+        # mmap keeps a dup of fd, which would otherwise keep holding the lock.
+        ring = mmap.mmap(fd, size)
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        return ring
+    finally:
+        os.close(fd)
+
+
+class PulseRing:
+    """
+    Fixed-size ring of pulse samples, one preallocated column of doubles
+    per field.
+
+    With `path` the columns live in a memory-mapped file, so worker
+    processes share one ring: the leader's sampler writes, every worker
+    reads. Readers retry while the sequence word is odd or changed under
+    them instead of returning half a sample.
+    """
+
+    def __init__(self, capacity: int, path: Path | None = None) -> None:
+        self.capacity = max(1, capacity)
+        self.path = path
+        size = 8 * (_HEADER_WORDS + self.capacity * len(RING_FIELDS))
+        self._buf = bytearray(size) if path is None else _map_shared(path, size)
+        view = memoryview(self._buf)
+        self._hdr = view[: 8 * _HEADER_WORDS].cast("q")
+        data = view[8 * _HEADER_WORDS :].cast("d")
+        self._cols = {
+            f: data[k * self.capacity : (k + 1) * self.capacity] for k, f in enumerate(RING_FIELDS)
+        }
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._hdr[2]
+
+    def append(self, sample: dict[str, float | None]) -> None:
+        with self._lock:
+            # `| 1` also recovers from a writer that died mid-append.
+            seq = self._hdr[0] | 1
+            self._hdr[0] = seq
+            i = self._hdr[1]
+            for f in RING_FIELDS:
+                v = sample.get(f)
+                self._cols[f][i] = math.nan if v is None else float(v)
+            self._hdr[1] = (i + 1) % self.capacity
+            self._hdr[2] = min(self._hdr[2] + 1, self.capacity)
+            self._hdr[0] = seq + 1
+
+    def _read(self, fn: Callable[[int, int], _T]) -> _T:
+        # fn(head, count) copies what it needs; redo it if a write overlapped.
+        with self._lock:
+            for _ in range(_READ_RETRIES):
+                seq = self._hdr[0]
+                if seq % 2 == 0:
+                    out = fn(self._hdr[1], self._hdr[2])
+                    if self._hdr[0] == seq:
+                        return out
+                time.sleep(0)
+            return fn(self._hdr[1], self._hdr[2])
+
+    def latest(self) -> dict[str, float | None] | None:
+        def _latest(head: int, count: int) -> dict[str, float | None] | None:
+            if count == 0:
+                return None
+            i = (head - 1) % self.capacity
+            return {f: _nan_to_none(self._cols[f][i]) for f in RING_FIELDS}
+
+        return self._read(_latest)
+
+    def window(self, seconds: float, *, now: float | None = None) -> dict[str, list[float | None]]:
+        """Columnar samples newer than now - seconds, oldest first."""
+        cutoff = (time.time() if now is None else now) - seconds
+
+        def _window(head: int, count: int) -> dict[str, list[float | None]]:
+            start = (head - count) % self.capacity
+            idx = [(start + k) % self.capacity for k in range(count)]
+            ts = self._cols["ts"]
+            idx = [i for i in idx if ts[i] >= cutoff]
+            return {f: [_nan_to_none(self._cols[f][i]) for i in idx] for f in RING_FIELDS}
+
+        return self._read(_window)
+
+
+def _sample() -> dict[str, float | None]:
+    # Non-blocking: percent since the previous call (the sampler primes it).
+    load_1, load_5, load_15 = (None, None, None)
+    try:
+        load_1, load_5, load_15 = os.getloadavg()
+    except OSError:
+        pass
+    return {
+        "ts": time.time(),
+        "cpu_percent": psutil.cpu_percent(interval=None),
+        "memory_percent": psutil.virtual_memory().percent,
+        "disk_percent": psutil.disk_usage("/").percent,
+        "temp_c": _read_cpu_temp_c(),
+        "load_1m": load_1,
+        "load_5m": load_5,
+        "load_15m": load_15,
+    }
+
+
+class PulseSampler:
+    """
+    One background task samples the pulse every interval into a PulseRing;
+    request handlers only read the ring.
+    """
+
+    def __init__(self, interval_seconds: float, history_size: int, ring_path: Path | None = None) -> None:
+        self.interval_seconds = interval_seconds
+        self.ring = PulseRing(history_size, ring_path)
+        self._boot_time = psutil.boot_time()
+        self._listeners: list[Callable[[dict], None]] = []
+
+    def add_listener(self, fn: Callable[[dict], None]) -> None:
+        """Call fn(sample) from the sampler thread after each sample."""
+        self._listeners.append(fn)
+
+    def pulse_from(self, sample: dict[str, float | None]) -> dict:
+        return {
+            "cpu_percent": sample["cpu_percent"],
+            "memory_percent": sample["memory_percent"],
+            "disk_percent": sample["disk_percent"],
+            "temp_c": sample["temp_c"],
+            "uptime_seconds": int(max(0, time.time() - self._boot_time)),
+            "boot_time": datetime.fromtimestamp(self._boot_time, tz=timezone.utc).isoformat(),
+            "load_avg": {"1m": sample["load_1m"], "5m": sample["load_5m"], "15m": sample["load_15m"]},
+            "sampled_at": datetime.fromtimestamp(sample["ts"], tz=timezone.utc).isoformat(),
+        }
+
+    def latest(self) -> dict | None:
+        sample = self.ring.latest()
+        return None if sample is None else self.pulse_from(sample)
+
+    def _notify(self, sample: dict[str, float | None]) -> None:
+        for fn in self._listeners:
+            try:
+                fn(sample)
+            except Exception:
+                pass
+
+    def sample_once(self) -> None:
+        sample = _sample()
+        self.ring.append(sample)
+        self._notify(sample)
+
+    async def run(self) -> None:
+        psutil.cpu_percent(interval=None)
+        await asyncio.sleep(min(self.interval_seconds, 0.5))
+        while True:
+            try:
+                await asyncio.to_thread(self.sample_once)
+            except Exception:
+                pass
+            await asyncio.sleep(self.interval_seconds)
+
+    async def follow(self) -> None:
+        """
+        Non-leader workers: pass on the samples the leader writes into the
+        shared ring, so listeners here see them too.
+        """
+        last_ts = None
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            sample = self.ring.latest()
+            if sample is not None and sample["ts"] != last_ts:
+                last_ts = sample["ts"]
+                self._notify(sample)
+
+
+# With several workers the ring is a shared file; one process samples.
+SAMPLER = PulseSampler(
+    SETTINGS.pulse_interval_seconds,
+    SETTINGS.pulse_history_size,
+    SETTINGS.data_dir / "pulse.ring" if SETTINGS.workers > 1 else None,
+)
+
+
+def current_pulse() -> dict:
+    """
+    Latest sampled pulse; falls back to a blocking read before the first sample.
+    """
+    pulse = SAMPLER.latest()
+    if pulse is None:
+        return system_pulse()
+    return pulse
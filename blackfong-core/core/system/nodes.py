@@ -1,12 +1,38 @@
 from __future__ import annotations
 
+import asyncio
 import json
-from datetime import datetime, timezone
+import threading
+from datetime import datetime, timedelta, timezone
 
-from sqlalchemy import select
+from sqlalchemy import bindparam, func, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from core.config import SETTINGS
+from core.db.database import ENGINE
 from core.db.models import Node
+from core.system.events import EVENTS, build_event
+from core.system.realtime import HUB
+from core.system.registry import REGISTRY, NodeRecord
+from core.system.telemetry import TELEMETRY, parse_load
+
+
+_nodes_t = Node.__table__
+
+# One statement, executemany'd per flush. NULL payload fields keep the stored value.
+_FLUSH_STMT = (
+    update(_nodes_t)
+    .where(_nodes_t.c.id == bindparam("b_id"))
+    .values(
+        last_seen=bindparam("b_last_seen", type_=_nodes_t.c.last_seen.type),
+        version=func.coalesce(bindparam("b_version"), _nodes_t.c.version),
+        load=func.coalesce(bindparam("b_load"), _nodes_t.c.load),
+        load_value=func.coalesce(bindparam("b_load_value"), _nodes_t.c.load_value),
+        status_flags=func.coalesce(bindparam("b_status_flags"), _nodes_t.c.status_flags),
+    )
+)
 
 
 def _to_text(value) -> str | None:
@@ -20,6 +46,146 @@ def _to_text(value) -> str | None:
         return str(value)
 
 
+class HeartbeatBuffer:
+    """
+    Absorb heartbeats in memory and write them to `nodes` in batches.
+
+    Per node only the latest heartbeat survives until the next flush, so a
+    node beating faster than the flush interval costs one row update.
+    Heartbeat events are handed to the event pipeline as one batch. Node
+    state is read and updated in REGISTRY; the DB sees only the flush.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pending: dict[int, dict] = {}  # id -> flush params
+        self._events: list[dict] = []
+
+    @staticmethod
+    def _missing(beats: list[dict]) -> list[int]:
+        # Only another worker can have registered a node this registry lacks.
+        if SETTINGS.workers == 1:
+            return []
+        return sorted({b["node_id"] for b in beats if REGISTRY.get(b["node_id"]) is None})
+
+    def submit(self, db: Session, beats: list[dict], *, requester: str) -> tuple[list[dict], list[int]]:
+        """
+        Queue heartbeats ({node_id, version, load, status_flags}).
+
+        Returns (updated node snapshots, unknown node ids).
+        """
+        REGISTRY.ensure_loaded(db)
+        missing = self._missing(beats)
+        if missing:
+            REGISTRY.fetch(db, ids=missing)
+        result = self._apply(beats, requester)
+        if SETTINGS.heartbeat_flush_ms == 0:
+            self.flush()
+        return result
+
+    async def submit_async(
+        self, db: AsyncSession, beats: list[dict], *, requester: str
+    ) -> tuple[list[dict], list[int]]:
+        """submit() for async handlers; a write-through flush runs in a thread."""
+        if not REGISTRY.loaded:
+            await db.run_sync(REGISTRY.ensure_loaded)
+        missing = self._missing(beats)
+        if missing:
+            await db.run_sync(lambda s: REGISTRY.fetch(s, ids=missing))
+        result = self._apply(beats, requester)
+        if SETTINGS.heartbeat_flush_ms == 0:
+            await asyncio.to_thread(self.flush)
+        return result
+
+    def _apply(self, beats: list[dict], requester: str) -> tuple[list[dict], list[int]]:
+        now = datetime.now(tz=timezone.utc)
+        accepted: list[dict] = []
+        unknown: list[int] = []
+        events: list[dict] = []
+        rows: list[dict] = []
+        for b in beats:
+            node_id = b["node_id"]
+            load = b.get("load")
+            load_value = parse_load(load)
+            status_flags = _to_text(b.get("status_flags"))
+            applied = REGISTRY.beat(
+                node_id,
+                now,
+                version=b.get("version"),
+                load=load,
+                load_value=load_value,
+                status_flags=status_flags,
+            )
+            if applied is None:
+                unknown.append(node_id)
+                continue
+            snap, flags_changed = applied
+            TELEMETRY.record(node_id, now, load_value, status_flags, flags_changed=flags_changed)
+            rows.append(
+                {
+                    "b_id": node_id,
+                    "b_last_seen": now,
+                    "b_version": b.get("version"),
+                    "b_load": load,
+                    "b_load_value": load_value,
+                    "b_status_flags": status_flags,
+                }
+            )
+            events.append(
+                build_event(
+                    f"node heartbeat: {snap['name']} ({snap['ip']}) by {requester}",
+                    event_type="node.heartbeat",
+                    source="node",
+                    severity="info",
+                    at=now,
+                )
+            )
+            # "kind" is for push clients; NodeOut ignores it.
+            accepted.append({**snap, "kind": "heartbeat"})
+
+        with self._lock:
+            for row in rows:
+                pending = self._pending.get(row["b_id"])
+                if pending is None:
+                    self._pending[row["b_id"]] = row
+                    continue
+                # Coalesce: newest non-NULL value per field.
+                for k, v in row.items():
+                    if v is not None:
+                        pending[k] = v
+            self._events.extend(events)
+        HUB.publish("nodes", accepted)
+        return accepted, unknown
+
+    def flush(self) -> int:
+        """Write pending heartbeats in one transaction. Returns rows updated."""
+        with self._lock:
+            if not self._pending and not self._events:
+                return 0
+            rows = list(self._pending.values())
+            events = self._events
+            self._pending = {}
+            self._events = []
+
+        try:
+            if rows:
+                with ENGINE.begin() as conn:
+                    conn.execute(_FLUSH_STMT, rows)
+        except Exception:
+            # Put the batch back unless a newer heartbeat already replaced it.
+            with self._lock:
+                for r in rows:
+                    self._pending.setdefault(r["b_id"], r)
+                self._events[:0] = events
+            raise
+
+        EVENTS.submit(events)
+        return len(rows)
+
+
+HEARTBEATS = HeartbeatBuffer()
+
+
 def upsert_node(
     db: Session,
     *,
@@ -27,46 +193,176 @@ def upsert_node(
     ip: str,
     public_key: str | None = None,
     capabilities=None,
-) -> Node:
+) -> NodeRecord:
+    """Register by name: a REGISTRY lookup, then one INSERT or UPDATE."""
+    REGISTRY.ensure_loaded(db)
     now = datetime.now(tz=timezone.utc)
-    existing = db.execute(select(Node).where(Node.name == name)).scalar_one_or_none()
+    existing = REGISTRY.by_name(name)
+    if existing is None and SETTINGS.workers > 1:
+        existing = next(iter(REGISTRY.fetch(db, name=name)), None)
     if existing is None:
         node = Node(name=name, ip=ip, last_seen=now)
         node.public_key = public_key
         node.capabilities = _to_text(capabilities)
         db.add(node)
-        db.commit()
-        db.refresh(node)
-        return node
+        try:
+            db.commit()
+        except IntegrityError:
+            # Lost a race with a concurrent register of the same name (ux_nodes_name).
+            db.rollback()
+            existing = REGISTRY.fetch(db, name=name)[0]
+        else:
+            db.refresh(node)
+            rec = REGISTRY.put(node)
+            HUB.publish("nodes", [{**rec.as_dict(), "kind": "register"}])
+            return rec
 
-    existing.ip = ip
-    existing.last_seen = now
+    values = {"ip": ip}
     if public_key is not None:
-        existing.public_key = public_key
+        values["public_key"] = public_key
     if capabilities is not None:
-        existing.capabilities = _to_text(capabilities)
+        values["capabilities"] = _to_text(capabilities)
+    db.execute(update(_nodes_t).where(_nodes_t.c.id == existing.id).values(last_seen=now, **values))
     db.commit()
-    db.refresh(existing)
-    return existing
+    # last_seen goes only through beat()'s `at`, which never moves it backwards.
+    snap, _ = REGISTRY.beat(existing.id, now, **values)
+    HUB.publish("nodes", [{**snap, "kind": "register"}])
+    return REGISTRY.get(existing.id)
 
 
-def heartbeat(db: Session, *, node_id: int, version: str | None, load: str | None, status_flags=None) -> Node | None:
-    node = db.get(Node, node_id)
-    if node is None:
-        return None
-    node.last_seen = datetime.now(tz=timezone.utc)
-    if version is not None:
-        node.version = version
-    if load is not None:
-        node.load = load
-    if status_flags is not None:
-        node.status_flags = _to_text(status_flags)
-    db.commit()
-    db.refresh(node)
-    return node
+def heartbeat(
+    db: Session,
+    *,
+    node_id: int,
+    version: str | None,
+    load: str | None,
+    status_flags=None,
+    requester: str = "unknown",
+) -> dict | None:
+    accepted, _ = HEARTBEATS.submit(
+        db,
+        [{"node_id": node_id, "version": version, "load": load, "status_flags": status_flags}],
+        requester=requester,
+    )
+    return accepted[0] if accepted else None
+
+
+def heartbeat_many(db: Session, beats: list[dict], *, requester: str = "unknown") -> tuple[list[dict], list[int]]:
+    return HEARTBEATS.submit(db, beats, requester=requester)
+
 
+def stale_cutoff(now: datetime | None = None) -> datetime:
+    now = now or datetime.now(tz=timezone.utc)
+    return now - timedelta(seconds=SETTINGS.node_stale_seconds)
 
-def list_nodes(db: Session, limit: int = 200) -> list[Node]:
-    q = select(Node).order_by(Node.last_seen.desc()).limit(limit)
+
+def fleet_counts(db: Session, *, now: datetime | None = None) -> tuple[int, int]:
+    """(alive, stale) from REGISTRY: O(1) once it is loaded."""
+    REGISTRY.ensure_loaded(db)
+    return REGISTRY.counts(now.timestamp() if now is not None else None)
+
+
+def fleet_summary(db: Session, *, top: int = 20) -> dict:
+    alive, stale = fleet_counts(db)
+    count = func.count().label("n")
+    versions = db.execute(
+        select(Node.version, count).group_by(Node.version).order_by(count.desc()).limit(top)
+    ).all()
+    flags = db.execute(
+        select(Node.status_flags, count).group_by(Node.status_flags).order_by(count.desc()).limit(top)
+    ).all()
+    return {
+        "total": alive + stale,
+        "alive": alive,
+        "stale": stale,
+        "stale_after_seconds": SETTINGS.node_stale_seconds,
+        "went_stale_last_minute": REGISTRY.transitions(60, kind="stale"),
+        "versions": [{"version": v, "count": n} for v, n in versions],
+        "status_flags": [{"status_flags": f, "count": n} for f, n in flags],
+    }
+
+
+def _utc_naive(at: datetime) -> datetime:
+    # last_seen is stored as naive UTC; compare like with like.
+    return at.astimezone(timezone.utc).replace(tzinfo=None) if at.tzinfo is not None else at
+
+
+def node_cursor(node) -> str:
+    """Page token for list_nodes: the (last_seen, id) the next page starts below."""
+    return f"{_utc_naive(node.last_seen).isoformat()},{node.id}"
+
+
+def parse_node_cursor(token: str) -> tuple[datetime, int]:
+    """Inverse of node_cursor(); ValueError for anything else."""
+    at, sep, node_id = token.rpartition(",")
+    if not sep:
+        raise ValueError(f"Bad node cursor: {token!r}")
+    return _utc_naive(datetime.fromisoformat(at)), int(node_id)
+
+
+def list_nodes(
+    db: Session,
+    limit: int = 200,
+    *,
+    before: tuple[datetime, int] | None = None,
+    stale: bool | None = None,
+    version: str | None = None,
+    name_prefix: str | None = None,
+) -> list[Node]:
+    """
+    Most recently seen first; keyset-paged over (last_seen, id). The cursor
+    carries both, so heartbeats moving a node between requests don't
+    restart or skip the listing.
+    """
+    q = select(Node)
+    if stale is not None:
+        cutoff = stale_cutoff()
+        q = q.where(Node.last_seen < cutoff if stale else Node.last_seen >= cutoff)
+    if version is not None:
+        q = q.where(Node.version == version)
+    if name_prefix:
+        # Range form so ux_nodes_name can serve it (LIKE can't, case-insensitive).
+        q = q.where(Node.name >= name_prefix, Node.name < name_prefix + "\uffff")
+    if before is not None:
+        q = q.where(tuple_(Node.last_seen, Node.id) < tuple_(*before))
+    q = q.order_by(Node.last_seen.desc(), Node.id.desc()).limit(limit)
     return list(db.execute(q).scalars().all())
 
+
+# Async variants for async route handlers. Queries are shared with the sync
+# functions above and run on the AsyncSession's aiosqlite connection.
+
+
+async def upsert_node_async(db: AsyncSession, **fields) -> NodeRecord:
+    return await db.run_sync(lambda s: upsert_node(s, **fields))
+
+
+async def heartbeat_async(
+    db: AsyncSession,
+    *,
+    node_id: int,
+    version: str | None,
+    load: str | None,
+    status_flags=None,
+    requester: str = "unknown",
+) -> dict | None:
+    accepted, _ = await HEARTBEATS.submit_async(
+        db,
+        [{"node_id": node_id, "version": version, "load": load, "status_flags": status_flags}],
+        requester=requester,
+    )
+    return accepted[0] if accepted else None
+
+
+async def heartbeat_many_async(
+    db: AsyncSession, beats: list[dict], *, requester: str = "unknown"
+) -> tuple[list[dict], list[int]]:
+    return await HEARTBEATS.submit_async(db, beats, requester=requester)
+
+
+async def fleet_summary_async(db: AsyncSession, *, top: int = 20) -> dict:
+    return await db.run_sync(lambda s: fleet_summary(s, top=top))
+
+
+async def list_nodes_async(db: AsyncSession, limit: int = 200, **filters) -> list[Node]:
+    return await db.run_sync(lambda s: list_nodes(s, limit, **filters))
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from core.config import SETTINGS
+
+
+# Log-bucketed latency histogram: 8 buckets per power of two of
+# microseconds, i.e. every quantile is within ~6% of the true value.
+_SUB_BUCKETS = 8
+_QUANTILES = (0.5, 0.95, 0.99)
+
+_HELP = {
+    "http_request": "HTTP request latency (to response headers)",
+    "db_session": "Lifetime of request DB sessions (get_db)",
+    "subprocess": "Subprocess run time (commands, systemctl)",
+    "events": "Event log writes",
+}
+
+
+class Histogram:
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self) -> None:
+        self.buckets: dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        us = seconds * 1e6
+        if us < 1.0:
+            idx = 0
+        else:
+            m, e = math.frexp(us)  # us = m * 2**e, 0.5 <= m < 1
+            idx = e * _SUB_BUCKETS + int((m - 0.5) * 2 * _SUB_BUCKETS)
+        self.buckets[idx] = self.buckets.get(idx, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @staticmethod
+    def _upper(idx: int) -> float:
+        """Upper bound of a bucket, in seconds."""
+        if idx == 0:
+            return 1e-6
+        e, k = divmod(idx, _SUB_BUCKETS)
+        return (0.5 + (k + 1) / (2 * _SUB_BUCKETS)) * 2.0**e / 1e6
+
+    def quantiles(self, qs=_QUANTILES) -> list[float]:
+        if not self.count:
+            return [0.0 for _ in qs]
+        out = []
+        ordered = sorted(self.buckets.items())
+        for q in qs:
+            rank = max(1, math.ceil(q * self.count))
+            seen = 0
+            for idx, n in ordered:
+                seen += n
+                if seen >= rank:
+                    out.append(min(self._upper(idx), self.max))
+                    break
+        return out
+
+
+class PerfRegistry:
+    """
+    Timers keyed by (metric, labels). Observing is a dict lookup and a few
+    adds under a lock; percentiles are only computed when someone reads them.
+    """
+
+    def __init__(self, recent_size: int) -> None:
+        self._lock = threading.Lock()
+        self._timers: dict[tuple[str, tuple], Histogram] = {}
+        self._statuses: dict[tuple[str, str, int], int] = {}
+        self._recent: deque[tuple] = deque(maxlen=max(1, recent_size))
+        self.started_at = datetime.now(tz=timezone.utc)
+
+    def observe(self, metric: str, labels: tuple, seconds: float) -> None:
+        key = (metric, labels)
+        with self._lock:
+            h = self._timers.get(key)
+            if h is None:
+                h = self._timers[key] = Histogram()
+            h.observe(seconds)
+
+    def timed(self, metric: str, labels: tuple) -> "_Timer":
+        return _Timer(self, metric, labels)
+
+    def observe_request(self, method: str, route: str, path: str, status: int, seconds: float) -> None:
+        labels = (("method", method), ("route", route))
+        with self._lock:
+            key = ("http_request", labels)
+            h = self._timers.get(key)
+            if h is None:
+                h = self._timers[key] = Histogram()
+            h.observe(seconds)
+            skey = (method, route, status)
+            self._statuses[skey] = self._statuses.get(skey, 0) + 1
+            self._recent.append((seconds, time.time(), method, path, status))
+
+    def _copy(self) -> tuple[dict, dict, list]:
+        with self._lock:
+            timers = {}
+            for key, h in self._timers.items():
+                c = Histogram()
+                c.buckets = dict(h.buckets)
+                c.count, c.total, c.max = h.count, h.total, h.max
+                timers[key] = c
+            return timers, dict(self._statuses), list(self._recent)
+
+    def snapshot(self, *, slowest: int = 10) -> dict:
+        timers, statuses, recent = self._copy()
+        out: dict = {"since": self.started_at.isoformat(), "timers": {}}
+        for (metric, labels), h in sorted(timers.items()):
+            p50, p95, p99 = h.quantiles()
+            out["timers"].setdefault(metric, []).append(
+                {
+                    **dict(labels),
+                    "count": h.count,
+                    "mean_ms": round(h.total / h.count * 1000, 3),
+                    "p50_ms": round(p50 * 1000, 3),
+                    "p95_ms": round(p95 * 1000, 3),
+                    "p99_ms": round(p99 * 1000, 3),
+                    "max_ms": round(h.max * 1000, 3),
+                }
+            )
+        out["statuses"] = [
+            {"method": m, "route": r, "status": s, "count": n} for (m, r, s), n in sorted(statuses.items())
+        ]
+        recent.sort(reverse=True)
+        out["slowest_recent"] = [
+            {
+                "ms": round(sec * 1000, 3),
+                "at": datetime.fromtimestamp(at, tz=timezone.utc).isoformat(),
+                "method": method,
+                "path": path,
+                "status": status,
+            }
+            for sec, at, method, path, status in recent[:slowest]
+        ]
+        return out
+
+    def prometheus(self) -> str:
+        timers, statuses, _ = self._copy()
+        lines: list[str] = []
+        by_metric: dict[str, list] = {}
+        for (metric, labels), h in sorted(timers.items()):
+            by_metric.setdefault(metric, []).append((labels, h))
+        for metric, series in by_metric.items():
+            name = f"blackfong_{metric}_seconds"
+            lines.append(f"# HELP {name} {_HELP.get(metric, metric)}")
+            lines.append(f"# TYPE {name} summary")
+            for labels, h in series:
+                for q, v in zip(_QUANTILES, h.quantiles()):
+                    lines.append(f"{name}{_labels(labels + (('quantile', str(q)),))} {v:.6g}")
+                lines.append(f"{name}_sum{_labels(labels)} {h.total:.6g}")
+                lines.append(f"{name}_count{_labels(labels)} {h.count}")
+        if statuses:
+            name = "blackfong_http_requests_total"
+            lines.append(f"# HELP {name} HTTP requests by route and status")
+            lines.append(f"# TYPE {name} counter")
+            for (method, route, status), n in sorted(statuses.items()):
+                labels = (("method", method), ("route", route), ("status", str(status)))
+                lines.append(f"{name}{_labels(labels)} {n}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    parts = ",".join(
+        f'{k}="{v.replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in labels
+    )
+    return "{" + parts + "}"
+
+
+class _Timer:
+    __slots__ = ("_reg", "_metric", "_labels", "_t0")
+
+    def __init__(self, reg: PerfRegistry, metric: str, labels: tuple) -> None:
+        self._reg = reg
+        self._metric = metric
+        self._labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._reg.observe(self._metric, self._labels, time.perf_counter() - self._t0)
+
+
+class TimingMiddleware:
+    """
+    Plain ASGI middleware (no BaseHTTPMiddleware: it would buffer streams).
+    Latency is measured to the response start, so SSE streams count their
+    time to first byte, not their lifetime. Routes are labelled by their
+    template ("/api/nodes/{node_id}"), not the raw path.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        t0 = time.perf_counter()
+        recorded = False
+
+        def _record(status: int) -> None:
+            route = scope.get("route")
+            PERF.observe_request(
+                scope["method"],
+                getattr(route, "path", None) or "<unmatched>",
+                scope["path"],
+                status,
+                time.perf_counter() - t0,
+            )
+
+        async def _send(message) -> None:
+            nonlocal recorded
+            if message["type"] == "http.response.start" and not recorded:
+                recorded = True
+                _record(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            if not recorded:
+                _record(500)
+
+
+PERF = PerfRegistry(SETTINGS.perf_recent_requests)
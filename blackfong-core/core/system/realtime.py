@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import asyncio
+import secrets
+import threading
+from collections import deque
+from collections.abc import Callable
+
+from core.config import SETTINGS
+
+
+TOPICS = ("events", "nodes", "commands", "pulse")
+
+
+class Subscription:
+    __slots__ = ("queue", "topics", "match", "lagged")
+
+    def __init__(self, topics: set[str], match: Callable[[dict], bool] | None, maxsize: int) -> None:
+        self.queue: asyncio.Queue[dict | None] = asyncio.Queue(maxsize=maxsize)
+        self.topics = topics
+        self.match = match
+        self.lagged = False
+
+    def wants(self, msg: dict) -> bool:
+        return msg["topic"] in self.topics and (self.match is None or self.match(msg))
+
+    def _end(self) -> None:
+        # Make room for the end marker even if the reader fell behind.
+        while self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class RealtimeHub:
+    """
+    In-process pub/sub for push clients (SSE/WebSocket).
+
+    publish() is thread-safe and cheap when nobody listens: a sequence
+    number and a ring append. Fan-out runs on the event loop; a subscriber
+    whose queue fills up is dropped with `lagged` and resumes from the ring
+    (by message id) when it reconnects.
+    """
+
+    def __init__(self, buffer_size: int, queue_size: int) -> None:
+        self.queue_size = max(1, queue_size)
+        self._lock = threading.Lock()
+        # Ids start at a random per-process base (below 2**52, exact in JS), so
+        # an id from another worker or a previous process is never mistaken
+        # for one of ours: it falls outside [oldest, last_id] and gets `reset`.
+        self._seq = (secrets.randbelow((1 << 20) - 1) + 1) << 32
+        self._ring: deque[dict] = deque(maxlen=max(1, buffer_size))
+        self._subs: set[Subscription] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop | None) -> None:
+        self._loop = loop
+
+    @property
+    def last_id(self) -> int:
+        return self._seq
+
+    def publish(self, topic: str, payloads: list[dict]) -> None:
+        if not payloads:
+            return
+        with self._lock:
+            msgs = []
+            for data in payloads:
+                self._seq += 1
+                msg = {"id": self._seq, "topic": topic, "data": data}
+                self._ring.append(msg)
+                msgs.append(msg)
+            loop = self._loop if self._subs else None
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._fanout(msgs)
+        else:
+            loop.call_soon_threadsafe(self._fanout, msgs)
+
+    def _fanout(self, msgs: list[dict]) -> None:
+        for sub in list(self._subs):
+            for msg in msgs:
+                if not sub.wants(msg):
+                    continue
+                try:
+                    sub.queue.put_nowait(msg)
+                except asyncio.QueueFull:
+                    sub.lagged = True
+                    self.unsubscribe(sub)
+                    sub._end()
+                    break
+
+    def subscribe(
+        self, topics: set[str], match: Callable[[dict], bool] | None = None, *, after_id: int | None = None
+    ) -> tuple[Subscription, list[dict] | None]:
+        """
+        Register on the loop thread. With after_id, also returns the buffered
+        messages after it, or None if the ring no longer reaches back that far.
+        """
+        sub = Subscription(topics, match, self.queue_size)
+        with self._lock:
+            self._subs.add(sub)
+            replay: list[dict] | None = None
+            if after_id is not None:
+                oldest = self._ring[0]["id"] if self._ring else self._seq + 1
+                if after_id > self._seq or after_id + 1 < oldest:
+                    replay = None  # unknown id (older than the ring, or another process)
+                else:
+                    replay = [m for m in self._ring if m["id"] > after_id and sub.wants(m)]
+        return sub, replay
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self._subs.discard(sub)
+
+
+HUB = RealtimeHub(SETTINGS.realtime_buffer_size, SETTINGS.realtime_queue_size)
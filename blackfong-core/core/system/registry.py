@@ -0,0 +1,324 @@
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from core.config import SETTINGS
+from core.db.models import Node
+
+
+NODE_FIELDS = (
+    "id",
+    "name",
+    "ip",
+    "last_seen",
+    "public_key",
+    "capabilities",
+    "last_command",
+    "version",
+    "load",
+    "status_flags",
+    "load_value",
+)
+
+# Stale/recovered transitions kept for "went stale in the last N seconds".
+_TRANSITIONS_KEPT = 10000
+
+
+def _utc(at: datetime) -> datetime:
+    # SQLite hands back naive datetimes; they are stored in UTC.
+    return at.replace(tzinfo=timezone.utc) if at.tzinfo is None else at
+
+
+class NodeRecord:
+    """One node as the registry holds it (NodeOut-shaped, plus staleness)."""
+
+    __slots__ = (*NODE_FIELDS, "seen_ts", "stale")
+
+    def __init__(self, node: Node) -> None:
+        for f in NODE_FIELDS:
+            setattr(self, f, getattr(node, f))
+        self.last_seen = _utc(node.last_seen)
+        self.seen_ts = self.last_seen.timestamp()
+        self.stale = False
+
+    def as_dict(self) -> dict:
+        return {f: getattr(self, f) for f in NODE_FIELDS}
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel: one slot per tick, keys filed under the tick their
+    deadline falls in. Re-scheduling is O(1) (move between slot sets) and
+    advancing visits only the slots that came due, so a tick costs the
+    number of keys expiring in it, not the number scheduled.
+    """
+
+    def __init__(self, tick_seconds: float, horizon_seconds: float) -> None:
+        self.tick_seconds = tick_seconds
+        # Wider than the longest deadline, so a slot never holds a later lap.
+        size = 1 << max(4, math.ceil(math.log2(horizon_seconds / tick_seconds + 2)))
+        self._slots: list[set[int]] = [set() for _ in range(size)]
+        self._due: dict[int, int] = {}  # key -> absolute tick
+        self._cursor = math.floor(time.time() / tick_seconds)  # last tick advanced through
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def schedule(self, key: int, deadline: float) -> None:
+        tick = max(math.ceil(deadline / self.tick_seconds), self._cursor + 1)
+        old = self._due.get(key)
+        if old == tick:
+            return
+        if old is not None:
+            self._slots[old % len(self._slots)].discard(key)
+        self._due[key] = tick
+        self._slots[tick % len(self._slots)].add(key)
+
+    def cancel(self, key: int) -> None:
+        old = self._due.pop(key, None)
+        if old is not None:
+            self._slots[old % len(self._slots)].discard(key)
+
+    def clear(self) -> None:
+        for slot in self._slots:
+            slot.clear()
+        self._due.clear()
+
+    def advance(self, now: float) -> list[int]:
+        """Pop every key whose deadline is <= now."""
+        target = math.floor(now / self.tick_seconds)
+        if target <= self._cursor:
+            return []
+        n = len(self._slots)
+        # After a long pause every slot is due once; never walk a slot twice.
+        ticks = range(self._cursor + 1, target + 1) if target - self._cursor < n else range(n)
+        fired: list[int] = []
+        for t in ticks:
+            slot = self._slots[t % n]
+            if not slot:
+                continue
+            due = [k for k in slot if self._due[k] <= target]
+            for k in due:
+                slot.discard(k)
+                del self._due[k]
+            fired.extend(due)
+        self._cursor = target
+        return fired
+
+
+class FleetRegistry:
+    """
+    Every node in memory, loaded once and kept current by register/heartbeat
+    (which still write through to SQLite). Lookups by id and name are dict
+    hits.
+
+    Staleness: each alive node sits in a timer wheel at its expected
+    heartbeat deadline (last_seen + node_stale_seconds); a heartbeat moves
+    it in O(1). Advancing the wheel only touches nodes that just missed
+    their deadline, so the cost follows transitions, not fleet size, and
+    alive/stale counts are kept as running totals.
+    """
+
+    def __init__(self, stale_seconds: int) -> None:
+        self.stale_seconds = stale_seconds
+        self._lock = threading.Lock()
+        self._by_id: dict[int, NodeRecord] = {}
+        self._by_name: dict[str, NodeRecord] = {}
+        self._wheel = TimerWheel(1.0, stale_seconds)
+        self._stale_count = 0
+        # (seq, at, kind, node_id, silent_seconds), oldest first.
+        self._transitions: deque[tuple[int, float, str, int, float]] = deque(maxlen=_TRANSITIONS_KEPT)
+        self._seq = 0
+        self._synced_at: datetime | None = None
+        self.loaded = False
+
+    def load(self, db: Session) -> int:
+        """(Re)build from the nodes table: the one full read."""
+        rows = db.execute(select(Node)).scalars().all()
+        with self._lock:
+            self._by_id = {}
+            self._by_name = {}
+            self._wheel.clear()
+            self._stale_count = 0
+            self._transitions.clear()
+            now = time.time()
+            for node in rows:
+                rec = NodeRecord(node)
+                self._add(rec)
+                # Already stale when loaded: marked here, not as a transition.
+                # (The wheel can't fire deadlines in its first second.)
+                if rec.seen_ts + self.stale_seconds <= now:
+                    rec.stale = True
+                    self._stale_count += 1
+                    self._wheel.cancel(rec.id)
+            self._synced_at = datetime.now(tz=timezone.utc)
+            self.loaded = True
+        return len(rows)
+
+    def ensure_loaded(self, db: Session) -> None:
+        if not self.loaded:
+            self.load(db)
+
+    def _add(self, rec: NodeRecord) -> None:
+        old = self._by_id.get(rec.id)
+        if old is not None and old.stale:
+            self._stale_count -= 1
+        self._by_id[rec.id] = rec
+        self._by_name[rec.name] = rec
+        self._wheel.schedule(rec.id, rec.seen_ts + self.stale_seconds)
+
+    def get(self, node_id: int) -> NodeRecord | None:
+        return self._by_id.get(node_id)
+
+    def by_name(self, name: str) -> NodeRecord | None:
+        return self._by_name.get(name)
+
+    def records(self) -> list[NodeRecord]:
+        with self._lock:
+            return list(self._by_id.values())
+
+    def put(self, node: Node) -> NodeRecord:
+        """Add or replace a record from a freshly written row (register)."""
+        rec = NodeRecord(node)
+        with self._lock:
+            self._add(rec)
+        return rec
+
+    def fetch(self, db: Session, *, ids: list[int] | None = None, name: str | None = None) -> list[NodeRecord]:
+        """Read rows written by another worker into the registry."""
+        q = select(Node)
+        q = q.where(Node.id.in_(ids)) if ids is not None else q.where(Node.name == name)
+        return [self.put(n) for n in db.execute(q).scalars().all()]
+
+    def _record(self, at: float, kind: str, node_id: int, silent: float) -> None:
+        self._seq += 1
+        self._transitions.append((self._seq, at, kind, node_id, silent))
+
+    def _seen(self, rec: NodeRecord, at: datetime) -> None:
+        # Caller holds the lock. last_seen never moves backwards.
+        ts = at.timestamp()
+        if ts <= rec.seen_ts:
+            return
+        if rec.stale:
+            rec.stale = False
+            self._stale_count -= 1
+            self._record(ts, "recovered", rec.id, ts - rec.seen_ts)
+        rec.last_seen = at
+        rec.seen_ts = ts
+        self._wheel.schedule(rec.id, ts + self.stale_seconds)
+
+    def beat(self, node_id: int, at: datetime, **fields) -> tuple[dict, bool] | None:
+        """
+        Apply a heartbeat (None fields keep their value).
+        Returns (snapshot, status_flags changed), or None for an unknown node.
+        """
+        with self._lock:
+            rec = self._by_id.get(node_id)
+            if rec is None:
+                return None
+            flags = fields.get("status_flags")
+            changed = flags is not None and flags != rec.status_flags
+            for k, v in fields.items():
+                if v is not None:
+                    setattr(rec, k, v)
+            self._seen(rec, at)
+            return rec.as_dict(), changed
+
+    def note(self, node_id: int, **fields) -> None:
+        """Fields written elsewhere (e.g. last_command); no staleness change."""
+        with self._lock:
+            rec = self._by_id.get(node_id)
+            if rec is not None:
+                for k, v in fields.items():
+                    setattr(rec, k, v)
+
+    def advance(self, now: float | None = None) -> int:
+        """Mark nodes that missed their deadline as stale; returns how many."""
+        now = now if now is not None else time.time()
+        marked = 0
+        with self._lock:
+            for node_id in self._wheel.advance(now):
+                rec = self._by_id.get(node_id)
+                if rec is None or rec.stale:
+                    continue
+                rec.stale = True
+                self._stale_count += 1
+                marked += 1
+                self._record(rec.seen_ts + self.stale_seconds, "stale", node_id, now - rec.seen_ts)
+        return marked
+
+    @property
+    def stale_count(self) -> int:
+        """Running total as of the last advance()."""
+        return self._stale_count
+
+    def counts(self, now: float | None = None) -> tuple[int, int]:
+        """(alive, stale)."""
+        self.advance(now)
+        with self._lock:
+            return len(self._by_id) - self._stale_count, self._stale_count
+
+    def transitions(self, within_seconds: float, *, kind: str | None = None) -> list[dict]:
+        """Stale/recovered transitions in the last within_seconds, newest first."""
+        now = time.time()
+        self.advance(now)
+        since = now - within_seconds
+        out = []
+        with self._lock:
+            for _, at, k, node_id, _ in reversed(self._transitions):
+                if at < since:
+                    break
+                rec = self._by_id.get(node_id)
+                if (kind is None or k == kind) and rec is not None:
+                    at_dt = datetime.fromtimestamp(at, tz=timezone.utc)
+                    out.append({"id": node_id, "name": rec.name, "kind": k, "at": at_dt})
+        return out
+
+    def transitions_after(self, seq: int) -> tuple[int, list[dict]]:
+        """Transitions recorded after seq, oldest first, and the latest seq."""
+        with self._lock:
+            out = []
+            for s, at, k, node_id, silent in reversed(self._transitions):
+                if s <= seq:
+                    break
+                rec = self._by_id.get(node_id)
+                if rec is not None:
+                    out.append(
+                        {"id": node_id, "name": rec.name, "ip": rec.ip, "kind": k, "at": at, "silent": silent}
+                    )
+            out.reverse()
+            return self._seq, out
+
+    def sync(self, db: Session) -> int:
+        """
+        With several workers: pull rows other workers wrote since the last
+        sync (over ix_nodes_last_seen, so only recently seen nodes are read).
+        """
+        # Overlap by the heartbeat flush delay: rows can land with an older last_seen.
+        started = datetime.now(tz=timezone.utc)
+        since = (self._synced_at or started) - timedelta(milliseconds=SETTINGS.heartbeat_flush_ms + 2000)
+        rows = db.execute(select(Node).where(Node.last_seen >= since)).scalars().all()
+        with self._lock:
+            for node in rows:
+                rec = self._by_id.get(node.id)
+                if rec is None:
+                    self._add(NodeRecord(node))
+                    continue
+                seen = _utc(node.last_seen)
+                if seen.timestamp() > rec.seen_ts:
+                    for f in NODE_FIELDS:
+                        if f != "last_seen":
+                            setattr(rec, f, getattr(node, f))
+                    self._seen(rec, seen)
+            self._synced_at = started
+        return len(rows)
+
+
+REGISTRY = FleetRegistry(SETTINGS.node_stale_seconds)
@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, exists, func, select, tuple_
+
+from core.config import SETTINGS
+from core.db.database import ENGINE
+from core.db.models import (
+    CommandOutput,
+    CommandRun,
+    EventLog,
+    FleetDispatch,
+    HealthChange,
+    NodeFlagChange,
+    NodeJob,
+    NodeLoadBlock,
+)
+from core.system.events import log_event
+
+
+# Between delete batches, so writers waiting on the lock get a turn.
+_BATCH_PAUSE_SECONDS = 0.05
+# Freed pages returned to the filesystem per run (incremental vacuum).
+_VACUUM_PAGES = 4096
+
+_events = EventLog.__table__
+_runs = CommandRun.__table__
+_output = CommandOutput.__table__
+_jobs = NodeJob.__table__
+_dispatches = FleetDispatch.__table__
+_load_blocks = NodeLoadBlock.__table__
+_flag_changes = NodeFlagChange.__table__
+_health_changes = HealthChange.__table__
+
+
+def _archive_events(rows) -> None:
+    """Append rows to per-day gzip JSONL files (gzip members concatenate)."""
+    by_day: dict[str, list[str]] = defaultdict(list)
+    for r in rows:
+        by_day[r.at.strftime("%Y%m%d")].append(
+            json.dumps(
+                {
+                    "id": r.id,
+                    "at": r.at.isoformat(),
+                    "level": r.level,
+                    "event_type": r.event_type,
+                    "source": r.source,
+                    "severity": r.severity,
+                    "message": r.message,
+                }
+            )
+        )
+    SETTINGS.archive_dir.mkdir(parents=True, exist_ok=True)
+    for day, lines in by_day.items():
+        path = SETTINGS.archive_dir / f"events-{day}.jsonl.gz"
+        with gzip.open(path, "at", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def _prune_events(cond, *, archive: bool) -> int:
+    """Archive (optionally) and delete matching events, oldest first, in batches."""
+    batch = SETTINGS.retention_batch_rows
+    total = 0
+    while True:
+        with ENGINE.begin() as conn:
+            rows = conn.execute(
+                select(_events).where(cond).order_by(_events.c.at, _events.c.id).limit(batch)
+            ).all()
+            if not rows:
+                break
+            if archive:
+                _archive_events(rows)
+            conn.execute(delete(_events).where(_events.c.id.in_([r.id for r in rows])))
+        total += len(rows)
+        if len(rows) < batch:
+            break
+        time.sleep(_BATCH_PAUSE_SECONDS)
+    return total
+
+
+def _prune_runs(cond) -> int:
+    """Delete finished runs (and their output chunks) in batches."""
+    batch = SETTINGS.retention_batch_rows
+    finished = _runs.c.status.notin_(("QUEUED", "RUNNING"))
+    total = 0
+    while True:
+        with ENGINE.begin() as conn:
+            ids = list(
+                conn.execute(
+                    select(_runs.c.id).where(cond, finished).order_by(_runs.c.id).limit(batch)
+                ).scalars()
+            )
+            if not ids:
+                break
+            conn.execute(delete(_output).where(_output.c.run_id.in_(ids)))
+            conn.execute(delete(_runs).where(_runs.c.id.in_(ids)))
+        total += len(ids)
+        if len(ids) < batch:
+            break
+        time.sleep(_BATCH_PAUSE_SECONDS)
+    return total
+
+
+def _row_cap_boundary(table, order_cols, max_rows: int):
+    """Key of the newest row past the cap, or None if under it."""
+    with ENGINE.connect() as conn:
+        lo, hi = conn.execute(select(func.min(table.c.id), func.max(table.c.id))).one()
+        # ids only grow, so the id span bounds the row count: skip the scan.
+        if lo is None or hi - lo + 1 <= max_rows:
+            return None
+        return conn.execute(
+            select(*order_cols)
+            .order_by(*(c.desc() for c in order_cols))
+            .offset(max_rows)
+            .limit(1)
+        ).first()
+
+
+def prune_events(now: datetime) -> int:
+    archive = SETTINGS.archive_events
+    cutoff = now - timedelta(days=SETTINGS.event_retention_days)
+    deleted = _prune_events(_events.c.at < cutoff, archive=archive)
+
+    key = (_events.c.at, _events.c.id)
+    boundary = _row_cap_boundary(_events, key, SETTINGS.event_max_rows)
+    if boundary is not None:
+        deleted += _prune_events(tuple_(*key) <= tuple_(*boundary), archive=archive)
+    return deleted
+
+
+def prune_command_runs(now: datetime) -> int:
+    cutoff = now - timedelta(days=SETTINGS.command_run_retention_days)
+    deleted = _prune_runs(_runs.c.requested_at < cutoff)
+
+    boundary = _row_cap_boundary(_runs, (_runs.c.id,), SETTINGS.command_run_max_rows)
+    if boundary is not None:
+        deleted += _prune_runs(_runs.c.id <= boundary[0])
+    return deleted
+
+
+def prune_node_jobs(now: datetime) -> int:
+    """Finished fleet jobs past command-run retention, then their emptied dispatches."""
+    cutoff = now - timedelta(days=SETTINGS.command_run_retention_days)
+    finished = _jobs.c.status.notin_(("PENDING", "SENT"))
+    total = _prune_by_id(_jobs, (_jobs.c.created_at < cutoff) & finished)
+    with ENGINE.begin() as conn:
+        conn.execute(
+            delete(_dispatches).where(
+                _dispatches.c.requested_at < cutoff,
+                ~exists().where(_jobs.c.dispatch_id == _dispatches.c.id),
+            )
+        )
+    return total
+
+
+def _prune_by_id(table, cond) -> int:
+    batch = SETTINGS.retention_batch_rows
+    total = 0
+    while True:
+        with ENGINE.begin() as conn:
+            ids = list(conn.execute(select(table.c.id).where(cond).order_by(table.c.id).limit(batch)).scalars())
+            if ids:
+                conn.execute(delete(table).where(table.c.id.in_(ids)))
+        total += len(ids)
+        if len(ids) < batch:
+            break
+        time.sleep(_BATCH_PAUSE_SECONDS)
+    return total
+
+
+def prune_node_telemetry(now: datetime) -> int:
+    """Per-node load blocks and status_flags changes past their retention."""
+    cutoff = now - timedelta(days=SETTINGS.node_telemetry_retention_days)
+    deleted = _prune_by_id(_load_blocks, _load_blocks.c.end_ms < int(cutoff.timestamp() * 1000))
+    deleted += _prune_by_id(_flag_changes, _flag_changes.c.at < cutoff)
+    return deleted
+
+
+def prune_health_changes(now: datetime) -> int:
+    """Health state transitions, kept as long as events."""
+    cutoff = now - timedelta(days=SETTINGS.event_retention_days)
+    return _prune_by_id(_health_changes, _health_changes.c.at < cutoff)
+
+
+def incremental_vacuum(pages: int = _VACUUM_PAGES) -> bool:
+    """
+    Return free pages to the filesystem a slice at a time. False (nothing
+    done) on a DB created before auto_vacuum=INCREMENTAL: see
+    convert_to_incremental().
+    """
+    with ENGINE.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+            return False
+        conn.exec_driver_sql(f"PRAGMA incremental_vacuum({int(pages)})")
+        conn.commit()
+    return True
+
+
+def convert_to_incremental() -> bool:
+    """
+    Switch an older DB to auto_vacuum=INCREMENTAL. Takes a full VACUUM,
+    which holds the write lock until the file is rebuilt: an offline step,
+    never run from the maintenance loop. False if already converted.
+    """
+    with ENGINE.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2:
+            return False
+        conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.exec_driver_sql("VACUUM")
+        conn.commit()
+    return True
+
+
+def run_retention(now: datetime | None = None) -> dict:
+    """One retention pass (called from the maintenance loop, off the event loop)."""
+    now = now or datetime.now(tz=timezone.utc)
+    result = {
+        "events_deleted": prune_events(now),
+        "command_runs_deleted": prune_command_runs(now),
+        "node_jobs_deleted": prune_node_jobs(now),
+        "node_telemetry_deleted": prune_node_telemetry(now),
+        "health_changes_deleted": prune_health_changes(now),
+    }
+    incremental_vacuum()
+    if any(result.values()):
+        log_event(
+            None,
+            f"retention: {result['events_deleted']} event(s), "
+            f"{result['command_runs_deleted']} command run(s), "
+            f"{result['node_jobs_deleted']} node job(s), "
+            f"{result['node_telemetry_deleted']} telemetry row(s), "
+            f"{result['health_changes_deleted']} health change(s) pruned",
+            event_type="retention",
+            source="system",
+            severity="info",
+        )
+    return result
+
+
+def main() -> None:
+    # python3 -m core.system.retention {run,convert-vacuum}
+    ap = argparse.ArgumentParser(prog="core.system.retention")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("run", help="run one retention pass now")
+    sub.add_parser(
+        "convert-vacuum", help="switch an older DB to incremental auto_vacuum (stop the service first)"
+    )
+    args = ap.parse_args()
+
+    if args.cmd == "run":
+        print(json.dumps(run_retention(), indent=2))
+    elif convert_to_incremental():
+        print("converted to auto_vacuum=INCREMENTAL")
+    else:
+        print("already auto_vacuum=INCREMENTAL")
+
+
+if __name__ == "__main__":
+    main()
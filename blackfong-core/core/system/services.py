@@ -2,25 +2,145 @@ from __future__ import annotations
 
 import os
 import subprocess
+import threading
+import time
+from datetime import datetime, timezone
 
 from core.config import SETTINGS
+from core.system.perf import PERF
 
 
-def service_action(unit: str, action: str) -> dict:
-    if action not in ("start", "stop", "restart", "status"):
-        raise ValueError("Invalid action")
+# `systemctl show` properties for the bulk view (one call for every unit).
+SHOW_PROPERTIES = (
+    "Id",
+    "Description",
+    "LoadState",
+    "ActiveState",
+    "SubState",
+    "UnitFileState",
+    "MainPID",
+    "ActiveEnterTimestamp",
+)
+
 
+# The sudoers file allows exactly this binary; sudo never runs an override.
+_SUDO_SYSTEMCTL = "/bin/systemctl"
+
+# systemctl expands these, which would return blocks for units nobody asked for.
+_GLOB_CHARS = frozenset("*?[]")
+
+
+def check_unit(unit: str) -> None:
+    if not unit or unit.startswith("-") or not _GLOB_CHARS.isdisjoint(unit):
+        raise ValueError("Invalid unit")
     if SETTINGS.allowed_systemd_units and unit not in SETTINGS.allowed_systemd_units:
         raise PermissionError("Unit not allowed")
 
-    cmd = ["/bin/systemctl", action, unit]
-    if action == "status":
-        cmd = ["/bin/systemctl", "status", "--no-pager", unit]
 
-    if os.geteuid() != 0:
-        cmd = ["sudo", "-n", *cmd]
+def _systemctl(*args: str, privileged: bool) -> subprocess.CompletedProcess:
+    cmd = [str(SETTINGS.systemctl_path), *args]
+    if privileged and os.geteuid() != 0:
+        cmd = ["sudo", "-n", _SUDO_SYSTEMCTL, *args]
+    with PERF.timed("subprocess", (("name", f"systemctl {args[0]}"),)):
+        return subprocess.run(cmd, capture_output=True, text=True, check=False)
+
+
+def parse_show(text: str, units: list[str]) -> dict[str, dict]:
+    """
+    `systemctl show` prints one KEY=VALUE block per unit, blank-line
+    separated, in the order asked for.
+    """
+    blocks: list[dict] = [{}]
+    for line in text.splitlines():
+        if not line.strip():
+            if blocks[-1]:
+                blocks.append({})
+            continue
+        key, _, value = line.partition("=")
+        blocks[-1][key] = value
+    blocks = [b for b in blocks if b]
+    return {unit: (blocks[i] if i < len(blocks) else {}) for i, unit in enumerate(units)}
+
+
+class ServiceStatusCache:
+    """
+    State of every allowed unit from a single `systemctl show` (read-only,
+    no sudo), kept for a short TTL. Concurrent readers share one refresh;
+    start/stop/restart invalidate it.
+    """
+
+    def __init__(self, ttl_seconds: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._states: dict[str, dict] = {}
+        self._fetched_at: float | None = None
+        self._fetched_wall: datetime | None = None
+        self._error: str | None = None
+
+    def invalidate(self) -> None:
+        self._fetched_at = None
+
+    def _fresh(self) -> bool:
+        fetched = self._fetched_at
+        return fetched is not None and time.monotonic() - fetched < self.ttl_seconds
 
-    p = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    @staticmethod
+    def _show(units: list[str]) -> tuple[dict[str, dict], str | None]:
+        p = _systemctl("show", "--no-pager", "-p", ",".join(SHOW_PROPERTIES), *units, privileged=False)
+        if p.returncode != 0:
+            return {}, p.stderr.strip() or f"rc={p.returncode}"
+        return parse_show(p.stdout, units), None
+
+    def _refresh(self) -> None:
+        self._states, self._error = self._show(sorted(SETTINGS.allowed_systemd_units))
+        self._fetched_at = time.monotonic()
+        self._fetched_wall = datetime.now(tz=timezone.utc)
+
+    def snapshot(self, units: list[str] | None = None) -> dict:
+        """
+        Cached states for `units` (default: the allowlist). Only allowlisted
+        units are cached; with no allowlist, requested units are looked up
+        per call, so clients can't grow what every refresh has to query.
+        """
+        allowed = SETTINGS.allowed_systemd_units
+        wanted = sorted(set(units) if units is not None else allowed)
+        if allowed and not self._fresh():
+            with self._lock:
+                if not self._fresh():
+                    self._refresh()
+        states, error = self._states, self._error
+        extra = [u for u in wanted if u not in allowed]
+        if extra:
+            found, extra_error = self._show(extra)
+            states = {**states, **found}
+            error = error or extra_error
+        return {
+            "fetched_at": self._fetched_wall.isoformat() if self._fetched_wall else None,
+            "ttl_seconds": self.ttl_seconds,
+            "error": error,
+            "units": [{"unit": u, **states.get(u, {})} for u in wanted],
+        }
+
+
+SERVICES = ServiceStatusCache(SETTINGS.service_status_ttl_seconds)
+
+
+def service_status(unit: str) -> dict:
+    check_unit(unit)
+    return SERVICES.snapshot([unit])["units"][0]
+
+
+def service_action(unit: str, action: str) -> dict:
+    if action not in ("start", "stop", "restart", "status"):
+        raise ValueError("Invalid action")
+    check_unit(unit)
+
+    if action == "status":
+        # Real `systemctl status` output; GET /api/services/{unit} is the cached view.
+        p = _systemctl("status", "--no-pager", unit, privileged=True)
+    else:
+        p = _systemctl(action, unit, privileged=True)
+        SERVICES.invalidate()
     return {
         "unit": unit,
         "action": action,
@@ -28,4 +148,3 @@ def service_action(unit: str, action: str) -> dict:
         "stdout": p.stdout,
         "stderr": p.stderr,
     }
-
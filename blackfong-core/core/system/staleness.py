@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from datetime import datetime, timezone
+
+from core.system.events import EVENTS, build_event
+from core.system.leader import LEADER
+from core.system.registry import REGISTRY
+
+
+class StalenessDetector:
+    """
+    Ticks REGISTRY's timer wheel once a second and turns each stale /
+    recovered transition into one node.stale / node.recovered event.
+
+    Every worker ticks (so its counts stay current); only the leader
+    emits, so a transition is reported once per data_dir.
+    """
+
+    def __init__(self, tick_seconds: float = 1.0) -> None:
+        self.tick_seconds = tick_seconds
+        self._seq = 0
+
+    def tick(self, now: float | None = None) -> int:
+        """Advance, emit new transitions. Returns events emitted."""
+        REGISTRY.advance(now if now is not None else time.time())
+        self._seq, transitions = REGISTRY.transitions_after(self._seq)
+        if not transitions or not LEADER.is_leader:
+            return 0
+        events = [_event(t) for t in transitions]
+        EVENTS.submit(events)
+        return len(events)
+
+    async def run(self) -> None:
+        # Start after what is already recorded (e.g. the initial load).
+        self._seq, _ = REGISTRY.transitions_after(self._seq)
+        while True:
+            await asyncio.sleep(self.tick_seconds)
+            try:
+                # Off the loop: a backed-up event queue may block submit().
+                await asyncio.to_thread(self.tick)
+            except Exception:
+                pass
+
+
+def _event(t: dict) -> dict:
+    at = datetime.fromtimestamp(t["at"], tz=timezone.utc)
+    if t["kind"] == "stale":
+        return build_event(
+            f"node stale: {t['name']} ({t['ip']}), no heartbeat for {t['silent']:.0f}s",
+            event_type="node.stale",
+            source="node",
+            severity="warn",
+            at=at,
+        )
+    return build_event(
+        f"node recovered: {t['name']} ({t['ip']}) after {t['silent']:.0f}s without a heartbeat",
+        event_type="node.recovered",
+        source="node",
+        severity="info",
+        at=at,
+    )
+
+
+STALENESS = StalenessDetector()
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from core.system.perf import PERF
+
+
+_ROOT = Path(__file__).resolve().parents[2]
+
+
+def _child() -> None:
+    # Runs in the fresh interpreter: cold import, startup hooks, shutdown.
+    t0 = time.perf_counter()
+    import core.main
+
+    imported = time.perf_counter() - t0
+
+    async def _cycle() -> None:
+        with PERF.timed("startup", (("step", "startup hooks"),)):
+            await core.main.app.router.startup()
+        await core.main.app.router.shutdown()
+
+    asyncio.run(_cycle())
+    steps = PERF.snapshot()["timers"].get("startup", [])
+    print(json.dumps({"import_s": imported, "steps": [(s["step"], s["max_ms"]) for s in steps]}))
+
+
+def _import_times(stderr: str) -> dict[str, float]:
+    """Self time per top-level package (ms) from `python -X importtime`."""
+    out: dict[str, float] = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:") :].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # header line
+        name = parts[2].strip()
+        root = name.split(".")[0] if not name.startswith("core.") else name
+        out[root] += int(parts[0]) / 1000
+    return out
+
+
+def profile_startup(top: int = 15) -> int:
+    """
+    Start the app once in a fresh interpreter and print where the time went:
+    imports per package (core modules individually), then each init step.
+    """
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(_ROOT), os.getenv("PYTHONPATH")]))}
+    t0 = time.perf_counter()
+    p = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "from core.system.startup import _child; _child()"],
+        cwd=_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    wall = time.perf_counter() - t0
+    if p.returncode != 0:
+        print(p.stderr[-4000:], file=sys.stderr)
+        return 1
+    result = json.loads(p.stdout.strip().splitlines()[-1])
+    imports = sorted(_import_times(p.stderr).items(), key=lambda kv: kv[1], reverse=True)
+
+    print(f"imports (self time, top {top} of {len(imports)}; total {sum(ms for _, ms in imports):.1f} ms)")
+    for name, ms in imports[:top]:
+        print(f"  {name:<40} {ms:8.1f} ms")
+    print("init")
+    print(f"  {'import core.main (incl. create_app)':<40} {result['import_s'] * 1000:8.1f} ms")
+    for name, ms in result["steps"]:
+        print(f"  {name:<40} {ms:8.1f} ms")
+    print(f"{'wall (interpreter start to shutdown)':<42} {wall * 1000:8.1f} ms")
+    return 0
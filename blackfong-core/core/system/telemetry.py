@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import math
+import re
+import struct
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from core.db.database import ENGINE
+from core.db.models import Node, NodeFlagChange, NodeLoadBlock
+
+
+_blocks_t = NodeLoadBlock.__table__
+_flags_t = NodeFlagChange.__table__
+
+_LOAD_SPLIT = re.compile(r"[\s,;/]+")
+
+
+def parse_load(text) -> float | None:
+    """First number in a heartbeat's `load` ("0.42", "0.42 0.30 0.21", "load: 0.42")."""
+    if text is None:
+        return None
+    for tok in _LOAD_SPLIT.split(str(text).strip()):
+        try:
+            value = float(tok)
+        except ValueError:
+            continue
+        return value if math.isfinite(value) else None
+    return None
+
+
+def _epoch_ms(at: datetime) -> int:
+    return int(at.timestamp() * 1000)
+
+
+def encode_block(samples: list[tuple[int, float]]) -> dict:
+    """
+    Column-pack (epoch_ms, load) samples, oldest first: varint deltas from
+    the first timestamp (1-3 bytes each at heartbeat rates) and float32 loads.
+    """
+    deltas = bytearray()
+    prev = samples[0][0]
+    for ts, _ in samples[1:]:
+        d = ts - prev
+        prev = ts
+        while d >= 0x80:
+            deltas.append((d & 0x7F) | 0x80)
+            d >>= 7
+        deltas.append(d)
+    loads = [v for _, v in samples]
+    return {
+        "start_ms": samples[0][0],
+        "end_ms": prev,
+        "count": len(samples),
+        "ts_deltas": bytes(deltas),
+        "loads": struct.pack(f"<{len(loads)}f", *loads),
+        "max_load": max(loads),
+        "avg_load": sum(loads) / len(loads),
+    }
+
+
+def decode_block(start_ms: int, count: int, ts_deltas: bytes, loads: bytes) -> list[tuple[int, float]]:
+    ts = [start_ms]
+    t = start_ms
+    value = shift = 0
+    for b in ts_deltas:
+        value |= (b & 0x7F) << shift
+        if b & 0x80:
+            shift += 7
+            continue
+        t += value
+        ts.append(t)
+        value = shift = 0
+    # float32 keeps ~7 significant digits; don't show its rounding noise.
+    return [(t, round(v, 4)) for t, v in zip(ts, struct.unpack(f"<{count}f", loads))]
+
+
+class TelemetryBuffer:
+    """
+    Per-node load samples and status_flags changes from heartbeats, written
+    every node_telemetry_flush_seconds: one packed block per node per flush
+    and one row per flags change, in a single transaction.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._samples: dict[int, list[tuple[int, float]]] = {}
+        self._flags: list[dict] = []
+
+    def record(
+        self, node_id: int, at: datetime, load: float | None, flags: str | None, *, flags_changed: bool
+    ) -> None:
+        """Called by HeartbeatBuffer for every accepted heartbeat."""
+        with self._lock:
+            if load is not None:
+                self._samples.setdefault(node_id, []).append((_epoch_ms(at), load))
+            if flags_changed:
+                self._flags.append({"node_id": node_id, "at": at, "status_flags": flags})
+
+    def pending(self, node_id: int) -> list[tuple[int, float]]:
+        with self._lock:
+            return list(self._samples.get(node_id, ()))
+
+    def flush(self) -> int:
+        """Write buffered samples/changes. Returns samples written."""
+        with self._lock:
+            if not self._samples and not self._flags:
+                return 0
+            samples = self._samples
+            flags = self._flags
+            self._samples = {}
+            self._flags = []
+
+        blocks = [{"node_id": nid, **encode_block(sorted(s))} for nid, s in samples.items()]
+        try:
+            with ENGINE.begin() as conn:
+                if blocks:
+                    conn.execute(insert(_blocks_t), blocks)
+                if flags:
+                    conn.execute(insert(_flags_t), flags)
+        except Exception:
+            with self._lock:
+                for nid, s in samples.items():
+                    self._samples[nid] = s + self._samples.get(nid, [])
+                self._flags[:0] = flags
+            raise
+        return sum(b["count"] for b in blocks)
+
+
+TELEMETRY = TelemetryBuffer()
+
+
+def _downsample(samples: list[tuple[int, float]], start_ms: int, end_ms: int, max_points: int) -> dict:
+    if len(samples) <= max_points:
+        loads = [v for _, v in samples]
+        return {"bucket_ms": 0, "ts": [t for t, _ in samples], "load": loads, "load_max": loads}
+    bucket = max(1, math.ceil((end_ms - start_ms + 1) / max_points))
+    ts: list[int] = []
+    avg: list[float] = []
+    peak: list[float] = []
+    key = None
+    total = n = 0
+    for t, v in samples:
+        k = (t - start_ms) // bucket
+        if k != key:
+            if n:
+                avg.append(total / n)
+            key, total, n = k, 0.0, 0
+            ts.append(start_ms + k * bucket)
+            peak.append(v)
+        total += v
+        n += 1
+        peak[-1] = max(peak[-1], v)
+    if n:
+        avg.append(total / n)
+    return {"bucket_ms": bucket, "ts": ts, "load": avg, "load_max": peak}
+
+
+def node_history(db: Session, node_id: int, start: datetime, end: datetime, *, max_points: int = 500) -> dict:
+    """
+    Load series (epoch-ms `ts`, averaged into buckets past max_points) and
+    the status_flags changes in [start, end], led by the flags in effect at start.
+    """
+    start_ms, end_ms = _epoch_ms(start), _epoch_ms(end)
+    rows = db.execute(
+        select(_blocks_t.c.start_ms, _blocks_t.c.count, _blocks_t.c.ts_deltas, _blocks_t.c.loads).where(
+            _blocks_t.c.node_id == node_id,
+            _blocks_t.c.end_ms >= start_ms,
+            _blocks_t.c.start_ms <= end_ms,
+        )
+    ).all()
+    samples = [s for r in rows for s in decode_block(r.start_ms, r.count, r.ts_deltas, r.loads)]
+    samples.extend(TELEMETRY.pending(node_id))
+    samples = sorted(s for s in samples if start_ms <= s[0] <= end_ms)
+
+    before = db.execute(
+        select(_flags_t.c.at, _flags_t.c.status_flags)
+        .where(_flags_t.c.node_id == node_id, _flags_t.c.at < start)
+        .order_by(_flags_t.c.at.desc())
+        .limit(1)
+    ).all()
+    changes = db.execute(
+        select(_flags_t.c.at, _flags_t.c.status_flags)
+        .where(_flags_t.c.node_id == node_id, _flags_t.c.at >= start, _flags_t.c.at <= end)
+        .order_by(_flags_t.c.at)
+    ).all()
+    return {
+        "node_id": node_id,
+        "start": start,
+        "end": end,
+        **_downsample(samples, start_ms, end_ms, max_points),
+        "status_flags": [{"at": at, "status_flags": f} for at, f in [*before, *changes]],
+    }
+
+
+def hottest_nodes(db: Session, *, limit: int = 10, window_seconds: int | None = None) -> list[dict]:
+    """
+    Top-N by load. Without a window: latest load, read in ix_nodes_load_value
+    order. With one: peak over the window from the block maxima of that
+    window only (ix_node_load_blocks_end_max), not the whole history.
+    """
+    if window_seconds is None:
+        rows = db.execute(
+            select(Node.id, Node.name, Node.load_value, Node.last_seen)
+            .where(Node.load_value.is_not(None))
+            .order_by(Node.load_value.desc())
+            .limit(limit)
+        ).all()
+        return [{"id": r.id, "name": r.name, "load": r.load_value, "last_seen": r.last_seen} for r in rows]
+
+    since_ms = int((time.time() - window_seconds) * 1000)
+    peak = func.max(_blocks_t.c.max_load).label("peak")
+    top = db.execute(
+        select(_blocks_t.c.node_id, peak)
+        .where(_blocks_t.c.end_ms >= since_ms)
+        .group_by(_blocks_t.c.node_id)
+        .order_by(peak.desc())
+        .limit(limit)
+    ).all()
+    names = dict(db.execute(select(Node.id, Node.name).where(Node.id.in_([r.node_id for r in top]))).all())
+    return [{"id": r.node_id, "name": names.get(r.node_id), "load": r.peak} for r in top]
+
+
+async def node_history_async(db: AsyncSession, node_id: int, start: datetime, end: datetime, **kw) -> dict:
+    return await db.run_sync(lambda s: node_history(s, node_id, start, end, **kw))
+
+
+async def hottest_nodes_async(db: AsyncSession, **kw) -> list[dict]:
+    return await db.run_sync(lambda s: hottest_nodes(s, **kw))
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from core.config import SETTINGS
+
+
+# Series persisted from the pulse sampler.
+SERIES = ("cpu_percent", "memory_percent", "disk_percent", "temp_c", "load_1m")
+
+# resolution -> (table, bucket seconds)
+_RESOLUTIONS = {
+    "raw": ("pulse_raw", 0),
+    "1m": ("pulse_1m", 60),
+    "1h": ("pulse_1h", 3600),
+}
+
+_RAW_COLS = ", ".join(f"{s} REAL" for s in SERIES)
+_AGG_COLS = ", ".join(f"{s}_min REAL, {s}_avg REAL, {s}_max REAL" for s in SERIES)
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS pulse_raw (ts INTEGER PRIMARY KEY, {_RAW_COLS});
+CREATE TABLE IF NOT EXISTS pulse_1m (ts INTEGER PRIMARY KEY, n INTEGER NOT NULL, {_AGG_COLS});
+CREATE TABLE IF NOT EXISTS pulse_1h (ts INTEGER PRIMARY KEY, n INTEGER NOT NULL, {_AGG_COLS});
+"""
+
+
+def _rollup_sql(dst: str, src: str, bucket: int, *, from_raw: bool) -> str:
+    cols = []
+    for s in SERIES:
+        if from_raw:
+            cols.append(f"MIN({s}), AVG({s}), MAX({s})")
+        else:
+            # Weighted by sample count so partial buckets don't skew the average.
+            cols.append(
+                f"MIN({s}_min), SUM({s}_avg * n) / SUM(CASE WHEN {s}_avg IS NULL THEN 0 ELSE n END), MAX({s}_max)"
+            )
+    count = "COUNT(*)" if from_raw else "SUM(n)"
+    return (
+        f"INSERT OR REPLACE INTO {dst} "
+        f"SELECT (ts / {bucket}) * {bucket}, {count}, {', '.join(cols)} "
+        f"FROM {src} WHERE ts >= ? GROUP BY ts / {bucket}"
+    )
+
+
+class PulseStore:
+    """
+    Pulse history in its own SQLite file: raw samples plus 1-minute and
+    1-hour min/avg/max rollups, each with its own retention.
+
+    Samples are buffered and written in one transaction per flush; rollups
+    are recomputed only for the buckets the batch touched.
+    """
+
+    def __init__(self, path: Path, *, flush_seconds: int, retention: dict[str, int]) -> None:
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.retention = retention  # resolution -> seconds
+        self._pending: list[tuple] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._ready:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=5)
+        if not self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._ready = True
+        return conn
+
+    def add(self, sample: dict) -> None:
+        """Sampler listener: buffer one sample, flush when the batch is due."""
+        row = (int(sample["ts"]), *(sample.get(s) for s in SERIES))
+        with self._lock:
+            self._pending.append(row)
+            due = time.monotonic() - self._last_flush >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self) -> int:
+        with self._lock:
+            rows = self._pending
+            self._pending = []
+            self._last_flush = time.monotonic()
+        if not rows:
+            return 0
+
+        first_ts = min(r[0] for r in rows)
+        now = int(time.time())
+        placeholders = ", ".join("?" for _ in range(len(SERIES) + 1))
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(f"INSERT OR REPLACE INTO pulse_raw VALUES ({placeholders})", rows)
+                conn.execute(_rollup_sql("pulse_1m", "pulse_raw", 60, from_raw=True), ((first_ts // 60) * 60,))
+                conn.execute(
+                    _rollup_sql("pulse_1h", "pulse_1m", 3600, from_raw=False), ((first_ts // 3600) * 3600,)
+                )
+                for res, (table, _) in _RESOLUTIONS.items():
+                    conn.execute(f"DELETE FROM {table} WHERE ts < ?", (now - self.retention[res],))
+        finally:
+            conn.close()
+        return len(rows)
+
+    def pick_resolution(self, start: int, end: int, max_points: int) -> str:
+        now = int(time.time())
+        span = max(1, end - start)
+        for res, (_, bucket) in _RESOLUTIONS.items():
+            step = bucket or SETTINGS.pulse_interval_seconds
+            if start >= now - self.retention[res] and span / step <= max_points:
+                return res
+        return "1h"
+
+    def query(self, start: int, end: int, *, max_points: int = 500, resolution: str | None = None) -> dict:
+        """
+        Columnar series for [start, end]; picks the finest resolution that
+        fits max_points and is still retained unless one is given.
+        """
+        res = resolution or self.pick_resolution(start, end, max_points)
+        table, _ = _RESOLUTIONS[res]
+        if res == "raw":
+            cols = list(SERIES)
+        else:
+            cols = [f"{s}_{agg}" for s in SERIES for agg in ("min", "avg", "max")]
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT ts, {', '.join(cols)} FROM {table} WHERE ts BETWEEN ? AND ? ORDER BY ts",
+                (start, end),
+            ).fetchall()
+        finally:
+            conn.close()
+        series = {c: [r[i + 1] for r in rows] for i, c in enumerate(cols)}
+        return {"resolution": res, "ts": [r[0] for r in rows], "series": series}
+
+
+PULSE_STORE = PulseStore(
+    SETTINGS.metrics_db_path,
+    flush_seconds=SETTINGS.metrics_flush_seconds,
+    retention={
+        "raw": SETTINGS.metrics_raw_retention_hours * 3600,
+        "1m": SETTINGS.metrics_1m_retention_days * 86400,
+        "1h": SETTINGS.metrics_1h_retention_days * 86400,
+    },
+)
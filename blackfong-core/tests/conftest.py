@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Settings are read at import time: point them at a throwaway data dir before
+# anything from core is imported, so tests never touch ./data or /opt/blackfong.
+os.environ["BLACKFONG_BASE_DIR"] = tempfile.mkdtemp(prefix="blackfong-tests-")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import pytest  # noqa: E402
+
+from core.db.migrate import migrate  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _schema() -> None:
+    migrate()
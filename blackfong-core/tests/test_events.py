@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import dataclasses
+import uuid
+
+from sqlalchemy import select
+
+import core.system.events as events
+from core.config import SETTINGS
+from core.db.database import SessionLocal
+from core.db.models import EventLog
+from core.system.events import EVENTS, log_event
+
+
+def _rows(message: str) -> list[EventLog]:
+    with SessionLocal() as db:
+        return list(db.execute(select(EventLog).where(EventLog.message == message)).scalars())
+
+
+def _log_text() -> str:
+    path = SETTINGS.log_dir / "events.log"
+    return path.read_text(encoding="utf-8") if path.exists() else ""
+
+
+def test_sync_mode_commits_before_returning():
+    assert not EVENTS.running
+    message = f"sync {uuid.uuid4()}"
+    with SessionLocal() as db:
+        row = log_event(db, message, event_type="test", severity="warn")
+    assert row.id is not None
+    [stored] = _rows(message)
+    assert (stored.id, stored.event_type, stored.severity, stored.level) == (row.id, "test", "warn", "WARN")
+    assert message in _log_text()
+
+
+def test_sync_setting_bypasses_a_running_pipeline(monkeypatch):
+    monkeypatch.setattr(events, "SETTINGS", dataclasses.replace(SETTINGS, events_sync=True))
+    EVENTS.start()
+    try:
+        message = f"forced sync {uuid.uuid4()}"
+        with SessionLocal() as db:
+            row = log_event(db, message)
+        # Written on `db`, not handed to the writer thread.
+        assert row.id is not None
+        assert len(_rows(message)) == 1
+    finally:
+        EVENTS.stop()
+
+
+def test_pipeline_writes_batches_on_flush():
+    EVENTS.start()
+    try:
+        messages = [f"queued {uuid.uuid4()}" for _ in range(5)]
+        for m in messages:
+            assert log_event(None, m).id is None
+        EVENTS.flush()
+        for m in messages:
+            assert len(_rows(m)) == 1
+    finally:
+        EVENTS.stop()
+
+
+def test_refused_batch_is_retried_then_kept_in_text_log(monkeypatch):
+    calls = []
+
+    def refuse(batch):
+        calls.append(len(batch))
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(events, "_RETRY_FIRST_SECONDS", 0.001)
+    monkeypatch.setattr(EVENTS, "write", refuse)
+    message = f"refused {uuid.uuid4()}"
+    EVENTS._write_retrying([events.build_event(message)])
+    assert calls == [1] * events._WRITE_ATTEMPTS
+    assert _rows(message) == []
+    assert message in _log_text()
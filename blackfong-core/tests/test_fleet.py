@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+from core.config import SETTINGS
+from core.db.database import SessionLocal
+from core.db.models import NodeJob
+from core.system.fleet import JOBS, claim_jobs, dispatch, expire_jobs, job_timeout, report_results
+from core.system.nodes import upsert_node
+from core.system.registry import REGISTRY
+
+
+def _node() -> int:
+    with SessionLocal() as db:
+        return upsert_node(db, name=f"node-{uuid.uuid4()}", ip="10.0.0.1").id
+
+
+def _dispatch(node_ids: list[int], name: str = "update") -> int:
+    names = [REGISTRY.get(i).name for i in node_ids]
+    with SessionLocal() as db:
+        return dispatch(db, name=name, requested_by="test", names=names).id
+
+
+def _statuses(dispatch_id: int) -> dict[int, str]:
+    with SessionLocal() as db:
+        rows = db.execute(select(NodeJob.node_id, NodeJob.status).where(NodeJob.dispatch_id == dispatch_id))
+        return dict(rows.all())
+
+
+def test_claim_caps_per_node_and_never_hands_out_a_job_twice():
+    a, b = _node(), _node()
+    for _ in range(3):
+        _dispatch([a, b])
+    assert JOBS.has_pending(a) and JOBS.has_pending(b)
+
+    with SessionLocal() as db:
+        first = claim_jobs(db, [a, b], per_node=2)
+    assert sorted(j["node_id"] for j in first) == [a, a, b, b]
+    # Each node still has one job waiting, so it stays marked.
+    assert JOBS.has_pending(a) and JOBS.has_pending(b)
+
+    with SessionLocal() as db:
+        second = claim_jobs(db, [a, b], per_node=2)
+        third = claim_jobs(db, [a, b], per_node=2)
+    assert sorted(j["node_id"] for j in second) == [a, b]
+    assert not {j["id"] for j in first} & {j["id"] for j in second}
+    assert third == []
+    assert not JOBS.has_pending(a) and not JOBS.has_pending(b)
+    assert all(j["timeout_seconds"] == job_timeout("update") for j in first + second)
+
+
+def test_results_only_from_the_node_a_job_was_sent_to():
+    a, b = _node(), _node()
+    dispatch_id = _dispatch([a])
+    with SessionLocal() as db:
+        [job] = claim_jobs(db, [a])
+        wrong = {"job_id": job["id"], "node_id": b, "status": "OK", "return_code": 0}
+        assert report_results(db, [wrong]) == (0, [job["id"]])
+        right = {**wrong, "node_id": a}
+        assert report_results(db, [right]) == (1, [])
+        # A duplicate report is not applied twice.
+        assert report_results(db, [right]) == (0, [job["id"]])
+    assert _statuses(dispatch_id) == {a: "OK"}
+
+
+def test_expiry_of_unclaimed_and_unanswered_jobs():
+    a, b = _node(), _node()
+    dispatch_id = _dispatch([a, b])
+    with SessionLocal() as db:
+        [sent] = claim_jobs(db, [a])
+
+    now = datetime.now(tz=timezone.utc)
+    assert expire_jobs(now) == {"expired": 0, "timed_out": 0}
+
+    later = now + timedelta(seconds=max(SETTINGS.node_job_ttl_seconds, job_timeout("update")) + 1)
+    result = expire_jobs(later)
+    assert result["expired"] >= 1 and result["timed_out"] >= 1
+    assert _statuses(dispatch_id) == {a: "TIMEOUT", b: "EXPIRED"}
+
+    # Past its TTL a job is not handed out, and a late result is refused.
+    with SessionLocal() as db:
+        assert claim_jobs(db, [b]) == []
+        late = {"job_id": sent["id"], "node_id": a, "status": "OK", "return_code": 0}
+        assert report_results(db, [late]) == (0, [sent["id"]])
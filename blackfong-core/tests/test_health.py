@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from core.system.health import HealthEngine, load_rules
+
+
+@pytest.fixture
+def engine(tmp_path) -> HealthEngine:
+    # CPU: degraded when the minimum over 10s is >= 85; clears once the
+    # maximum over 10s drops below 85 - 5.
+    path = tmp_path / "rules.json"
+    path.write_text(
+        json.dumps(
+            {
+                "rules": [
+                    {
+                        "name": "cpu",
+                        "metric": "cpu_percent",
+                        "aggregate": "min",
+                        "window_seconds": 10,
+                        "degraded": 85,
+                        "critical": 95,
+                        "clear_margin": 5,
+                        "reason": "CPU {value:.0f}%",
+                    }
+                ]
+            }
+        ),
+        encoding="utf-8",
+    )
+    return HealthEngine(load_rules(path))
+
+
+def _feed(engine: HealthEngine, start: int, stop: int, cpu: float) -> str:
+    for ts in range(start, stop):
+        engine.observe({"ts": float(ts), "cpu_percent": cpu})
+    return engine.current()["state"]
+
+
+def test_raised_only_when_sustained_for_the_window(engine):
+    assert _feed(engine, 1, 10, 90) == "STABLE"  # window still filling
+    assert _feed(engine, 10, 12, 90) == "DEGRADED"
+    assert engine.current()["reasons"] == ["CPU 90%"]
+
+
+def test_single_spike_does_not_raise(engine):
+    assert _feed(engine, 1, 20, 50) == "STABLE"
+    assert _feed(engine, 20, 21, 99) == "STABLE"
+    assert _feed(engine, 21, 40, 50) == "STABLE"
+
+
+def test_held_inside_the_clear_margin_then_cleared(engine):
+    assert _feed(engine, 1, 12, 90) == "DEGRADED"
+    # Below the raise threshold but not below 85 - 5: no flapping.
+    assert _feed(engine, 12, 40, 82) == "DEGRADED"
+    # Still inside the window with an 82 in it.
+    assert _feed(engine, 40, 45, 60) == "DEGRADED"
+    assert _feed(engine, 45, 52, 60) == "STABLE"
+    assert engine.current()["reasons"] == []
+
+
+def test_escalates_and_steps_down_a_level_at_a_time(engine):
+    assert _feed(engine, 1, 12, 97) == "CRITICAL"
+    assert _feed(engine, 12, 30, 88) == "DEGRADED"
+    assert _feed(engine, 30, 60, 40) == "STABLE"
+
+
+def test_clock_going_backwards_is_ignored(engine):
+    _feed(engine, 1, 12, 90)
+    before = engine.current()
+    engine.observe({"ts": 5.0, "cpu_percent": 0})
+    assert engine.current() == before
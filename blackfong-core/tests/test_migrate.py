@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import sqlite3
+
+import pytest
+from sqlalchemy import inspect
+
+import core.db.migrate as migrate_mod
+from core.db.database import create_db_engine
+from core.db.migrate import LATEST_VERSION, MIGRATIONS, migrate
+
+
+# The schema as the first release created it, before schema_version existed.
+_PRE_VERSIONED = """
+CREATE TABLE nodes (
+    id INTEGER NOT NULL PRIMARY KEY,
+    name VARCHAR(128) NOT NULL,
+    ip VARCHAR(64) NOT NULL,
+    last_seen DATETIME NOT NULL
+);
+CREATE TABLE event_log (
+    id INTEGER NOT NULL PRIMARY KEY,
+    at DATETIME NOT NULL,
+    level VARCHAR(16) NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE TABLE command_runs (
+    id INTEGER NOT NULL PRIMARY KEY,
+    name VARCHAR(64) NOT NULL,
+    requested_at DATETIME NOT NULL,
+    started_at DATETIME,
+    finished_at DATETIME,
+    status VARCHAR(16) NOT NULL,
+    return_code INTEGER,
+    stdout TEXT,
+    stderr TEXT
+);
+INSERT INTO nodes (id, name, ip, last_seen) VALUES
+    (1, 'edge-1', '10.0.0.1', '2025-01-01 00:00:00'),
+    (2, 'edge-2', '10.0.0.2', '2025-01-01 00:00:00'),
+    (3, 'edge-1', '10.0.0.3', '2025-01-02 00:00:00');
+INSERT INTO event_log (at, level, message) VALUES ('2025-01-01 00:00:00', 'INFO', 'old event');
+INSERT INTO command_runs (name, requested_at, status) VALUES ('reboot', '2025-01-01 00:00:00', 'OK');
+"""
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    engine = create_db_engine(tmp_path / "blackfong.db")
+    monkeypatch.setattr(migrate_mod, "ENGINE", engine)
+    yield engine
+    engine.dispose()
+
+
+def _columns(engine, table: str) -> set[str]:
+    return {c["name"] for c in inspect(engine).get_columns(table)}
+
+
+def test_upgrade_from_pre_versioned_db(engine, tmp_path):
+    with sqlite3.connect(tmp_path / "blackfong.db") as conn:
+        conn.executescript(_PRE_VERSIONED)
+
+    assert migrate() == LATEST_VERSION
+
+    with sqlite3.connect(tmp_path / "blackfong.db") as conn:
+        versions = [v for (v,) in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+        assert versions == [v for v, _, _ in MIGRATIONS]
+        # Newest row per name kept; the other is archived, not lost.
+        assert conn.execute("SELECT id, name FROM nodes ORDER BY id").fetchall() == [(2, "edge-2"), (3, "edge-1")]
+        assert conn.execute("SELECT id, ip FROM nodes_duplicates").fetchall() == [(1, "10.0.0.1")]
+        [(message,)] = conn.execute("SELECT message FROM event_log WHERE event_type = 'migration'").fetchall()
+        assert "edge-1#1" in message
+        assert conn.execute("SELECT message, event_type FROM event_log WHERE id = 1").fetchone() == (
+            "old event",
+            "event",
+        )
+        with pytest.raises(sqlite3.IntegrityError):
+            conn.execute("INSERT INTO nodes (name, ip, last_seen) VALUES ('edge-2', 'x', '2025-01-03')")
+
+    assert {"event_type", "source", "severity"} <= _columns(engine, "event_log")
+    assert {"public_key", "version", "load_value"} <= _columns(engine, "nodes")
+    assert {"requested_by", "worker_pid", "worker_token"} <= _columns(engine, "command_runs")
+    assert {"node_jobs", "fleet_dispatches", "health_changes"} <= set(inspect(engine).get_table_names())
+
+    # Already current: nothing re-runs.
+    assert migrate() == LATEST_VERSION
+
+
+def test_fresh_db_is_stamped_without_running_migrations(engine, tmp_path):
+    assert migrate() == LATEST_VERSION
+    with sqlite3.connect(tmp_path / "blackfong.db") as conn:
+        assert conn.execute("SELECT MAX(version) FROM schema_version").fetchone() == (LATEST_VERSION,)
+        assert conn.execute("SELECT COUNT(*) FROM event_log").fetchone() == (0,)
+    assert "nodes_duplicates" not in inspect(engine).get_table_names()
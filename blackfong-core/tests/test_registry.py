@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import time
+from datetime import datetime, timedelta, timezone
+
+from core.db.database import SessionLocal
+from core.db.models import Node
+from core.system.registry import FleetRegistry, TimerWheel
+
+
+def test_wheel_fires_each_key_once_when_due():
+    wheel = TimerWheel(tick_seconds=1.0, horizon_seconds=60.0)
+    now = time.time()
+    wheel.schedule(1, now + 2)
+    wheel.schedule(2, now + 5)
+    wheel.schedule(3, now + 2)
+    wheel.cancel(3)
+    assert wheel.advance(now + 1) == []
+    assert wheel.advance(now + 3) == [1]
+    # Re-scheduling moves a key instead of adding a second timer.
+    wheel.schedule(2, now + 10)
+    assert wheel.advance(now + 6) == []
+    assert wheel.advance(now + 11) == [2]
+    assert wheel.advance(now + 100) == []
+
+
+def test_wheel_keeps_deadlines_beyond_the_horizon():
+    wheel = TimerWheel(tick_seconds=1.0, horizon_seconds=10.0)
+    now = time.time()
+    wheel.schedule(1, now + 25)
+    assert wheel.advance(now + 15) == []
+    assert wheel.advance(now + 26) == [1]
+
+
+def _add_nodes(seen: dict[str, datetime]) -> None:
+    with SessionLocal() as db:
+        db.add_all(Node(name=name, ip="10.0.0.1", last_seen=at) for name, at in seen.items())
+        db.commit()
+
+
+def test_nodes_already_stale_at_load_are_not_transitions():
+    now = datetime.now(tz=timezone.utc)
+    tag = str(time.time_ns())
+    _add_nodes({f"old-{tag}": now - timedelta(hours=1), f"new-{tag}": now})
+    registry = FleetRegistry(stale_seconds=30)
+    with SessionLocal() as db:
+        registry.load(db)
+    old, new = registry.by_name(f"old-{tag}"), registry.by_name(f"new-{tag}")
+    assert old.stale and not new.stale
+    # Counted at once, and never reported later as having just gone stale.
+    registry.advance(time.time() + 1)
+    assert old.id not in {t["id"] for t in registry.transitions(3600)}
+
+
+def test_stale_then_recovered():
+    now = datetime.now(tz=timezone.utc)
+    name = f"beat-{time.time_ns()}"
+    _add_nodes({name: now})
+    registry = FleetRegistry(stale_seconds=30)
+    with SessionLocal() as db:
+        registry.load(db)
+    rec = registry.by_name(name)
+
+    assert registry.advance(now.timestamp() + 31) >= 1
+    assert rec.stale
+    assert registry.transitions(3600, kind="stale")[0]["id"] == rec.id
+
+    registry.beat(rec.id, now + timedelta(seconds=40), version="2.0")
+    assert not rec.stale and rec.version == "2.0"
+    assert registry.transitions(3600, kind="recovered")[0]["id"] == rec.id
+
+    # An older beat never moves last_seen backwards.
+    registry.beat(rec.id, now + timedelta(seconds=35))
+    assert rec.last_seen == now + timedelta(seconds=40)